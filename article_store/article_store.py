@@ -0,0 +1,109 @@
+import json
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from codec.codec import get_codec, decode_json
+
+PACK_CONTENT_TYPE = "application/x-ndjson"
+PACK_SUFFIX = ".ndjson.pack"
+
+# fields on a scrapes record that say where its article is stored
+STORAGE_FIELDS = ("bucket_key", "pack_key", "pack_offset", "pack_length")
+
+DEFAULT_PREFETCH_WORKERS = 8
+DEFAULT_PREFETCH_MAX_MB = 64
+
+
+def build_pack(articles, codec):
+    # every article is its own compressed frame so a single record can be range-read and
+    # decoded on its own, the frame's magic bytes say which codec wrote it
+    chunks = []
+    index = []
+    offset = 0
+    for article in articles:
+        member = codec.encode((json.dumps(article) + "\n").encode("utf-8"))
+        chunks.append(member)
+        index.append({"pack_offset": offset, "pack_length": len(member)})
+        offset += len(member)
+    return b"".join(chunks), index
+
+
+def read_pack_record(pack, offset, length):
+    return decode_json(pack[offset:offset + length])
+
+
+def get_decoded_size(articles):
+    # what a list of downloaded articles takes once decoded, roughly one byte per character
+    return sum(len(value) for article in articles for value in article.values() if isinstance(value, str))
+
+
+def get_storage_fields(scrape):
+    return {field: scrape[field] for field in STORAGE_FIELDS if field in scrape}
+
+
+class ArticleStore:
+    def __init__(self, logger, bucket, codec=None):
+        self.logger = logger
+        self.bucket = bucket
+        self.codec = codec or get_codec()
+
+    def write_pack(self, key, articles):
+        pack, index = build_pack(articles, self.codec)
+        blob = self.bucket.blob(key)
+        blob.metadata = {"codec": self.codec.name}
+        blob.upload_from_string(pack, content_type=PACK_CONTENT_TYPE)
+        return index
+
+    def download_pack(self, key):
+        return self.bucket.blob(key).download_as_bytes()
+
+    def download_article(self, key):
+        # single article blobs, plain json for anything written before the codec existed
+        return decode_json(self.bucket.blob(key).download_as_bytes())
+
+
+class ArticlePrefetcher:
+    # runs download tasks on a thread pool and yields their results in task order as they
+    # finish. a task is only started while the bytes of everything started but not yet handed
+    # to the caller stays under max_bytes, so memory doesn't grow with coverage. a task counts
+    # its estimate until it finishes, then what its result really takes (size_fn)
+    def __init__(self, max_workers=None, max_bytes=None, size_fn=None):
+        self.max_workers = max_workers or int(os.environ.get("PREDICT_PREFETCH_WORKERS", DEFAULT_PREFETCH_WORKERS))
+        self.max_bytes = max_bytes or int(float(os.environ.get("PREDICT_PREFETCH_MAX_MB", DEFAULT_PREFETCH_MAX_MB)) * 1024 * 1024)
+        self.size_fn = size_fn
+        self.max_bytes_seen = 0
+
+    def measure(self, pending):
+        # finished results sit in memory until the caller gets to them
+        total = 0
+        for entry in pending:
+            future = entry[1]
+            if self.size_fn and not entry[2] and future.done() and not future.exception():
+                entry[0] = self.size_fn(future.result())
+                entry[2] = True
+            total += entry[0]
+        return total
+
+    def iter_results(self, tasks):
+        # tasks yield (estimated_bytes, fn, args)
+        tasks = iter(tasks)
+        next_task = next(tasks, None)
+        # [bytes, future, measured]
+        pending = deque()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="prefetch") as executor:
+            while next_task or pending:
+                in_flight_bytes = self.measure(pending)
+                # always keep at least one task going, even one bigger than the cap
+                while next_task and len(pending) < 2 * self.max_workers and (not pending or in_flight_bytes + next_task[0] <= self.max_bytes):
+                    estimated_bytes, fn, args = next_task
+                    pending.append([estimated_bytes, executor.submit(fn, *args), False])
+                    in_flight_bytes += estimated_bytes
+                    next_task = next(tasks, None)
+                self.max_bytes_seen = max(self.max_bytes_seen, in_flight_bytes)
+
+                _, future, _ = pending.popleft()
+                result = future.result()
+                if self.size_fn:
+                    self.max_bytes_seen = max(self.max_bytes_seen, self.size_fn(result))
+                yield result
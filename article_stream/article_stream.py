@@ -0,0 +1,36 @@
+import os
+import queue
+
+DEFAULT_MAX_SIZE = 256
+
+# put once by the producer after its last article, every consumer passes it on and exits
+END_OF_STREAM = None
+
+
+class ArticleStream:
+    # bounded in-process hand-off from the scraper to predict. when classification falls
+    # behind, put blocks and the scraper slows down instead of buffering the whole run
+    def __init__(self, maxsize=None):
+        self.queue = queue.Queue(maxsize=maxsize or int(os.environ.get("PREDICT_STREAM_MAX_SIZE", DEFAULT_MAX_SIZE)))
+
+    def put_articles(self, stock, articles):
+        # articles freshly scraped in this run, content already in hand
+        for article in articles:
+            self.queue.put({"stock": stock, "article": article})
+
+    def put_scrapes(self, stock, scrapes):
+        # scrape records reused from earlier runs, their content is still only in storage
+        if scrapes:
+            self.queue.put({"stock": stock, "scrapes": scrapes})
+
+    def close(self):
+        self.queue.put(END_OF_STREAM)
+
+    def __iter__(self):
+        while True:
+            item = self.queue.get()
+            if item is END_OF_STREAM:
+                # let the other consumers see the end too
+                self.queue.put(END_OF_STREAM)
+                return
+            yield item
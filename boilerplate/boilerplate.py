@@ -0,0 +1,112 @@
+import hashlib
+import re
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+from request_packer.request_packer import Tokenizer
+
+DEFAULT_MIN_ARTICLES = 20
+DEFAULT_MIN_DAYS = 3
+# the model predict sends articles to, only used to count the tokens stripping saves
+TOKENIZER_MODEL = "gpt-4o-mini"
+MAX_SAMPLE_CHARS = 200
+
+NON_WORD_RE = re.compile(r"[\W_]+")
+DIGITS_RE = re.compile(r"\d+")
+
+
+def get_fingerprint(paragraph):
+    # case, punctuation, spacing and numbers don't matter, "© 2024" and "© 2025" are the same line
+    normalized = DIGITS_RE.sub("0", NON_WORD_RE.sub(" ", paragraph.lower())).strip()
+    if not normalized:
+        return None
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def split_paragraphs(content):
+    # stored content is the article's paragraphs joined with newlines
+    return [paragraph for paragraph in content.split("\n") if paragraph.strip()]
+
+
+class ParagraphCounter:
+    # counts in how many distinct articles, and on how many distinct days, every paragraph
+    # shows up. a wire story copied under a hundred urls is one article on one or two days,
+    # a disclaimer is on every article every day
+    def __init__(self):
+        self.articles = Counter()
+        self.days = {}
+        self.samples = {}
+        self.seen_contents = set()
+
+    def add(self, content, day=None):
+        content_hash = hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+        if content_hash in self.seen_contents:
+            return
+        self.seen_contents.add(content_hash)
+
+        counted = set()
+        for paragraph in split_paragraphs(content):
+            fingerprint = get_fingerprint(paragraph)
+            if not fingerprint or fingerprint in counted:
+                continue
+            counted.add(fingerprint)
+            self.articles[fingerprint] += 1
+            self.samples.setdefault(fingerprint, paragraph[:MAX_SAMPLE_CHARS])
+            if day:
+                self.days.setdefault(fingerprint, set()).add(day)
+
+    def get_boilerplate(self, min_articles, min_days):
+        return {
+            fingerprint: {"articles": count, "days": len(self.days.get(fingerprint, ())), "sample": self.samples[fingerprint]}
+            for fingerprint, count in self.articles.items()
+            if count >= min_articles and len(self.days.get(fingerprint, ())) >= min_days
+        }
+
+
+class BoilerplateFilter:
+    # drops paragraphs whose fingerprint was learned as boilerplate (scripts/learn_boilerplate.py)
+    # from an article before it's stored, so no later stage pays for them
+    def __init__(self, db, logger, tokenizer=None):
+        self.collection = db["boilerplate_paragraphs"]
+        self.logger = logger
+        self.tokenizer = tokenizer or Tokenizer(TOKENIZER_MODEL)
+        self.fingerprints = frozenset()
+        self.lock = threading.Lock()
+
+    def load(self):
+        fingerprints = frozenset(doc["_id"] for doc in self.collection.find({}, {"_id": 1}))
+        with self.lock:
+            self.fingerprints = fingerprints
+        self.logger.info(f"[boilerplate] loaded {len(fingerprints)} boilerplate paragraph fingerprints")
+        return self
+
+    def save(self, boilerplate):
+        # $max, once the stored articles are stripped a relearn won't see these paragraphs again
+        now = datetime.now(timezone.utc)
+        ops = [
+            UpdateOne(
+                {"_id": fingerprint},
+                {"$max": {"articles": entry["articles"], "days": entry["days"]}, "$set": {"sample": entry["sample"], "updated_at": now}},
+                upsert=True,
+            )
+            for fingerprint, entry in boilerplate.items()
+        ]
+        if ops:
+            self.collection.bulk_write(ops, ordered=False)
+        return len(ops)
+
+    def strip(self, paragraphs):
+        # returns (kept paragraphs, tokens saved)
+        fingerprints = self.fingerprints
+        if not fingerprints:
+            return paragraphs, 0
+
+        kept = []
+        stripped = []
+        for paragraph in paragraphs:
+            (stripped if get_fingerprint(paragraph) in fingerprints else kept).append(paragraph)
+        # an article that is nothing but boilerplate is left alone, it's probably a false match
+        if not kept or not stripped:
+            return paragraphs, 0
+        return kept, self.tokenizer.count("\n".join(stripped))
@@ -0,0 +1,132 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_MAX_DOCS = 500000
+DEFAULT_TTL_HOURS = 7 * 24
+# the mongo tier is only counted every so many writes
+PRUNE_EVERY_PUTS = 1000
+
+
+def hash_text(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ClassificationCache:
+    # content addressed answers: the same article for the same ticker under the same model and
+    # prompt always gets the same key, whatever run or lookback it came from. an in-process LRU
+    # sits in front of a mongo collection that expires entries with a TTL index and is pruned
+    # down to the newest max_docs entries every PRUNE_EVERY_PUTS writes
+    def __init__(self, db, logger, max_entries=None, ttl_hours=None, max_docs=None):
+        self.collection = db["classification_cache"]
+        self.logger = logger
+        self.max_entries = max_entries or int(os.environ.get("CLASSIFY_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+        self.max_docs = max_docs or int(os.environ.get("CLASSIFY_CACHE_MAX_DOCS", DEFAULT_MAX_DOCS))
+        self.ttl = timedelta(hours=ttl_hours or float(os.environ.get("CLASSIFY_CACHE_TTL_HOURS", DEFAULT_TTL_HOURS)))
+
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.indexes_ready = False
+        self.puts_since_prune = 0
+        self.stats = {"memory_hits": 0, "mongo_hits": 0, "misses": 0, "evictions": 0, "pruned": 0}
+
+    def make_key(self, model, prompt_hash, stock_sym, content):
+        return hash_text(f"{model}\n{prompt_hash}\n{stock_sym.lower()}\n{hash_text(content)}")
+
+    def ensure_indexes(self):
+        if self.indexes_ready:
+            return
+        self.collection.create_index("created_at", expireAfterSeconds=int(self.ttl.total_seconds()))
+        self.indexes_ready = True
+
+    def incr(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def get_from_memory(self, key, now):
+        with self.lock:
+            entry = self.entries.get(key)
+            if not entry:
+                return None
+            answer, expires_at = entry
+            if expires_at < now:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return answer
+
+    def put_in_memory(self, key, answer, expires_at):
+        with self.lock:
+            self.entries[key] = (answer, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def get(self, key):
+        now = datetime.now(timezone.utc)
+        answer = self.get_from_memory(key, now)
+        if answer is not None:
+            self.incr("memory_hits")
+            return answer
+
+        # the TTL monitor only runs once a minute, expired documents can still be returned
+        doc = self.collection.find_one({"_id": key, "created_at": {"$gte": now - self.ttl}})
+        if not doc:
+            self.incr("misses")
+            return None
+
+        self.incr("mongo_hits")
+        created_at = doc["created_at"]
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        self.put_in_memory(key, doc["answer"], created_at + self.ttl)
+        return doc["answer"]
+
+    def put(self, key, answer, **fields):
+        now = datetime.now(timezone.utc)
+        self.put_in_memory(key, answer, now + self.ttl)
+        self.ensure_indexes()
+        self.collection.update_one(
+            {"_id": key},
+            {"$set": {"answer": answer, "created_at": now, **fields}},
+            upsert=True,
+        )
+
+        with self.lock:
+            self.puts_since_prune += 1
+            due = self.puts_since_prune >= PRUNE_EVERY_PUTS
+            if due:
+                self.puts_since_prune = 0
+        if due:
+            self.prune()
+
+    def prune(self):
+        # the TTL index bounds entries by age only, a burst of runs could still grow the
+        # collection without limit. drop the oldest entries past max_docs
+        excess = self.collection.count_documents({}) - self.max_docs
+        if excess <= 0:
+            return 0
+
+        # created_at of the first entry that is kept, everything older goes
+        oldest_kept = list(self.collection.find({}, {"created_at": 1}).sort("created_at", 1).skip(excess).limit(1))
+        if not oldest_kept:
+            return 0
+        res = self.collection.delete_many({"created_at": {"$lt": oldest_kept[0]["created_at"]}})
+        with self.lock:
+            self.stats["pruned"] += res.deleted_count
+        self.logger.info(f"[classification_cache] pruned {res.deleted_count} entries past {self.max_docs}")
+        return res.deleted_count
+
+    def get_stats(self, since=None):
+        # since: an earlier get_stats() to count from, entries stays the current size
+        since = since or {}
+        with self.lock:
+            stats = {name: value - since.get(name, 0) for name, value in self.stats.items()}
+            stats["entries"] = len(self.entries)
+        lookups = stats["memory_hits"] + stats["mongo_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["mongo_hits"]) / lookups, 3) if lookups else 0
+        return stats
@@ -0,0 +1,231 @@
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import openai
+from openai import OpenAI
+from job_manager.job_manager import check_cancelled
+from throttle.throttle import TokenBucket
+
+DEFAULT_MAX_IN_FLIGHT = 8
+DEFAULT_RPM = 500
+DEFAULT_TPM = 200000
+DEFAULT_MAX_RETRIES = 5
+QUEUE_DEPTH_PER_WORKER = 4
+# rough english average, only used to pace requests against the TPM limit
+CHARS_PER_TOKEN = 4
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError)
+
+
+def estimate_tokens(messages):
+    return sum(len(message["content"]) for message in messages) // CHARS_PER_TOKEN + 1
+
+
+def get_retry_after(error):
+    # openai sends retry-after-ms (or retry-after in seconds) with 429s
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1)):
+        try:
+            return float(response.headers.get(header)) * scale
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+class ClassificationEngine:
+    # one shared openai client behind a bounded thread pool. every request takes a token from
+    # the RPM bucket and its estimated size from the TPM bucket before it is sent, 429s and
+    # transient errors are retried after the server's retry-after (or a jittered backoff)
+    def __init__(self, logger, client=None, max_in_flight=None, rpm=None, tpm=None, max_retries=DEFAULT_MAX_RETRIES):
+        self.logger = logger
+        self.client = client
+        self.max_in_flight = max_in_flight or int(os.environ.get("OPENAI_MAX_IN_FLIGHT", DEFAULT_MAX_IN_FLIGHT))
+        rpm = rpm or float(os.environ.get("OPENAI_RPM", DEFAULT_RPM))
+        tpm = tpm or float(os.environ.get("OPENAI_TPM", DEFAULT_TPM))
+        self.rpm_bucket = TokenBucket(rpm / 60, max(1, self.max_in_flight))
+        self.tpm_bucket = TokenBucket(tpm / 60, tpm / 60 * self.max_in_flight)
+        self.max_retries = max_retries
+
+        self.executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="classifier")
+        # callers outside the pool (the streaming consumers) share the same in-flight cap
+        self.in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        # bounded queue in front of the pool so producers wait instead of piling up work
+        self.queued = threading.BoundedSemaphore(QUEUE_DEPTH_PER_WORKER * self.max_in_flight)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "rate_limited": 0, "failed": 0, "tokens": 0, "wait_secs": 0.0}
+
+    def get_client(self):
+        with self.lock:
+            if self.client is None:
+                # retries are handled here so they go through the rate limiter
+                self.client = OpenAI(max_retries=0)
+            return self.client
+
+    def incr(self, name, value=1):
+        with self.lock:
+            self.stats[name] += value
+
+    def submit(self, fn, *args):
+        self.queued.acquire()
+        future = self.executor.submit(fn, *args)
+        future.add_done_callback(lambda _: self.queued.release())
+        return future
+
+    def wait_for_capacity(self, tokens):
+        wait = max(self.rpm_bucket.reserve(), self.tpm_bucket.reserve(tokens))
+        if wait > 0:
+            self.incr("wait_secs", wait)
+            time.sleep(wait)
+
+    def complete(self, model, messages, **kwargs):
+        client = self.get_client()
+        estimated = estimate_tokens(messages)
+
+        for attempt in range(self.max_retries + 1):
+            self.wait_for_capacity(estimated)
+            self.incr("requests")
+            try:
+                with self.in_flight:
+                    completion = client.chat.completions.create(model=model, messages=messages, **kwargs)
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    self.incr("failed")
+                    raise
+                if isinstance(e, openai.RateLimitError):
+                    self.incr("rate_limited")
+                self.incr("retries")
+                delay = get_retry_after(e) or min(60, 2 ** attempt + random.uniform(0, 1))
+                self.logger.info(f"[classifier] {type(e).__name__}, retrying in {round(delay, 1)}s")
+                time.sleep(delay)
+                continue
+
+            usage = getattr(completion, "usage", None)
+            if usage and usage.total_tokens:
+                self.incr("tokens", usage.total_tokens)
+                # charge what the estimate missed so the next requests pace on real usage
+                if usage.total_tokens > estimated:
+                    self.tpm_bucket.reserve(usage.total_tokens - estimated)
+            return completion.choices[0].message.content
+
+    def get_stats(self, since=None):
+        # since: an earlier get_stats() to count from, the counters live as long as the process
+        since = since or {}
+        with self.lock:
+            stats = {name: value - since.get(name, 0) for name, value in self.stats.items()}
+        stats["wait_secs"] = round(stats["wait_secs"], 1)
+        return stats
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+DEFAULT_BATCH_POLL_SECS = 30
+DEFAULT_BATCH_TIMEOUT_SECS = 24 * 60 * 60
+# the batch api caps an input file at 50k requests
+DEFAULT_BATCH_MAX_REQUESTS = 50000
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_DONE_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+class BatchClassifier:
+    # whole run classification through the openai batch api: one jsonl upload, one batch,
+    # poll until it finishes, then map the output lines back by custom_id. slower to answer
+    # than ClassificationEngine but far fewer round trips and half the price
+    def __init__(self, logger, client=None, poll_secs=None, timeout_secs=None, max_requests=None):
+        self.logger = logger
+        self.client = client
+        self.poll_secs = poll_secs if poll_secs is not None else float(os.environ.get("OPENAI_BATCH_POLL_SECS", DEFAULT_BATCH_POLL_SECS))
+        self.timeout_secs = timeout_secs or float(os.environ.get("OPENAI_BATCH_TIMEOUT_SECS", DEFAULT_BATCH_TIMEOUT_SECS))
+        self.max_requests = max_requests or int(os.environ.get("OPENAI_BATCH_MAX_REQUESTS", DEFAULT_BATCH_MAX_REQUESTS))
+
+    def get_client(self):
+        if self.client is None:
+            self.client = OpenAI()
+        return self.client
+
+    def build_input(self, model, requests):
+        # requests is a list of (custom_id, messages)
+        lines = []
+        for custom_id, messages in requests:
+            lines.append(json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": {"model": model, "messages": messages},
+            }))
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+    def submit(self, model, requests, metadata=None):
+        client = self.get_client()
+        input_file = client.files.create(file=("batch.jsonl", self.build_input(model, requests)), purpose="batch")
+        batch = client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window="24h",
+            metadata=metadata,
+        )
+        self.logger.info(f"[classifier] submitted batch {batch.id} with {len(requests)} requests")
+        return batch
+
+    def cancel(self, batch_id):
+        # best effort, the job is stopping either way
+        try:
+            self.get_client().batches.cancel(batch_id)
+            self.logger.info(f"[classifier] cancelled batch {batch_id}")
+        except openai.APIError as e:
+            self.logger.error(f"[classifier] failed to cancel batch {batch_id}: {e}")
+
+    def wait(self, batch_id, job=None):
+        client = self.get_client()
+        deadline = time.monotonic() + self.timeout_secs
+        while True:
+            batch = client.batches.retrieve(batch_id)
+            if batch.status in BATCH_DONE_STATUSES:
+                return batch
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"batch {batch_id} still {batch.status} after {int(self.timeout_secs)}s")
+            self.logger.info(f"[classifier] batch {batch_id} is {batch.status}, counts: {batch.request_counts}")
+            if job is None:
+                time.sleep(self.poll_secs)
+            elif job.cancel_event.wait(self.poll_secs):
+                # a cancelled job shouldn't leave a batch running (and billed) for up to 24h
+                self.cancel(batch_id)
+                check_cancelled(job)
+
+    def read_output(self, batch):
+        client = self.get_client()
+        if batch.error_file_id:
+            errors = client.files.content(batch.error_file_id).text.splitlines()
+            self.logger.info(f"[classifier] batch {batch.id} has {len(errors)} failed requests")
+
+        results = {}
+        if not batch.output_file_id:
+            return results
+
+        for line in client.files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            response = row.get("response") or {}
+            if response.get("status_code") != 200:
+                continue
+            results[row["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+        return results
+
+    def run(self, model, requests, metadata=None, job=None):
+        # returns {custom_id: answer}, requests that failed or expired are missing
+        results = {}
+        for start in range(0, len(requests), self.max_requests):
+            check_cancelled(job)
+            batch = self.submit(model, requests[start:start + self.max_requests], metadata)
+            batch = self.wait(batch.id, job)
+            if batch.status != "completed":
+                self.logger.error(f"[classifier] batch {batch.id} ended {batch.status}")
+            results.update(self.read_output(batch))
+        return results
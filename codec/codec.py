@@ -0,0 +1,108 @@
+import gzip
+import json
+import os
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# payloads are self describing: the leading magic bytes are the content-encoding marker,
+# anything without a known marker is treated as plain (legacy) json
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+class IdentityCodec:
+    name = "identity"
+
+    def encode(self, data):
+        return data
+
+    def decode(self, data):
+        return data
+
+
+class GzipCodec:
+    name = "gzip"
+    magic = GZIP_MAGIC
+
+    def __init__(self, level=6):
+        self.level = level
+
+    def encode(self, data):
+        # mtime=0 keeps the output deterministic for identical articles
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+
+    def decode(self, data):
+        return gzip.decompress(data)
+
+
+class ZstdCodec:
+    name = "zstd"
+    magic = ZSTD_MAGIC
+
+    def __init__(self, level=3):
+        if zstandard is None:
+            raise ImportError("zstandard is not installed")
+        self.level = level
+        # zstd contexts aren't thread safe and one codec is shared by every pack write, so
+        # each thread gets its own
+        self.local = threading.local()
+
+    def get_context(self, name, factory):
+        context = getattr(self.local, name, None)
+        if context is None:
+            context = factory()
+            setattr(self.local, name, context)
+        return context
+
+    def encode(self, data):
+        return self.get_context("compressor", lambda: zstandard.ZstdCompressor(level=self.level)).compress(data)
+
+    def decode(self, data):
+        return self.get_context("decompressor", zstandard.ZstdDecompressor).decompress(data)
+
+
+CODECS = {
+    "identity": IdentityCodec,
+    "gzip": GzipCodec,
+    "zstd": ZstdCodec,
+}
+
+
+def get_codec(name=None, level=None):
+    if name is None:
+        name = os.environ.get("STORAGE_CODEC", "zstd" if zstandard else "gzip")
+    if name == "zstd" and zstandard is None:
+        name = "gzip"
+
+    codec_cls = CODECS[name]
+    if level is None or codec_cls is IdentityCodec:
+        return codec_cls()
+    return codec_cls(level=level)
+
+
+def get_codec_name(data):
+    if data[:2] == GZIP_MAGIC:
+        return "gzip"
+    if data[:4] == ZSTD_MAGIC:
+        return "zstd"
+    return "identity"
+
+
+def decode_payload(data):
+    if isinstance(data, str):
+        return data.encode("utf-8")
+
+    codec_name = get_codec_name(data)
+    if codec_name == "zstd" and zstandard is None:
+        raise ImportError("zstandard is required to read zstd payloads")
+    if codec_name == "identity":
+        return data
+    return CODECS[codec_name]().decode(data)
+
+
+def decode_json(data):
+    return json.loads(decode_payload(data))
@@ -1,6 +1,24 @@
+from pymongo import ASCENDING
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
 
+# compound indexes the hot queries depend on, (collection, keys)
+INDEXES = [
+    # predict: every scrape of a run published after the lookback cutoff
+    ("scrapes", [("run_id", ASCENDING), ("published_at", ASCENDING)]),
+    # resume: the failed stocks of a run
+    ("stock_prices", [("run_id", ASCENDING), ("success", ASCENDING)]),
+    # GET /jobs/<id>
+    ("runs", [("job_id", ASCENDING)]),
+]
+
+
+def ensure_indexes(db, logger):
+    # create_index is a no-op for an index that already exists, safe to run on every startup
+    for collection_name, keys in INDEXES:
+        name = db[collection_name].create_index(keys)
+        logger.info(f"[db] index {collection_name}.{name} ready")
+
 class DB(object):
     _instance = None 
 
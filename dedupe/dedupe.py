@@ -0,0 +1,124 @@
+import hashlib
+import os
+import re
+import threading
+from datetime import datetime, timezone, timedelta
+import numpy as np
+from pymongo import ASCENDING
+
+DEFAULT_MAX_DISTANCE = 6
+DEFAULT_TTL_HOURS = 7 * 24
+SHINGLE_SIZE = 3
+SIGNATURE_BITS = 64
+# too little text to tell a wire copy from two different short blurbs
+MIN_WORDS = 50
+
+WORD_RE = re.compile(r"\w+")
+
+
+def simhash(text):
+    # 64 bit simhash over 3 word shingles, near identical texts land a few bits apart
+    words = WORD_RE.findall(text.lower())
+    if len(words) < MIN_WORDS:
+        return None
+
+    shingles = (" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1))
+    hashes = np.array([int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big") for shingle in shingles], dtype=np.uint64)
+    # a bit is set when more shingles have it set than not
+    ones = ((hashes[:, None] >> np.arange(SIGNATURE_BITS, dtype=np.uint64)) & np.uint64(1)).sum(axis=0)
+    return sum(1 << bit for bit in range(SIGNATURE_BITS) if 2 * int(ones[bit]) > len(hashes))
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def get_bands(signature, num_bands):
+    # pigeonhole: two signatures at most num_bands - 1 bits apart agree on at least one band,
+    # so an exact match on any band finds every candidate
+    bounds = [round(i * SIGNATURE_BITS / num_bands) for i in range(num_bands + 1)]
+    return [f"{i}:{signature >> lo & ((1 << (hi - lo)) - 1):x}" for i, (lo, hi) in enumerate(zip(bounds, bounds[1:]))]
+
+
+class NearDuplicateIndex:
+    # syndicated stories show up under many urls with nearly the same text. within a run the
+    # copies of one story for a stock collapse into the first, across runs a copy reuses the
+    # verdict stored with the signature of the one already classified
+    def __init__(self, db, logger, max_distance=None, ttl_hours=None):
+        self.collection = db["article_signatures"]
+        self.logger = logger
+        self.max_distance = max_distance if max_distance is not None else int(os.environ.get("PREDICT_DEDUPE_MAX_DISTANCE", DEFAULT_MAX_DISTANCE))
+        self.ttl = timedelta(hours=ttl_hours or float(os.environ.get("PREDICT_DEDUPE_TTL_HOURS", DEFAULT_TTL_HOURS)))
+        self.num_bands = self.max_distance + 1
+        self.lock = threading.Lock()
+        self.indexes_ready = False
+        self.stats = {"signed": 0, "run_duplicates": 0, "prior_duplicates": 0, "saved": 0}
+
+    def ensure_indexes(self):
+        if self.indexes_ready:
+            return
+        self.collection.create_index([("stock", ASCENDING), ("bands", ASCENDING)])
+        self.collection.create_index("created_at", expireAfterSeconds=int(self.ttl.total_seconds()))
+        self.indexes_ready = True
+
+    def incr(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def sign(self, text):
+        signature = simhash(text)
+        if signature is not None:
+            self.incr("signed")
+        return signature
+
+    def is_run_duplicate(self, signature, seen):
+        # seen holds the signatures already kept for this stock in this run, a new one is added
+        if signature is None:
+            return False
+        with self.lock:
+            if any(hamming(signature, other) <= self.max_distance for other in seen):
+                self.stats["run_duplicates"] += 1
+                return True
+            seen.append(signature)
+        return False
+
+    def get_prior_verdict(self, stock_sym, signature, model, prompt_hash):
+        if signature is None:
+            return None
+        self.ensure_indexes()
+        query = {
+            "stock": stock_sym.lower(),
+            "bands": {"$in": get_bands(signature, self.num_bands)},
+            "model": model,
+            "prompt_hash": prompt_hash,
+            "created_at": {"$gte": datetime.now(timezone.utc) - self.ttl},
+        }
+        for doc in self.collection.find(query, {"_id": 0, "signature": 1, "verdict": 1}):
+            if hamming(signature, int(doc["signature"], 16)) <= self.max_distance:
+                self.incr("prior_duplicates")
+                return doc["verdict"]
+        return None
+
+    def save(self, stock_sym, signature, verdict, model, prompt_hash, url=None):
+        if signature is None or not verdict:
+            return
+        self.ensure_indexes()
+        signature_hex = f"{signature:016x}"
+        # 64 bit unsigned doesn't fit a bson int, kept as hex
+        self.collection.update_one(
+            {"stock": stock_sym.lower(), "signature": signature_hex, "model": model, "prompt_hash": prompt_hash},
+            {"$set": {
+                "bands": get_bands(signature, self.num_bands),
+                "verdict": verdict,
+                "url": url,
+                "created_at": datetime.now(timezone.utc),
+            }},
+            upsert=True,
+        )
+        self.incr("saved")
+
+    def get_stats(self, since=None):
+        # since: an earlier get_stats() to count from
+        since = since or {}
+        with self.lock:
+            return {name: value - since.get(name, 0) for name, value in self.stats.items()}
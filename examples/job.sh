@@ -0,0 +1,7 @@
+#!/bin/bash
+
+# /scrape-list and /predict answer with a job_id right away, follow it here
+curl "localhost:5001/jobs/$1"
+
+# stop it at the next stock or stage
+# curl -X POST "localhost:5001/jobs/$1/cancel"
@@ -0,0 +1,3 @@
+#!/bin/bash
+
+curl -X POST "localhost:5001/predict" -H "Content-Type: application/json" -d '{"run_id": "test_id", "lookbacks": [6, 12, 24]}'
\ No newline at end of file
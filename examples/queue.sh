@@ -0,0 +1,3 @@
+#!/bin/bash
+
+curl -X POST "localhost:5001/scrape-queue" -H "Content-Type: application/json" -d '{"run_id": "test_id", "stock_lists": ["test_list.txt"]}'
\ No newline at end of file
@@ -0,0 +1,3 @@
+#!/bin/bash
+
+curl -X POST "localhost:5001/scrape-list" -H "Content-Type: application/json" -d '{"run_id": "test_id", "resume": true, "max_passes": 3}'
\ No newline at end of file
@@ -0,0 +1,3 @@
+#!/bin/bash
+
+curl -X POST "localhost:5001/scrape-predict" -H "Content-Type: application/json" -d '{"run_id": "test_id", "stock_list": "test_list.txt", "lookback": 24}'
\ No newline at end of file
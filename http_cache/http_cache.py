@@ -0,0 +1,61 @@
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+
+DEFAULT_CACHE_DIR = "/tmp/scraper_cache/quotes"
+
+
+class QuotePageCache:
+    # on-disk validators (etag / last-modified) and the extracted story links for each quote page
+    def __init__(self, logger, directory=None):
+        self.logger = logger
+        self.directory = directory or os.environ.get("SCRAPER_QUOTE_CACHE_DIR", DEFAULT_CACHE_DIR)
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def links_hash(links):
+        joined = "\n".join(sorted(set(links)))
+        return hashlib.sha256(joined.encode("utf-8")).hexdigest()
+
+    def get_path(self, stock):
+        return os.path.join(self.directory, f"{stock.lower()}.json")
+
+    def get(self, stock):
+        path = self.get_path(stock)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, "r") as file:
+                return json.load(file)
+        except Exception as e:
+            self.logger.info(f"[quote_cache] unreadable cache entry for {stock}: {e}")
+            return None
+
+    def get_conditional_headers(self, entry):
+        headers = {}
+        if not entry:
+            return headers
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(self, stock, links, etag=None, last_modified=None):
+        entry = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "links_hash": self.links_hash(links),
+            "links": list(links),
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }
+
+        # write then rename so a concurrent reader never sees a half written file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as file:
+            json.dump(entry, file)
+        os.replace(tmp_path, self.get_path(stock))
+        return entry
@@ -0,0 +1,159 @@
+import os
+import time
+import threading
+import httpx
+from stats.stats import percentile
+
+try:
+    # httpx only decodes brotli bodies when the brotli package is installed
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3',
+    'Accept-Encoding': ACCEPT_ENCODING,
+    'Connection': 'keep-alive',
+}
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 20.0
+KEEPALIVE_EXPIRY = 30.0
+
+# trace event pairs (without the http11/http2 prefix) that make up each phase
+PHASES = {
+    "connect": ("connect_tcp.started", "connect_tcp.complete"),
+    "tls": ("start_tls.started", "start_tls.complete"),
+    "wait": ("send_request_headers.started", "receive_response_headers.complete"),
+    "download": ("receive_response_body.started", "receive_response_body.complete"),
+}
+
+
+class RequestStats:
+    # collects per-request timings so handshake and download time can be reported separately
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {phase: [] for phase in list(PHASES) + ["handshake", "total"]}
+        self.requests = 0
+        self.errors = 0
+        self.new_connections = 0
+        self.bytes_downloaded = 0
+        self.status_codes = {}
+
+    def record(self, timings, status_code=None, num_bytes=0):
+        with self.lock:
+            self.requests += 1
+            if status_code is None:
+                self.errors += 1
+            else:
+                self.status_codes[str(status_code)] = self.status_codes.get(str(status_code), 0) + 1
+            self.bytes_downloaded += num_bytes
+
+            if "connect" in timings:
+                self.new_connections += 1
+            timings["handshake"] = timings.get("connect", 0) + timings.get("tls", 0)
+
+            for phase, value in timings.items():
+                self.samples[phase].append(value)
+
+    def summary(self):
+        with self.lock:
+            res = {
+                "requests": self.requests,
+                "errors": self.errors,
+                "new_connections": self.new_connections,
+                "bytes_downloaded": self.bytes_downloaded,
+                "status_codes": dict(self.status_codes),
+            }
+            for phase, values in self.samples.items():
+                res[f"{phase}_ms"] = {
+                    "avg": round(1000 * sum(values) / len(values), 1) if values else 0,
+                    "p50": round(1000 * percentile(values, 50), 1),
+                    "p95": round(1000 * percentile(values, 95), 1),
+                }
+            return res
+
+
+class RequestTrace:
+    def __init__(self):
+        self.started = {}
+        self.timings = {}
+
+    async def __call__(self, event_name, info):
+        # event names look like "connection.connect_tcp.started" or "http11.receive_response_body.complete"
+        event = event_name.split(".", 1)[1]
+        now = time.perf_counter()
+        for phase, (start_event, end_event) in PHASES.items():
+            if event == start_event:
+                self.started[phase] = now
+            elif event == end_event and phase in self.started:
+                self.timings[phase] = now - self.started.pop(phase)
+
+
+class HttpClient:
+    # one pooled keep-alive client per scrape run, shared by every quote page and article fetch
+    def __init__(self, logger, rate_limiter=None, max_connections=5, connect_timeout=None, read_timeout=None, transport=None, concurrency=None):
+        self.logger = logger
+        self.rate_limiter = rate_limiter
+        self.concurrency = concurrency
+        self.max_connections = max_connections
+        self.connect_timeout = connect_timeout or float(os.environ.get("SCRAPER_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT))
+        self.read_timeout = read_timeout or float(os.environ.get("SCRAPER_READ_TIMEOUT", DEFAULT_READ_TIMEOUT))
+        self.transport = transport
+        self.stats = RequestStats()
+        self.client = None
+
+    def build_client(self):
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        )
+        # no pool timeout: waiting for a free connection is how the pool applies back pressure
+        timeout = httpx.Timeout(self.read_timeout, connect=self.connect_timeout, pool=None)
+        return httpx.AsyncClient(headers=DEFAULT_HEADERS, limits=limits, timeout=timeout, follow_redirects=True, transport=self.transport)
+
+    async def __aenter__(self):
+        self.client = self.build_client()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.client.aclose()
+        self.client = None
+
+    async def get(self, url, headers=None):
+        if not self.concurrency:
+            return await self.fetch(url, headers)
+
+        started_at = await self.concurrency.acquire()
+        try:
+            return await self.fetch(url, headers, started_at)
+        finally:
+            await self.concurrency.release()
+
+    async def fetch(self, url, headers=None, started_at=None):
+        if self.rate_limiter:
+            await self.rate_limiter.acquire_async(url)
+
+        trace = RequestTrace()
+        start = time.perf_counter()
+        try:
+            response = await self.client.get(url, headers=headers, extensions={"trace": trace})
+        except Exception:
+            trace.timings["total"] = time.perf_counter() - start
+            self.stats.record(trace.timings)
+            if self.concurrency:
+                self.concurrency.record(started_at, None, trace.timings["total"])
+            raise
+
+        trace.timings["total"] = time.perf_counter() - start
+        self.stats.record(trace.timings, response.status_code, len(response.content))
+        if self.concurrency:
+            self.concurrency.record(started_at, response.status_code, trace.timings["total"])
+        return response
+
+    def get_stats(self):
+        stats = self.stats.summary()
+        if self.concurrency:
+            stats["concurrency"] = self.concurrency.get_stats()
+        return stats
@@ -1,10 +1,12 @@
 import requests 
+import os
 import uuid
 import threading
 from datetime import datetime, timezone
 import time
 
 stock_lists = ["test_list.txt", "test_list.txt", "test_list.txt", "test_list.txt"]
+DEFAULT_QUEUE_WORKERS = 4
 class JobController:
     
 
@@ -25,6 +27,25 @@ class JobController:
         }
 
         response = requests.post(url, headers=headers, json=data)
+        # the scrape runs in the background on the worker, GET /jobs/<job_id> follows it
+        self.logger.info(f"[jobs_controller] stock list {stock_list} for run_id {run_id}: {response.status_code} {response.text.strip()}")
+
+    def make_queue_request(self, run_id, url):
+        headers = {
+            'Content-Type': 'application/json'
+        }
+
+        data = {
+            "run_id": run_id,
+            "stock_lists": stock_lists,
+        }
+
+        response = requests.post(url, headers=headers, json=data)
+
+    def get_queue_worker_urls(self):
+        # e.g. SCRAPE_QUEUE_WORKERS="http://scraper-1:8080/scrape-queue,http://scraper-2:8080/scrape-queue"
+        urls = [url.strip() for url in os.environ.get("SCRAPE_QUEUE_WORKERS", "").split(",") if url.strip()]
+        return urls or ['http://localhost:8080/scrape-queue'] * DEFAULT_QUEUE_WORKERS
 
     def save_run(self, run_id, cur_time):
         runs_collection = self.db["runs"]
@@ -35,9 +56,10 @@ class JobController:
         }
         runs_collection.insert_one(doc)
 
-    def start(self):
+    def start(self, mode=None):
         run_id = str(uuid.uuid4())
-        self.logger.info(f"[jobs_controller] Starting scrapes for run id: {run_id}")
+        mode = mode or os.environ.get("JOB_MODE", "lists")
+        self.logger.info(f"[jobs_controller] Starting scrapes for run id: {run_id}, mode: {mode}")
 
         utc_now = datetime.now(timezone.utc)
         self.save_run(run_id, utc_now)
@@ -46,21 +68,29 @@ class JobController:
         sema = threading.Semaphore(value=max_threads)
         threads = list()
         
-        for stock_list in stock_lists:
-            args = (run_id, stock_list)
-            thread = threading.Thread(target=self.make_scrape_request, args=args)
-            threads.append(thread)
+        if mode == "queue":
+            # every worker enqueues the same lists and then pulls tickers until the queue is drained,
+            # more workers (or containers behind SCRAPE_QUEUE_WORKERS) just drain it faster
+            for url in self.get_queue_worker_urls():
+                thread = threading.Thread(target=self.make_queue_request, args=(run_id, url))
+                threads.append(thread)
+        else:
+            for stock_list in stock_lists:
+                args = (run_id, stock_list)
+                thread = threading.Thread(target=self.make_scrape_request, args=args)
+                threads.append(thread)
 
         for idx, thread in enumerate(threads):
             self.logger.info(f"[jobs_controller] Starting jobs for worker {idx} run_id: {run_id}")
-            time.sleep(5)
+            if mode != "queue":
+                time.sleep(5)
             thread.start() 
 
-        self.logger.info(f"[jobs_controller] Waiting for jobs to complete for run_id: {run_id}")
+        self.logger.info(f"[jobs_controller] Waiting for jobs to be accepted for run_id: {run_id}")
         for thread in threads:
             thread.join()
         
-        self.logger.info(f"[jobs_controller] Jobs completed for run_id: {run_id}")
+        self.logger.info(f"[jobs_controller] Jobs accepted for run_id: {run_id}")
         return run_id
 
 
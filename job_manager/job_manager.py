@@ -0,0 +1,158 @@
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+
+# JobController posts four stock lists at once, they all run together as they did before jobs
+DEFAULT_MAX_WORKERS = 4
+# predictions get their own threads so they never wait behind hours long scrapes
+DEFAULT_PREDICT_WORKERS = 2
+PREDICT_KINDS = ("predict",)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def track_stage(job, name):
+    # scrapes and predictions also run outside a job (streaming, scripts)
+    return job.stage(name) if job else nullcontext()
+
+
+def check_cancelled(job):
+    if job:
+        job.check_cancelled()
+
+
+class Job:
+    # handed to the function a job runs: stage timings go to the job's runs document and
+    # cancellation is cooperative, the work checks in between stocks and stages
+    def __init__(self, manager, job_id):
+        self.manager = manager
+        self.job_id = job_id
+        self.cancel_event = threading.Event()
+
+    def is_cancelled(self):
+        return self.cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self.is_cancelled():
+            raise JobCancelled(f"job {self.job_id} was cancelled")
+
+    @contextmanager
+    def stage(self, name):
+        self.check_cancelled()
+        self.manager.update(self.job_id, {f"stages.{name}": {"started_at": datetime.now(timezone.utc)}})
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.manager.update(self.job_id, {
+                f"stages.{name}.finished_at": datetime.now(timezone.utc),
+                f"stages.{name}.elapsed_secs": round(time.perf_counter() - start, 3),
+            })
+
+
+class JobManager:
+    # runs long jobs (scrapes, predictions) on an in-process thread pool so the request that
+    # started them returns right away. state lives in the runs collection, one document per
+    # job, so GET /jobs/<id> works from any thread and survives the job itself. scrapes and
+    # predictions run on separate pools
+    def __init__(self, db, logger, max_workers=None, predict_workers=None):
+        self.collection = db["runs"]
+        self.logger = logger
+        self.max_workers = max_workers or int(os.environ.get("JOB_MAX_WORKERS", DEFAULT_MAX_WORKERS))
+        self.predict_workers = predict_workers or int(os.environ.get("JOB_PREDICT_WORKERS", DEFAULT_PREDICT_WORKERS))
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+        self.predict_executor = ThreadPoolExecutor(max_workers=self.predict_workers, thread_name_prefix="predict-job")
+        self.host = socket.gethostname()
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def get_executor(self, kind):
+        return self.predict_executor if kind in PREDICT_KINDS else self.executor
+
+    def update(self, job_id, fields):
+        self.collection.update_one({"job_id": job_id}, {"$set": fields})
+
+    def recover(self):
+        # jobs this host had queued or running died with the last process (gunicorn runs one worker)
+        result = self.collection.update_many(
+            {"host": self.host, "status": {"$in": [QUEUED, RUNNING]}},
+            {"$set": {"status": FAILED, "error": "interrupted by a restart", "finished_at": datetime.now(timezone.utc)}},
+        )
+        if result.modified_count:
+            self.logger.info(f"[job_manager] marked {result.modified_count} interrupted jobs as failed")
+
+    def submit(self, kind, fn, args, run_id=None, params=None):
+        # fn is called as fn(*args, job=job)
+        job_id = str(uuid.uuid4())
+        job = Job(self, job_id)
+        self.collection.insert_one({
+            "job_id": job_id,
+            "kind": kind,
+            "run_id": run_id,
+            "params": params or {},
+            "status": QUEUED,
+            "host": self.host,
+            "created_at": datetime.now(timezone.utc),
+            "stages": {},
+        })
+
+        with self.lock:
+            self.jobs[job_id] = job
+        self.get_executor(kind).submit(self.run, job, kind, fn, args)
+        self.logger.info(f"[job_manager] queued {kind} job {job_id} for run_id {run_id}")
+        return job_id
+
+    def run(self, job, kind, fn, args):
+        fields = {}
+        start = time.perf_counter()
+        try:
+            # cancelled while it was still waiting for a thread
+            job.check_cancelled()
+            self.update(job.job_id, {"status": RUNNING, "started_at": datetime.now(timezone.utc)})
+            result = fn(*args, job=job)
+            fields["status"] = CANCELLED if job.is_cancelled() else SUCCEEDED
+            if result is not None:
+                fields["result"] = result
+        except JobCancelled:
+            fields["status"] = CANCELLED
+        except Exception as e:
+            self.logger.error(f"[job_manager] {kind} job {job.job_id} failed: {e}")
+            self.logger.error(traceback.format_exc())
+            fields.update({"status": FAILED, "error": str(e)})
+        finally:
+            fields.update({"finished_at": datetime.now(timezone.utc), "elapsed_secs": round(time.perf_counter() - start, 3)})
+            self.update(job.job_id, fields)
+            with self.lock:
+                self.jobs.pop(job.job_id, None)
+            self.logger.info(f"[job_manager] {kind} job {job.job_id} {fields['status']} in {int(fields['elapsed_secs'])}s")
+
+    def get(self, job_id):
+        return self.collection.find_one({"job_id": job_id}, {"_id": 0})
+
+    def cancel(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job:
+            job.cancel_event.set()
+            self.update(job_id, {"cancel_requested_at": datetime.now(timezone.utc)})
+            self.logger.info(f"[job_manager] cancel requested for job {job_id}")
+        # finished (or another process's) jobs just come back as they are
+        return self.get(job_id)
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+        self.predict_executor.shutdown(wait=wait)
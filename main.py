@@ -11,6 +11,7 @@ from bs4 import BeautifulSoup
 from yahoo.yahoo import Yahoo
 from job_controller.job_controller import JobController
 from predict.predict import Predict
+from article_stream.article_stream import ArticleStream
 from email_controller.email_controller import EmailController
 import logging
 from logging import Formatter, FileHandler
@@ -33,6 +34,8 @@ from google.cloud import storage
 import json
 from alpaca.trading.client import TradingClient
 from trading.trading import TradingController
+from database.db import ensure_indexes
+from job_manager.job_manager import JobManager
 
 
 path = "/app/svc_acc_key.json"
@@ -62,6 +65,7 @@ storage_client = storage.Client()
 
 db_client = MongoClient(uri, server_api=ServerApi('1'))
 db = db_client.get_database()
+ensure_indexes(db, logger)
 trading_client = TradingClient(alpaca_key, alpaca_secret, paper=False)
 
 email_controller = EmailController(logger)
@@ -69,6 +73,9 @@ trading_controller = TradingController(trading_client, logger)
 
 yahoo_scraper = Yahoo(logger, storage_client, db)
 pred = Predict(logger, storage_client, db, email_controller, trading_controller)
+# scrapes and predictions run in the background, the request only queues them
+jobs = JobManager(db, logger)
+jobs.recover()
 
 @app.route("/start-jobs")
 def start_jobs():
@@ -76,7 +83,7 @@ def start_jobs():
         start_time = time.time()
 
         jc = JobController(logger, storage_client, db)
-        run_id = jc.start()
+        run_id = jc.start(request.args.get('mode'))
 
         total_elapsed_time = int(time.time() - start_time)  # Convert to integer seconds
 
@@ -89,21 +96,57 @@ def predict():
     try: 
         data = request.get_json()
         lookback = data.get('lookback')
+        lookbacks = data.get('lookbacks')
         run_id = data.get('run_id')
 
-        if not lookback:
+        if not lookback and not lookbacks:
             return jsonify({"success": False, "error": "lookback required"}), 401
         if not run_id:
             return jsonify({"success": False, "error": "run_id required"}), 401
 
-        lookback = int(lookback)
-        ts = pred.start(lookback, run_id)
-        return {"success": True, "run_id": run_id}
+        # a list of lookbacks is classified once and published once per lookback
+        lookbacks = [int(lb) for lb in lookbacks] if lookbacks else int(lookback)
+        params = {"lookbacks": lookbacks, "mode": data.get('mode')}
+        job_id = jobs.submit("predict", pred.start, (lookbacks, run_id, data.get('mode')), run_id, params)
+        return jsonify({"success": True, "run_id": run_id, "job_id": job_id}), 202
     except Exception as e:
         app.logger.error(f"[scraper: error is {e}]")
         app.logger.error(traceback.format_exc())
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route("/scrape-predict", methods=["POST"])
+def scrape_predict():
+    try:
+        start_time = time.time()
+
+        data = request.get_json()
+        stock_list = data.get('stock_list')
+        run_id = data.get('run_id')
+        lookback = data.get('lookback')
+
+        if not stock_list:
+            return jsonify({"success": False, "error": "stock_list required"}), 401
+        if not run_id:
+            return jsonify({"success": False, "error": "run_id required"}), 401
+        if not lookback:
+            return jsonify({"success": False, "error": "lookback required"}), 401
+
+        # predict consumes articles as the scraper stores them instead of waiting for the run to finish
+        stream = ArticleStream()
+        consumer = threading.Thread(target=pred.run_streaming_analysis, args=(stream, int(lookback), run_id))
+        consumer.start()
+        try:
+            yahoo_scraper.start(stock_list, run_id, stream)
+        finally:
+            stream.close()
+            consumer.join()
+
+        total_elapsed_time = int(time.time() - start_time)
+        return jsonify({"success": True, "elapsed_time": f"{total_elapsed_time}s", "run_id": run_id})
+    except Exception as e:
+        app.logger.error(traceback.format_exc())
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @app.route("/scrape-list", methods=["POST"])
 def scrape_list():       
     try:  
@@ -112,21 +155,73 @@ def scrape_list():
         data = request.get_json()
         stock_list = data.get('stock_list')
         run_id = data.get('run_id')
+        resume = data.get('resume', False)
 
-        if not stock_list:
+        if not stock_list and not resume:
             return jsonify({"success": False, "error": "stock_list required"}), 401
 
         if not run_id:
             return jsonify({"success": False, "error": "run_id required"}), 401
 
-        run_id = yahoo_scraper.start(stock_list, run_id) 
+        # only re-scrape the stocks that failed in an earlier pass of this run, the remaining
+        # failures end up in the job's result
+        if resume:
+            max_passes = data.get('max_passes')
+            max_passes = int(max_passes) if max_passes else None
+            job_id = jobs.submit("resume", yahoo_scraper.resume, (run_id, max_passes), run_id, {"max_passes": max_passes})
+        else:
+            job_id = jobs.submit("scrape", yahoo_scraper.start, (stock_list, run_id), run_id, {"stock_list": stock_list})
         total_elapsed_time = int(time.time() - start_time)  # Convert to integer seconds
 
-        return jsonify({"success": True, "elapsed_time": f"{total_elapsed_time}s", "run_id": run_id})
+        return jsonify({"success": True, "elapsed_time": f"{total_elapsed_time}s", "run_id": run_id, "job_id": job_id}), 202
     except Exception as e:
         app.logger.error(traceback.format_exc())
         return jsonify({"success": False, "error": str(e)}), 500
     
+@app.route("/scrape-queue", methods=["POST"])
+def scrape_queue():
+    try:
+        start_time = time.time()
+
+        data = request.get_json()
+        run_id = data.get('run_id')
+        stock_lists = data.get('stock_lists', [])
+
+        if not run_id:
+            return jsonify({"success": False, "error": "run_id required"}), 401
+
+        # enqueueing is idempotent, every worker of a run can be sent the same lists
+        stats = yahoo_scraper.start_queue(run_id, stock_lists)
+        total_elapsed_time = int(time.time() - start_time)
+
+        return jsonify({"success": True, "elapsed_time": f"{total_elapsed_time}s", "run_id": run_id, "queue": stats["queue"]})
+    except Exception as e:
+        app.logger.error(traceback.format_exc())
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route("/jobs/<job_id>")
+def get_job(job_id):
+    try:
+        job = jobs.get(job_id)
+        if not job:
+            return jsonify({"success": False, "error": "job not found"}), 404
+        return jsonify({"success": True, "job": job})
+    except Exception as e:
+        app.logger.error(traceback.format_exc())
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    try:
+        # cooperative: the job stops at its next check, between stocks or stages
+        job = jobs.cancel(job_id)
+        if not job:
+            return jsonify({"success": False, "error": "job not found"}), 404
+        return jsonify({"success": True, "job": job})
+    except Exception as e:
+        app.logger.error(traceback.format_exc())
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @app.route("/sell-orders", methods=["POST"])
 def sell_orders():
     try:
@@ -1,7 +1,9 @@
 # run predictions on individual stocks
-from openai import OpenAI
 import os
 import json
+import threading
+import time
+from concurrent.futures import Future
 from datetime import datetime, timezone, timedelta, time as dt_time
 import pandas as pd
 from google.cloud import storage
@@ -9,9 +11,49 @@ import sys
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
 from tenacity import retry, stop_after_attempt, wait_random
+from article_store.article_store import ArticleStore, ArticlePrefetcher, read_pack_record, get_decoded_size
+from classifier.classifier import ClassificationEngine, BatchClassifier
+from classification_cache.classification_cache import ClassificationCache, hash_text
+from request_packer.request_packer import PackingPlanner, build_packed_user_content, parse_packed_answers
+from prediction_store.prediction_store import PredictionStore, pa
+from ticker_filter.ticker_filter import TickerPrefilter
+from job_manager.job_manager import track_stage, check_cancelled
+from dedupe.dedupe import NearDuplicateIndex
 
 model = "gpt-4o-mini"
 MAX_LEN_WORDS_PER_REQ = 60000
+DEFAULT_STREAM_WORKERS = 4
+# what predict needs from a scrape record, missing fields are left out by $group
+SCRAPE_PROJECTION = {
+    "url": "$url",
+    "published_at": "$published_at",
+    "bucket_key": "$bucket_key",
+    "pack_key": "$pack_key",
+    "pack_offset": "$pack_offset",
+    "pack_length": "$pack_length",
+}
+# legacy single article blobs have no size on the scrape record
+LEGACY_BLOB_BYTES = 16 * 1024
+# pack_length is compressed, news text decodes to a few times that
+PACK_DECODE_RATIO = 4
+
+# kept byte for byte as it was sent before, its hash is part of every classification cache key
+PROMPT_TEMPLATE = """
+        For the given article, predict if {stock_sym} will rise in the next trading window.
+        If the article does not mention anything about {stock_sym}, return an answer of NA.
+        Otherwise, return a YES or NO. The only acceptable responses are YES, NO or NA.
+        """
+PROMPT_HASH = hash_text(PROMPT_TEMPLATE)[:16]
+
+# several articles for one ticker in a single request, answered as json per article id
+PACKED_PROMPT_TEMPLATE = """
+For each article below, predict if {stock_sym} will rise in the next trading window.
+If an article does not mention anything about {stock_sym}, its answer is NA.
+Otherwise its answer is YES or NO. The only acceptable answers are YES, NO or NA.
+Each article is wrapped in <article id="..."></article> tags. Answer every article, in order, as json:
+{{"answers": [{{"id": "<article id>", "answer": "YES" | "NO" | "NA"}}]}}
+"""
+PACKED_PROMPT_HASH = hash_text(PACKED_PROMPT_TEMPLATE)[:16]
 
 class Predict:
     def __init__(self, logger, storage, db, email_controller, trading_controller):
@@ -23,6 +65,28 @@ class Predict:
 
         STORAGE_BUCKET=os.environ["STORAGE_BUCKET"]
         self.bucket = self.storage.get_bucket(STORAGE_BUCKET)
+        self.article_store = ArticleStore(self.logger, self.bucket)
+        # one openai client and one set of RPM/TPM limits for every classification in the process
+        self.classifier = ClassificationEngine(self.logger)
+        self.batch_classifier = BatchClassifier(self.logger)
+        # pack several short articles per request, off until validated with scripts/validate_packing.py
+        self.packing = os.environ.get("PREDICT_PACKING", "false").lower() == "true"
+        self.planner = PackingPlanner(model, MAX_LEN_WORDS_PER_REQ)
+        self.cache = None
+        if os.environ.get("CLASSIFY_CACHE", "true").lower() == "true":
+            self.cache = ClassificationCache(self.get_db(), self.logger)
+        # answer NA locally when an article never mentions the stock, off until validated with scripts/prefilter_report.py
+        self.prefilter = None
+        if os.environ.get("PREDICT_PREFILTER", "false").lower() == "true":
+            self.prefilter = TickerPrefilter(self.get_db(), self.logger)
+        # syndicated copies of a story get one classification and one vote
+        self.dedupe = None
+        if os.environ.get("PREDICT_DEDUPE", "true").lower() == "true":
+            self.dedupe = NearDuplicateIndex(self.get_db(), self.logger)
+        # parquet history of verdicts and tallies next to the csvs, see scripts/read_predictions.py
+        self.prediction_store = None
+        if pa and os.environ.get("PREDICTION_STORE", "true").lower() == "true":
+            self.prediction_store = PredictionStore(self.logger)
         
     def get_db(self):
         if self.db is None: 
@@ -31,42 +95,72 @@ class Predict:
             self.db = client.get_database()
         return self.db
 
-    def collect_saved_articles_from_storage(self, scrapes):
+    def collect_articles_from_pack(self, pack_key, scrapes):
+        # the whole pack is read in one request, records are sliced out by offset
+        try:
+            pack = self.article_store.download_pack(pack_key)
+        except Exception as e:
+            self.logger.info(f"failed to download article pack from storage {pack_key}")
+            return []
+
         articles = []
         for scrape in scrapes:
-            if 'bucket_key' not in scrape:
-                # print("Bucket key not found")
-                continue
-
-            key = scrape['bucket_key']
             try:
-                blob = self.bucket.blob(key)
+                article = read_pack_record(pack, scrape['pack_offset'], scrape['pack_length'])
             except Exception as e:
-                self.logger.info(f"failed to get blob article from storage: {key}")
+                self.logger.info(f"failed to read article at offset {scrape.get('pack_offset')} of {pack_key}")
                 continue
-            
-            try: 
-                content = blob.download_as_string()
-                if not content:
-                    self.logger.info("Couldn't get article content from bucket")
-                    continue
-            except Exception as e:
-                self.logger.info(f"failed to download article from storage as string {key}")
+
+            if not self.has_article_content(article):
+                self.logger.info("article has no content, skipping")
                 continue
+            articles.append(article)
+        return articles
 
+    def has_article_content(self, article):
+        return isinstance(article, dict) and bool(article.get('content', '').strip())
+
+    def download_saved_article(self, key):
+        try:
+            article = self.article_store.download_article(key)
+        except Exception as e:
+            self.logger.info(f"failed to download article from storage {key}")
+            return []
+
+        if not self.has_article_content(article):
+            self.logger.info("article has no content, skipping")
+            return []
+        return [article]
+
+    def get_download_tasks(self, scrapes):
+        # one task per legacy blob and one per pack, sized by what the scrape records say
+        tasks = []
+        scrapes_by_pack = {}
+        for scrape in scrapes:
+            if 'pack_key' in scrape:
+                scrapes_by_pack.setdefault(scrape['pack_key'], []).append(scrape)
+                continue
 
-            if len(content) < 100:
-                self.logger.info("article is too short, skipping")
-                continue 
-            
-            try:
-            # Try converting the content to a JSON object
-                json_content = json.loads(content)
-                articles.append(json_content)
-            except Exception as e:
-                # If conversion fails, just skip and continue
+            if 'bucket_key' not in scrape:
+                # print("Bucket key not found")
                 continue
-        return articles
+
+            tasks.append((LEGACY_BLOB_BYTES, self.download_saved_article, (scrape['bucket_key'],)))
+
+        for pack_key, pack_scrapes in scrapes_by_pack.items():
+            pack_bytes = sum(scrape.get('pack_length', 0) for scrape in pack_scrapes)
+            tasks.append((pack_bytes * PACK_DECODE_RATIO, self.collect_articles_from_pack, (pack_key, pack_scrapes)))
+        return tasks
+
+    def iter_saved_articles(self, scrapes):
+        # downloads run ahead on a thread pool while the caller works through earlier articles
+        prefetcher = ArticlePrefetcher(size_fn=get_decoded_size)
+        for articles in prefetcher.iter_results(self.get_download_tasks(scrapes)):
+            yield from articles
+        self.logger.info(f"[predict] prefetch peak {round(prefetcher.max_bytes_seen / 1024)}KB of decoded articles in memory, cap {round(prefetcher.max_bytes / 1024)}KB")
+
+    def collect_saved_articles_from_storage(self, scrapes):
+        return list(self.iter_saved_articles(scrapes))
         
 
     # modify this to save it in storage
@@ -96,27 +190,42 @@ class Predict:
         self.logger.info(f"saved {lookback}_predictions.csv")
 
     def generate_analysis_for_article(self, stock_sym, article):
-        client = OpenAI()
-        system_content = f"""
-        For the given article, predict if {stock_sym} will rise in the next trading window.
-        If the article does not mention anything about {stock_sym}, return an answer of NA.
-        Otherwise, return a YES or NO. The only acceptable responses are YES, NO or NA.
-        """
-        
-        completion = client.chat.completions.create(
-        model=model,
-        messages=[
-                {"role": "system", "content": system_content},
-                {
-                    "role": "user",
-                    "content": article
-                }
-            ]
-        )
-
-        resp = completion.choices[0].message.content
+        cache_key = self.get_cache_key(stock_sym, article)
+        if cache_key:
+            resp = self.cache.get(cache_key)
+            if resp is not None:
+                return resp
+
+        resp = self.classifier.complete(model, self.build_messages(stock_sym, article))
+        self.save_to_cache(cache_key, stock_sym, resp)
         return resp
 
+    def get_cache_key(self, stock_sym, article, prompt_hash=PROMPT_HASH):
+        if not self.cache:
+            return None
+        return self.cache.make_key(model, prompt_hash, stock_sym, article)
+
+    def save_to_cache(self, cache_key, stock_sym, resp, prompt_hash=PROMPT_HASH):
+        if not cache_key:
+            return
+        try:
+            self.cache.put(cache_key, resp, model=model, prompt_hash=prompt_hash, stock=stock_sym.lower())
+        except Exception as e:
+            # a cache write failing shouldn't throw away an answer we already paid for
+            self.logger.error(f"failed to cache classification: {e}")
+
+    def build_messages(self, stock_sym, article):
+        system_content = PROMPT_TEMPLATE.format(stock_sym=stock_sym)
+        
+        messages = [
+            {"role": "system", "content": system_content},
+            {
+                "role": "user",
+                "content": self.planner.truncate(article)
+            }
+        ]
+        return messages
+
     def normalize_datetime_cnbc(date_str):
         dt = datetime.strptime(date_str, "%Y-%m-%dT%H:%M:%S%z")
         dt_utc = dt.astimezone(timezone.utc)
@@ -129,7 +238,7 @@ class Predict:
         if "published_at" in file_content_formatted:
             time_as_str = file_content_formatted["published_at"]
             if not time_as_str:
-                self.logger.info(f"time not found for {file_content_formatted["title"]}")
+                self.logger.info(f"time not found for {file_content_formatted['title']}")
                 return 
             
             if source == 'cnbc':
@@ -142,33 +251,161 @@ class Predict:
                 published_at = datetime.strptime(time_as_str, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
         return published_at
 
-    def generate_analysis_for_stock(self, stock_sym, scrapes_for_stock):
+    def submit_analysis_for_stock(self, stock_sym, scrapes_for_stock):
         self.logger.info(f"Generate analysis for stock {stock_sym}")
         # you need to get all the articles into an array based on the scrapes
 
-        saved_articles = self.collect_saved_articles_from_storage(scrapes_for_stock)
-        self.logger.info(f"Got saved articles of length {len(saved_articles)} for stock {stock_sym}")
-
-        all_responses = []
-        for article in saved_articles:
-            if "content" not in article:
-                self.logger.info("skipping openai, 'content' not found in article")
-                continue 
-            article_content = article['content']
-
-            try:
-                resp = self.generate_analysis_for_article(stock_sym, article_content)
-                formatted_resp = resp.lower()
-                if "yes" in formatted_resp:
-                    all_responses.append("YES")
-                elif "no" in formatted_resp:
-                    all_responses.append("NO")
+        if self.packing:
+            saved_articles = [article for article in self.collect_saved_articles_from_storage(scrapes_for_stock) if "content" in article]
+            self.logger.info(f"Got saved articles of length {len(saved_articles)} for stock {stock_sym}")
+            seen = []
+            saved_articles = [article for article in saved_articles if not self.is_run_duplicate(self.sign_article(article), seen)]
+            # prefiltered before packing, an unrelated article shouldn't take up room in a request
+            relevant = []
+            skipped_records = []
+            for article in saved_articles:
+                if self.is_relevant(stock_sym, article['content']):
+                    relevant.append(article)
                 else:
-                    all_responses.append("NA")
-            except Exception as e:
-                self.logger.error(f"failure calling openai: {e}")
-                
-        return all_responses
+                    skipped_records.append((article.get('link'), "NA"))
+            saved_articles = relevant
+            skipped = Future()
+            skipped.set_result(skipped_records)
+            links = [article.get('link') for article in saved_articles]
+            requests = self.planner.plan([article['content'] for article in saved_articles])
+            return [skipped] + [self.classifier.submit(self.classify_packed_records, stock_sym, request, links) for request in requests]
+
+        # each article is classified as soon as it's downloaded, submit blocks once the
+        # classifier's queue is full so downloads never run far ahead of classification
+        futures = []
+        seen = []
+        for article in self.iter_saved_articles(scrapes_for_stock):
+            signature = self.sign_article(article)
+            if self.is_run_duplicate(signature, seen):
+                continue
+            futures.append(self.classifier.submit(self.classify_article_records, stock_sym, article, signature))
+        self.logger.info(f"Got saved articles of length {len(futures)} for stock {stock_sym}")
+        return futures
+
+    # every future answers a list of (link, verdict), one per article it covered
+    def classify_article_records(self, stock_sym, article, signature=None):
+        return [(article.get('link'), self.classify_signed_article(stock_sym, article, signature))]
+
+    def sign_article(self, article):
+        if not self.dedupe or "content" not in article:
+            return None
+        return self.dedupe.sign(article['content'])
+
+    def is_run_duplicate(self, signature, seen):
+        return bool(self.dedupe) and self.dedupe.is_run_duplicate(signature, seen)
+
+    def get_prior_verdict(self, stock_sym, signature):
+        if not self.dedupe:
+            return None
+        try:
+            return self.dedupe.get_prior_verdict(stock_sym, signature, model, PROMPT_HASH)
+        except Exception as e:
+            self.logger.error(f"failed to look up near duplicates: {e}")
+
+    def save_signature(self, stock_sym, signature, verdict, link):
+        if not self.dedupe:
+            return
+        try:
+            self.dedupe.save(stock_sym, signature, verdict, model, PROMPT_HASH, link)
+        except Exception as e:
+            self.logger.error(f"failed to save article signature: {e}")
+
+    def classify_signed_article(self, stock_sym, article, signature=None):
+        # prefilter NAs never reach the model, saving them would hand near copies a verdict the
+        # model never gave (same order as run_batch_analysis)
+        if "content" in article and not self.is_relevant(stock_sym, article['content']):
+            return "NA"
+
+        # a copy of a story classified in an earlier run gets that run's verdict
+        verdict = self.get_prior_verdict(stock_sym, signature)
+        if verdict is None:
+            verdict = self.classify_article(stock_sym, article, prefilter=False)
+            self.save_signature(stock_sym, signature, verdict, article.get('link'))
+        return verdict
+
+    def classify_packed_records(self, stock_sym, request, links):
+        article_ids = list(dict.fromkeys(article_idx for _, article_idx, _ in request))
+        return list(zip((links[article_idx] for article_idx in article_ids), self.classify_packed_request(stock_sym, request)))
+
+    def collect_records(self, futures):
+        # futures are read back in submission order so every stock keeps its article order
+        records = []
+        for future in futures:
+            records.extend((link, verdict) for link, verdict in future.result() if verdict)
+        return records
+
+    def collect_responses(self, futures):
+        return [verdict for _, verdict in self.collect_records(futures)]
+
+    def build_packed_messages(self, stock_sym, request):
+        return [
+            {"role": "system", "content": PACKED_PROMPT_TEMPLATE.format(stock_sym=stock_sym)},
+            {"role": "user", "content": build_packed_user_content(request)},
+        ]
+
+    def classify_packed_request(self, stock_sym, request):
+        article_ids = list(dict.fromkeys(article_idx for _, article_idx, _ in request))
+        texts = {article_idx: "\n".join(text for _, idx, text in request if idx == article_idx) for article_idx in article_ids}
+        # a request of one article keeps the per-article prompt
+        if len(request) == 1:
+            return [self.classify_article(stock_sym, {"content": texts[article_ids[0]]}, prefilter=False)]
+
+        messages = self.build_packed_messages(stock_sym, request)
+        answers = {}
+        try:
+            cache_key = self.get_cache_key(stock_sym, messages[1]["content"], PACKED_PROMPT_HASH)
+            resp = self.cache.get(cache_key) if cache_key else None
+            if resp is None:
+                resp = self.classifier.complete(model, messages, response_format={"type": "json_object"})
+            answers = parse_packed_answers(resp, request)
+            if len(answers) == len(article_ids):
+                self.save_to_cache(cache_key, stock_sym, resp, PACKED_PROMPT_HASH)
+        except Exception as e:
+            self.logger.error(f"failure calling openai with packed request: {e}")
+
+        verdicts = []
+        for article_idx in article_ids:
+            if article_idx in answers:
+                verdicts.append(answers[article_idx])
+                continue
+            # the model skipped it or broke the format, ask about this article alone
+            self.planner.incr("fallbacks")
+            verdicts.append(self.classify_article(stock_sym, {"content": texts[article_idx]}, prefilter=False))
+        return verdicts
+
+    def generate_analysis_for_stock(self, stock_sym, scrapes_for_stock):
+        return self.collect_responses(self.submit_analysis_for_stock(stock_sym, scrapes_for_stock))
+
+    def is_relevant(self, stock_sym, content):
+        return not self.prefilter or self.prefilter.mentions(stock_sym, content)
+
+    def classify_article(self, stock_sym, article, prefilter=True):
+        if "content" not in article:
+            self.logger.info("skipping openai, 'content' not found in article")
+            return
+        article_content = article['content']
+        # the model is told to answer NA for these anyway
+        if prefilter and not self.is_relevant(stock_sym, article_content):
+            return "NA"
+
+        try:
+            resp = self.generate_analysis_for_article(stock_sym, article_content)
+            return self.parse_verdict(resp)
+        except Exception as e:
+            self.logger.error(f"failure calling openai: {e}")
+
+    def parse_verdict(self, resp):
+        formatted_resp = resp.lower()
+        if "yes" in formatted_resp:
+            return "YES"
+        elif "no" in formatted_resp:
+            return "NO"
+        return "NA"
 
     def convert_rows_to_csv(self, rows):
         # Initialize a list to hold the rows for the DataFrame
@@ -206,40 +443,37 @@ class Predict:
         return filtered_df
 
     # store this in the bucket
-    def get_stocks_list(self, lookback, run_id): 
-        cur_time = datetime.now(timezone.utc)
+    def get_stocks_list(self, lookback, run_id, cur_time=None): 
+        cur_time = cur_time or datetime.now(timezone.utc)
 
         self.logger.info(f"[predict] Get stocks list with lookback {lookback}, from time {cur_time}")
     
         lookback_from = cur_time - timedelta(hours=lookback) # change this to 6 hours lookback
-        # dup_articles_set = set()
 
         db = self.get_db()
         collection = db['scrapes']
 
-        # get everything from the run id that has been published in the last {lookback} hours
-        recent_scrapes = collection.find({"run_id": run_id, "published_at": {"$gte": lookback_from}})
+        # get everything from the run id that has been published in the last {lookback} hours,
+        # one record per (stock, url) with just the fields needed to find the article
+        pipeline = [
+            {"$match": {"run_id": run_id, "published_at": {"$gte": lookback_from}, "url": {"$ne": None}}},
+            # the newest copy of a url wins
+            {"$sort": {"published_at": -1}},
+            {"$group": {
+                "_id": {"stock": "$stock", "url": "$url"},
+                "scrape": {"$first": SCRAPE_PROJECTION},
+            }},
+            {"$sort": {"scrape.published_at": -1}},
+            {"$group": {"_id": "$_id.stock", "scrapes": {"$push": "$scrape"}}},
+        ]
 
         recent_scrapes_dict = {}
-        for scrape in recent_scrapes:
-            if 'url' not in scrape:
-                print("url is not in scrape")
-                continue
+        num_scrapes = 0
+        for row in collection.aggregate(pipeline, allowDiskUse=True):
+            recent_scrapes_dict[row["_id"]] = row["scrapes"]
+            num_scrapes += len(row["scrapes"])
 
-            # url_key = scrape['url']
-            # if url_key in dup_articles_set:
-            #     continue 
-
-            # dup_articles_set.add(url_key)
-      
-            stock = scrape['stock']
-            if stock not in recent_scrapes_dict:
-                recent_scrapes_dict[stock] = []
-                del scrape["stock"]
-                
-            recent_scrapes_dict[stock].append(scrape)
-        # should convert this to a map and list stock -> dup
-        # self.logger.info(f"[predict] found {len(dup_articles_set)} duplicate articles")
+        self.logger.info(f"[predict] found {num_scrapes} unique articles across {len(recent_scrapes_dict)} stocks")
         return recent_scrapes_dict
     
     def get_email_body(self, top_symbols_dict, run_id, lookback):
@@ -285,31 +519,238 @@ class Predict:
 
     # start point
     # @retry(stop=stop_after_attempt(3), wait=wait_random(min=25, max=35))
-    def run_analysis(self, lookback, run_id):
-        stocks = self.get_stocks_list(lookback, run_id)
+    def run_analysis(self, lookbacks, run_id, mode=None, job=None):
+        # one pass for several lookbacks: classify everything inside the longest one, then
+        # bucket the verdicts by published_at for each lookback
+        mode = mode or os.environ.get("PREDICT_MODE", "online")
+        lookbacks = sorted(set(lookbacks)) if isinstance(lookbacks, (list, tuple, set)) else [lookbacks]
+        cur_time = datetime.now(timezone.utc)
+
+        with track_stage(job, "load_scrapes"):
+            stocks = self.get_stocks_list(max(lookbacks), run_id, cur_time)
         if not stocks:
             self.logger.info(f"[predict] no stocks found for prediction")
             return 
 
+        since = self.snapshot_stats()
+        with track_stage(job, "classify"):
+            if mode == "batch":
+                records = self.run_batch_analysis(stocks, run_id, job)
+            else:
+                records = self.run_online_analysis(stocks, run_id, job, since)
+        if self.cache:
+            self.logger.info(f"[predict] classification cache stats for run_id {run_id}: {json.dumps(self.cache.get_stats(since['cache']))}")
+        self.log_filter_stats(run_id, since)
+
+        published = {stock.lower(): {scrape.get('url'): scrape.get('published_at') for scrape in scrapes} for stock, scrapes in stocks.items()}
+        with track_stage(job, "publish"):
+            for lookback in lookbacks:
+                verdicts = self.select_records(records, published, cur_time - timedelta(hours=lookback), lookback == lookbacks[-1])
+                self.publish_results(self.bucket_records(verdicts), run_id, lookback, verdicts)
+
+    def run_online_analysis(self, stocks, run_id, job=None, since=None):
+        # submit every stock before waiting on any, the next stock downloads while the
+        # previous one is being classified
+        futures_by_stock = {}
+        for stock, scrapes_for_stock in stocks.items():
+            check_cancelled(job)
+            stock_sym = stock.lower()
+            futures_by_stock[stock_sym] = self.submit_analysis_for_stock(stock_sym, scrapes_for_stock)
+
+        records = {stock_sym: self.collect_records(futures) for stock_sym, futures in futures_by_stock.items()}
+        since = since or {}
+        self.logger.info(f"[predict] classification stats for run_id {run_id}: {json.dumps(self.classifier.get_stats(since.get('classifier')))}")
+        if self.packing:
+            self.logger.info(f"[predict] packing stats for run_id {run_id}: {json.dumps(self.planner.get_stats(since.get('planner')))}")
+
+        return records
+
+    def select_records(self, records, published, lookback_from, is_longest):
+        verdicts = []
+        for stock_sym, stock_records in records.items():
+            for link, verdict in stock_records:
+                published_at = published.get(stock_sym, {}).get(link)
+                # everything classified was inside the longest lookback
+                if is_longest or self.is_within_lookback(published_at, lookback_from):
+                    verdicts.append({"stock": stock_sym, "url": link, "published_at": published_at, "verdict": verdict})
+        return verdicts
+
+    def snapshot_stats(self):
+        # the engine, cache and filters are shared by every run in the process, so per run
+        # stats are counted from a snapshot. runs that overlap still see each other's work
+        return {
+            "classifier": self.classifier.get_stats(),
+            "planner": self.planner.get_stats(),
+            "cache": self.cache.get_stats() if self.cache else None,
+            "prefilter": self.prefilter.get_stats() if self.prefilter else None,
+            "dedupe": self.dedupe.get_stats() if self.dedupe else None,
+        }
+
+    def log_filter_stats(self, run_id, since=None):
+        since = since or {}
+        if self.prefilter:
+            # every skipped article is a model call avoided
+            self.logger.info(f"[predict] prefilter stats for run_id {run_id}: {json.dumps(self.prefilter.get_stats(since.get('prefilter')))}")
+        if self.dedupe:
+            # and so is every duplicate
+            self.logger.info(f"[predict] near duplicate stats for run_id {run_id}: {json.dumps(self.dedupe.get_stats(since.get('dedupe')))}")
+        truncated = self.planner.get_stats(since.get("planner"))["truncated"]
+        if truncated and not self.packing:
+            self.logger.info(f"[predict] truncated {truncated} over-long articles for run_id {run_id}")
+
+    def bucket_records(self, verdicts):
         rows = {}
-        # current_time = datetime.now().astimezone(timezone.utc)
-
+        for verdict in verdicts:
+            rows.setdefault(verdict["stock"], []).append(verdict["verdict"])
+        return rows
+
+    def run_batch_analysis(self, stocks, run_id, job=None):
+        # one batch for every (stock, article) of the run, custom ids keep the per stock order.
+        # cached answers never make it into the batch
+        custom_ids = []
+        links = {}
+        requests = []
+        results = {}
+        cache_keys = {}
+        signatures = {}
         for stock, scrapes_for_stock in stocks.items():
             stock_sym = stock.lower()
-            responses = self.generate_analysis_for_stock(stock_sym, scrapes_for_stock)
-            if not responses:
+            saved_articles = self.collect_saved_articles_from_storage(scrapes_for_stock)
+            self.logger.info(f"Got saved articles of length {len(saved_articles)} for stock {stock_sym}")
+            seen = []
+            for idx, article in enumerate(saved_articles):
+                if "content" not in article:
+                    continue
+                signature = self.sign_article(article)
+                if self.is_run_duplicate(signature, seen):
+                    continue
+                custom_id = f"{stock_sym}:{idx}"
+                custom_ids.append(custom_id)
+                links[custom_id] = article.get('link')
+                if not self.is_relevant(stock_sym, article['content']):
+                    results[custom_id] = "NA"
+                    continue
+
+                prior = self.get_prior_verdict(stock_sym, signature)
+                if prior is not None:
+                    results[custom_id] = prior
+                    continue
+                signatures[custom_id] = signature
+
+                cache_key = self.get_cache_key(stock_sym, article['content'])
+                cached = self.cache.get(cache_key) if cache_key else None
+                if cached is not None:
+                    results[custom_id] = cached
+                    continue
+                cache_keys[custom_id] = cache_key
+                requests.append((custom_id, self.build_messages(stock_sym, article['content'])))
+
+        if requests:
+            batch_results = self.batch_classifier.run(model, requests, {"run_id": run_id}, job)
+            self.logger.info(f"[predict] batch answered {len(batch_results)} of {len(requests)} requests for run_id {run_id}")
+            for custom_id, resp in batch_results.items():
+                self.save_to_cache(cache_keys[custom_id], custom_id.rsplit(":", 1)[0], resp)
+                self.save_signature(custom_id.rsplit(":", 1)[0], signatures[custom_id], self.parse_verdict(resp), links[custom_id])
+            results.update(batch_results)
+
+        records = {}
+        for custom_id in custom_ids:
+            if custom_id not in results:
                 continue
-                
-            rows[stock_sym] = responses
+            stock_sym = custom_id.rsplit(":", 1)[0]
+            records.setdefault(stock_sym, []).append((links[custom_id], self.parse_verdict(results[custom_id])))
+        return records
+
+    def publish_results(self, rows, run_id, lookback, verdicts=None):
         df = self.convert_rows_to_csv(rows)
         
         self.save_openai_resp_as_csv(df, run_id, lookback)
+        self.save_to_prediction_store(df, run_id, lookback, verdicts)
         top_symbols_dict = self.get_stocks_by_yes_count(df, 4)
 
         self.send_out_stock_info(top_symbols_dict, run_id, lookback)
         # self.execute_trade(top_symbols_dict)
         # now execute the trade for symbol, yes_count in top_symbols_dict.items()
         # email out top stocks by YES value (just the top 3 )
+
+    def save_to_prediction_store(self, df, run_id, lookback, verdicts=None):
+        if not self.prediction_store:
+            return
+        try:
+            self.prediction_store.write_predictions(run_id, lookback, df, verdicts, model=model)
+        except Exception as e:
+            # the csvs are already saved, the history shouldn't hold up the email
+            self.logger.error(f"[predict] failed to write predictions to the prediction store: {e}")
+
+    def is_within_lookback(self, published_at, lookback_from):
+        if not published_at:
+            return False
+        # scrape records come back from mongo as naive utc
+        if published_at.tzinfo is None:
+            published_at = published_at.replace(tzinfo=timezone.utc)
+        return published_at >= lookback_from
+
+    def get_stream_articles(self, item, lookback_from):
+        # same lookback rule as get_stocks_list, applied per article as it arrives
+        if "scrapes" in item:
+            scrapes = [scrape for scrape in item["scrapes"] if self.is_within_lookback(scrape.get("published_at"), lookback_from)]
+            return self.collect_saved_articles_from_storage(scrapes)
+
+        article = item["article"]
+        try:
+            published_at = self.get_published_at(article, "yahoo")
+        except ValueError:
+            return []
+        if not self.is_within_lookback(published_at, lookback_from) or not self.has_article_content(article):
+            return []
+        return [article]
+
+    def consume_stream(self, stream, rows, lock, lookback_from, seen):
+        for item in stream:
+            stock_sym = item["stock"].lower()
+            try:
+                for article in self.get_stream_articles(item, lookback_from):
+                    signature = self.sign_article(article)
+                    with lock:
+                        seen_for_stock = seen.setdefault(stock_sym, [])
+                    if self.is_run_duplicate(signature, seen_for_stock):
+                        continue
+                    verdict = self.classify_signed_article(stock_sym, article, signature)
+                    if not verdict:
+                        continue
+                    with lock:
+                        rows.setdefault(stock_sym, []).append(verdict)
+                        tally = {answer: rows[stock_sym].count(answer) for answer in ("YES", "NO", "NA")}
+                    self.logger.info(f"[predict] {stock_sym} tally: {tally}")
+            except Exception as e:
+                # keep draining, a dead consumer would leave the scraper blocked on a full stream
+                self.logger.error(f"[predict] failed to classify streamed articles for {stock_sym}: {e}")
+
+    # streaming start point: classifies articles while the scraper is still running and
+    # publishes once the producer closes the stream and the last article is classified
+    def run_streaming_analysis(self, stream, lookback, run_id, num_workers=None):
+        num_workers = num_workers or int(os.environ.get("PREDICT_STREAM_WORKERS", DEFAULT_STREAM_WORKERS))
+        lookback_from = datetime.now(timezone.utc) - timedelta(hours=lookback)
+        start_time = time.perf_counter()
+        since = self.snapshot_stats()
+
+        rows = {}
+        seen = {}
+        lock = threading.Lock()
+        threads = [threading.Thread(target=self.consume_stream, args=(stream, rows, lock, lookback_from, seen)) for _ in range(num_workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.logger.info(f"[predict] stream for run_id {run_id} drained in {int(time.perf_counter() - start_time)}s, {len(rows)} stocks")
+        self.log_filter_stats(run_id, since)
+        if not rows:
+            self.logger.info(f"[predict] no stocks found for prediction")
+            return
+
+        self.publish_results(rows, run_id, lookback)
+        return rows
     
-    def start(self, run_id, lookback):
-        self.run_analysis(run_id, lookback)
\ No newline at end of file
+    def start(self, run_id, lookback, mode=None, job=None):
+        self.run_analysis(run_id, lookback, mode, job)
\ No newline at end of file
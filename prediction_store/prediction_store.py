@@ -0,0 +1,156 @@
+import os
+import threading
+from datetime import date, datetime, timezone
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.fs as pafs
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+DEFAULT_ROOT = "prediction_store"
+
+VERDICTS = "verdicts"
+TALLIES = "tallies"
+
+if pa:
+    # hive style date=YYYY-MM-DD/lookback=N directories, iso dates compare correctly as strings
+    PARTITIONING = ds.partitioning(pa.schema([("date", pa.string()), ("lookback", pa.int32())]), flavor="hive")
+
+    SCHEMAS = {
+        # one row per classified article
+        VERDICTS: pa.schema([
+            ("run_id", pa.string()),
+            ("stock", pa.string()),
+            ("url", pa.string()),
+            ("published_at", pa.timestamp("us", tz="UTC")),
+            ("verdict", pa.string()),
+            ("model", pa.string()),
+            ("predicted_at", pa.timestamp("us", tz="UTC")),
+            ("date", pa.string()),
+            ("lookback", pa.int32()),
+        ]),
+        # one row per stock, the same counts as the predictions csv
+        TALLIES: pa.schema([
+            ("run_id", pa.string()),
+            ("stock", pa.string()),
+            ("yes", pa.int32()),
+            ("no", pa.int32()),
+            ("na", pa.int32()),
+            ("predicted_at", pa.timestamp("us", tz="UTC")),
+            ("date", pa.string()),
+            ("lookback", pa.int32()),
+        ]),
+    }
+
+
+def to_utc(value):
+    # scrape records come back from mongo as naive utc
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def to_date_str(value):
+    if isinstance(value, datetime):
+        return to_utc(value).date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+class PredictionStore:
+    # append only parquet history of every prediction. each publish writes one file per
+    # dataset under <root>/<dataset>/date=YYYY-MM-DD/lookback=N/, so a date range read only
+    # lists and opens the partitions it needs and only decodes the columns it asks for
+    def __init__(self, logger, uri=None, filesystem=None):
+        if pa is None:
+            raise ImportError("pyarrow is not installed")
+        self.logger = logger
+        self.uri = uri or os.environ.get("PREDICTION_STORE_URI") or f"gs://{os.environ['STORAGE_BUCKET']}/{DEFAULT_ROOT}"
+        self.filesystem = filesystem
+        self.root = self.uri
+        self.lock = threading.Lock()
+
+    def get_filesystem(self):
+        # resolved on first use so building Predict doesn't go looking for gcs credentials
+        with self.lock:
+            if self.filesystem is None:
+                self.filesystem, self.root = pafs.FileSystem.from_uri(self.uri)
+            return self.filesystem
+
+    def get_path(self, dataset):
+        filesystem = self.get_filesystem()
+        return filesystem, f"{self.root.rstrip('/')}/{dataset}"
+
+    def write(self, dataset, rows, run_id, predicted_at):
+        if not rows:
+            return 0
+        table = pa.Table.from_pylist(rows, schema=SCHEMAS[dataset])
+        filesystem, path = self.get_path(dataset)
+        # run id and timestamp in the file name, a second publish for the same partition adds
+        # a file instead of replacing the first
+        pq.write_to_dataset(
+            table,
+            path,
+            partitioning=PARTITIONING,
+            filesystem=filesystem,
+            basename_template=f"{run_id}-{predicted_at.strftime('%Y%m%d_%H%M%S')}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+        )
+        return len(rows)
+
+    def write_predictions(self, run_id, lookback, tallies, verdicts=None, model=None, predicted_at=None):
+        # tallies is the predictions csv dataframe, verdicts are dicts with stock, url,
+        # published_at and verdict. streamed runs only have tallies
+        predicted_at = to_utc(predicted_at or datetime.now(timezone.utc))
+        partition = {"run_id": run_id, "predicted_at": predicted_at, "date": to_date_str(predicted_at), "lookback": lookback}
+
+        tally_rows = [
+            {"stock": row["Symbol"], "yes": int(row["YES"]), "no": int(row["NO"]), "na": int(row["NA"]), **partition}
+            for row in tallies.to_dict("records")
+        ]
+        verdict_rows = [
+            {
+                "stock": verdict["stock"],
+                "url": verdict.get("url"),
+                "published_at": to_utc(verdict.get("published_at")),
+                "verdict": verdict["verdict"],
+                "model": model,
+                **partition,
+            }
+            for verdict in verdicts or []
+        ]
+
+        num_tallies = self.write(TALLIES, tally_rows, run_id, predicted_at)
+        num_verdicts = self.write(VERDICTS, verdict_rows, run_id, predicted_at)
+        self.logger.info(f"[prediction_store] wrote {num_tallies} tallies and {num_verdicts} verdicts for run_id {run_id}, lookback {lookback}")
+
+    def load(self, dataset, start_date, end_date=None, lookbacks=None, stocks=None, columns=None, filter=None):
+        # dates are inclusive utc days. date, lookback and stock filters are pushed down: the
+        # partition ones skip whole directories, the stock one skips row groups by statistics
+        end_date = end_date or start_date
+        expression = (ds.field("date") >= to_date_str(start_date)) & (ds.field("date") <= to_date_str(end_date))
+        if lookbacks is not None:
+            lookbacks = lookbacks if isinstance(lookbacks, (list, tuple, set)) else [lookbacks]
+            expression &= ds.field("lookback").isin(list(lookbacks))
+        if stocks is not None:
+            expression &= ds.field("stock").isin([stock.lower() for stock in stocks])
+        if filter is not None:
+            expression &= filter
+
+        filesystem, path = self.get_path(dataset)
+        try:
+            data = ds.dataset(path, filesystem=filesystem, format="parquet", schema=SCHEMAS[dataset], partitioning=PARTITIONING)
+        except FileNotFoundError:
+            return pd.DataFrame(columns=columns or SCHEMAS[dataset].names)
+        return data.to_table(columns=columns, filter=expression).to_pandas()
+
+    def load_verdicts(self, start_date, end_date=None, **kwargs):
+        return self.load(VERDICTS, start_date, end_date, **kwargs)
+
+    def load_tallies(self, start_date, end_date=None, **kwargs):
+        return self.load(TALLIES, start_date, end_date, **kwargs)
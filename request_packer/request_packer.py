@@ -0,0 +1,165 @@
+import json
+import os
+import threading
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+DEFAULT_MAX_ARTICLES_PER_REQUEST = 8
+DEFAULT_MAX_TOKENS_PER_ARTICLE = 8000
+# average for english news text, used when tiktoken isn't installed
+TOKENS_PER_WORD = 4 / 3
+VERDICTS = ("YES", "NO", "NA")
+
+
+class Tokenizer:
+    def __init__(self, model):
+        self.encoding = None
+        if tiktoken:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("o200k_base")
+
+    def count(self, text):
+        if self.encoding:
+            return len(self.encoding.encode(text))
+        return int(len(text.split()) * TOKENS_PER_WORD) + 1
+
+    def split(self, text, max_tokens):
+        if self.encoding:
+            tokens = self.encoding.encode(text)
+            return [self.encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+        words = text.split()
+        max_words = max(1, int(max_tokens / TOKENS_PER_WORD))
+        return [" ".join(words[i:i + max_words]) for i in range(0, len(words), max_words)]
+
+
+class PackingPlanner:
+    # groups one ticker's articles into as few requests as the budget allows. articles over
+    # max_tokens_per_article are either truncated or split into chunks that are answered
+    # separately and merged back into one verdict
+    def __init__(self, model, max_words_per_request, max_articles=None, max_tokens_per_article=None, oversize=None):
+        self.tokenizer = Tokenizer(model)
+        self.max_tokens_per_request = int(max_words_per_request * TOKENS_PER_WORD)
+        self.max_articles = max_articles or int(os.environ.get("PREDICT_PACK_MAX_ARTICLES", DEFAULT_MAX_ARTICLES_PER_REQUEST))
+        self.max_tokens_per_article = max_tokens_per_article or int(os.environ.get("PREDICT_PACK_MAX_ARTICLE_TOKENS", DEFAULT_MAX_TOKENS_PER_ARTICLE))
+        self.oversize = oversize or os.environ.get("PREDICT_PACK_OVERSIZE", "truncate")
+
+        self.lock = threading.Lock()
+        self.stats = {"articles": 0, "requests": 0, "tokens": 0, "max_request_tokens": 0, "truncated": 0, "chunked": 0, "fallbacks": 0}
+
+    def get_parts(self, content):
+        # (text, tokens) for every part an article is sent as
+        tokens = self.tokenizer.count(content)
+        if tokens <= self.max_tokens_per_article:
+            return [(content, tokens)], None
+
+        chunks = self.tokenizer.split(content, self.max_tokens_per_article)
+        if self.oversize == "chunk":
+            # an article can still only take up one whole request
+            max_chunks = max(1, self.max_tokens_per_request // self.max_tokens_per_article)
+            return [(chunk, self.tokenizer.count(chunk)) for chunk in chunks[:max_chunks]], "chunked"
+        return [(chunks[0], self.tokenizer.count(chunks[0]))], "truncated"
+
+    def truncate(self, content):
+        # articles sent one per request are cut to the same per article budget, chunking only
+        # applies to packed requests where the chunk verdicts can be merged
+        if self.tokenizer.count(content) <= self.max_tokens_per_article:
+            return content
+        self.incr("truncated")
+        return self.tokenizer.split(content, self.max_tokens_per_article)[0]
+
+    def plan(self, contents):
+        # returns a list of requests, each a list of (item_id, article_idx, text).
+        # articles are packed in order so reading the requests back in order keeps article order
+        requests = []
+        current, current_tokens, current_articles = [], 0, 0
+        for article_idx, content in enumerate(contents):
+            parts, oversize = self.get_parts(content)
+            article_tokens = sum(tokens for _, tokens in parts)
+            if oversize:
+                self.incr(oversize)
+
+            if current and (current_articles >= self.max_articles or current_tokens + article_tokens > self.max_tokens_per_request):
+                requests.append(current)
+                self.record_request(current_tokens)
+                current, current_tokens, current_articles = [], 0, 0
+
+            for chunk_idx, (text, _) in enumerate(parts):
+                item_id = f"{article_idx}" if len(parts) == 1 else f"{article_idx}.{chunk_idx}"
+                current.append((item_id, article_idx, text))
+            current_tokens += article_tokens
+            current_articles += 1
+
+        if current:
+            requests.append(current)
+            self.record_request(current_tokens)
+
+        self.incr("articles", len(contents))
+        return requests
+
+    def incr(self, name, value=1):
+        with self.lock:
+            self.stats[name] += value
+
+    def record_request(self, tokens):
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["tokens"] += tokens
+            self.stats["max_request_tokens"] = max(self.stats["max_request_tokens"], tokens)
+
+    def get_stats(self, since=None):
+        # since: an earlier get_stats() to count from, max_request_tokens stays the process high mark
+        since = since or {}
+        with self.lock:
+            stats = {name: value if name == "max_request_tokens" else value - since.get(name, 0) for name, value in self.stats.items()}
+        stats["requests_saved"] = stats["articles"] - stats["requests"]
+        stats["tokens_per_request"] = round(stats["tokens"] / stats["requests"]) if stats["requests"] else 0
+        return stats
+
+
+def build_packed_user_content(request):
+    return "\n\n".join(f'<article id="{item_id}">\n{text}\n</article>' for item_id, _, text in request)
+
+
+def normalize_verdict(answer):
+    answer = str(answer).strip().upper()
+    return answer if answer in VERDICTS else None
+
+
+def merge_verdicts(verdicts):
+    # chunks of one article: the majority of the chunks that had an opinion, NA on a tie
+    yes, no = verdicts.count("YES"), verdicts.count("NO")
+    if yes > no:
+        return "YES"
+    if no > yes:
+        return "NO"
+    return "NA"
+
+
+def parse_packed_answers(resp, request):
+    # {"answers": [{"id": "0", "answer": "YES"}, ...]} -> {article_idx: verdict}, articles the
+    # model skipped or answered out of format are missing so the caller can retry them alone
+    try:
+        answers = json.loads(resp).get("answers", [])
+    except (ValueError, AttributeError):
+        return {}
+
+    by_id = {}
+    for answer in answers:
+        if isinstance(answer, dict) and normalize_verdict(answer.get("answer")):
+            by_id[str(answer.get("id"))] = normalize_verdict(answer["answer"])
+
+    chunk_verdicts = {}
+    missing = set()
+    for item_id, article_idx, _ in request:
+        if item_id not in by_id:
+            missing.add(article_idx)
+            continue
+        chunk_verdicts.setdefault(article_idx, []).append(by_id[item_id])
+
+    return {article_idx: merge_verdicts(verdicts) for article_idx, verdicts in chunk_verdicts.items() if article_idx not in missing}
@@ -0,0 +1,108 @@
+import argparse
+import json
+import os
+import sys
+import time
+from dotenv import load_dotenv
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from codec.codec import get_codec, zstandard
+from article_store.article_store import read_pack_record
+
+load_dotenv("../.env")
+
+# compare stored size and encode/decode throughput of each codec on real articles
+# python bench_codec.py --dir ./articles
+# python bench_codec.py --run-id 954e7073-8118-4052-84e2-1220765a92d8 --limit 500
+
+
+def load_articles_from_dir(directory):
+    articles = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        with open(path, "r") as file:
+            if name.endswith(".ndjson"):
+                articles.extend(json.loads(line) for line in file if line.strip())
+            else:
+                articles.append(json.load(file))
+    return articles
+
+
+def load_articles_from_run(run_id, limit):
+    from google.cloud import storage
+    from pymongo.mongo_client import MongoClient
+    from pymongo.server_api import ServerApi
+    from codec.codec import decode_json
+
+    db = MongoClient(os.environ["MONGO_URI"], server_api=ServerApi('1')).get_database()
+    bucket = storage.Client().get_bucket(os.environ["STORAGE_BUCKET"])
+
+    articles = []
+    packs = {}
+    for scrape in db["scrapes"].find({"run_id": run_id}).limit(limit):
+        if "pack_key" in scrape:
+            if scrape["pack_key"] not in packs:
+                packs[scrape["pack_key"]] = bucket.blob(scrape["pack_key"]).download_as_bytes()
+            articles.append(read_pack_record(packs[scrape["pack_key"]], scrape["pack_offset"], scrape["pack_length"]))
+        elif "bucket_key" in scrape:
+            articles.append(decode_json(bucket.blob(scrape["bucket_key"]).download_as_bytes()))
+    return articles
+
+
+def bench(codec, payloads, repeat):
+    raw_bytes = sum(len(p) for p in payloads)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        encoded = [codec.encode(p) for p in payloads]
+    encode_secs = (time.perf_counter() - start) / repeat
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for e in encoded:
+            codec.decode(e)
+    decode_secs = (time.perf_counter() - start) / repeat
+
+    encoded_bytes = sum(len(e) for e in encoded)
+    mb = raw_bytes / 1024 / 1024
+    return {
+        "codec": f"{codec.name}:{getattr(codec, 'level', '-')}",
+        "raw_kb": raw_bytes // 1024,
+        "stored_kb": encoded_bytes // 1024,
+        "ratio": round(raw_bytes / encoded_bytes, 2),
+        "encode_mb_s": round(mb / encode_secs, 1) if encode_secs else 0,
+        "decode_mb_s": round(mb / decode_secs, 1) if decode_secs else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark article storage codecs")
+    parser.add_argument('--dir', type=str, help="Directory of article .json / .ndjson files")
+    parser.add_argument('--run-id', type=str, help="Pull articles scraped for this run id")
+    parser.add_argument('--limit', type=int, default=500, help="Max articles to pull for --run-id")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.dir:
+        articles = load_articles_from_dir(args.dir)
+    elif args.run_id:
+        articles = load_articles_from_run(args.run_id, args.limit)
+    else:
+        parser.error("one of --dir or --run-id is required")
+
+    # articles are stored one frame each, so benchmark at the same granularity
+    payloads = [(json.dumps(article) + "\n").encode("utf-8") for article in articles]
+    print(f"{len(payloads)} articles")
+
+    codecs = [get_codec("identity"), get_codec("gzip", 1), get_codec("gzip", 6), get_codec("gzip", 9)]
+    if zstandard:
+        codecs += [get_codec("zstd", 1), get_codec("zstd", 3), get_codec("zstd", 9)]
+
+    columns = ["codec", "raw_kb", "stored_kb", "ratio", "encode_mb_s", "decode_mb_s"]
+    print("".join(c.ljust(14) for c in columns))
+    for codec in codecs:
+        row = bench(codec, payloads, args.repeat)
+        print("".join(str(row[c]).ljust(14) for c in columns))
+
+
+main()
@@ -0,0 +1,62 @@
+import argparse
+import logging
+import os
+import sys
+from datetime import datetime, timezone, timedelta
+from dotenv import load_dotenv
+from google.cloud import storage
+from pymongo.mongo_client import MongoClient
+from pymongo.server_api import ServerApi
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from predict.predict import Predict
+from boilerplate.boilerplate import BoilerplateFilter, ParagraphCounter, DEFAULT_MIN_ARTICLES, DEFAULT_MIN_DAYS
+from article_store.article_store import STORAGE_FIELDS
+
+load_dotenv("../.env")
+
+# learn boilerplate paragraphs from the articles stored over the last few days, the scraper
+# strips them from every article it stores after this
+# python learn_boilerplate.py --days 14 --min-articles 20 --min-days 3
+# python learn_boilerplate.py --days 14 --dry-run
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Learn high frequency boilerplate paragraphs from stored articles")
+    parser.add_argument('--days', type=int, default=14, help="Scraped in the last N days")
+    parser.add_argument('--limit', type=int, default=20000, help="Max scrapes to read")
+    parser.add_argument('--min-articles', type=int, default=DEFAULT_MIN_ARTICLES, help="Distinct articles a paragraph has to be in")
+    parser.add_argument('--min-days', type=int, default=DEFAULT_MIN_DAYS, help="Distinct published days a paragraph has to be in")
+    parser.add_argument('--dry-run', action='store_true', help="Print what would be learned without saving it")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    logger = logging.getLogger("learn_boilerplate")
+
+    db = MongoClient(os.environ["MONGO_URI"], server_api=ServerApi('1')).get_database()
+    pred = Predict(logger, storage.Client(), db, None, None)
+
+    since = datetime.now(timezone.utc) - timedelta(days=args.days)
+    projection = {field: 1 for field in STORAGE_FIELDS + ("url", "published_at")}
+    scrapes = list(db["scrapes"].find({"scraped_at": {"$gte": since}, "source": "yahoo"}, projection).limit(args.limit))
+    published = {scrape.get("url"): scrape.get("published_at") for scrape in scrapes}
+    print(f"{len(scrapes)} scrapes since {since.date()}")
+
+    counter = ParagraphCounter()
+    num_articles = 0
+    for article in pred.iter_saved_articles(scrapes):
+        published_at = published.get(article.get("link"))
+        counter.add(article["content"], published_at.date().isoformat() if published_at else None)
+        num_articles += 1
+
+    boilerplate = counter.get_boilerplate(args.min_articles, args.min_days)
+    print(f"{num_articles} articles, {len(counter.seen_contents)} distinct, {len(counter.articles)} distinct paragraphs, {len(boilerplate)} boilerplate")
+    for fingerprint, entry in sorted(boilerplate.items(), key=lambda item: -item[1]["articles"])[:50]:
+        print(f"  {entry['articles']:>6} articles {entry['days']:>3} days  {entry['sample'][:100]!r}")
+
+    if not args.dry_run:
+        saved = BoilerplateFilter(db, logger).save(boilerplate)
+        print(f"saved {saved} fingerprints")
+
+
+main()
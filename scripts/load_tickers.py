@@ -0,0 +1,39 @@
+import argparse
+import csv
+import os
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+from pymongo.mongo_client import MongoClient
+from pymongo.server_api import ServerApi
+
+load_dotenv("../.env")
+
+# load ticker metadata for the predict prefilter, one row per ticker, aliases separated by |
+# symbol,name,aliases
+# WMT,Walmart Inc.,Wal-Mart|Sam's Club
+# python load_tickers.py --csv tickers.csv
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upsert ticker symbols, names and aliases into the tickers collection")
+    parser.add_argument('--csv', type=str, required=True, help="csv with symbol, name and aliases columns")
+    args = parser.parse_args()
+
+    db = MongoClient(os.environ["MONGO_URI"], server_api=ServerApi('1')).get_database()
+
+    ops = []
+    with open(args.csv, newline="", encoding="utf-8-sig") as file:
+        for row in csv.DictReader(file):
+            symbol = row["symbol"].strip().upper()
+            if not symbol:
+                continue
+            aliases = [alias.strip() for alias in (row.get("aliases") or "").split("|") if alias.strip()]
+            ops.append(UpdateOne({"symbol": symbol}, {"$set": {"symbol": symbol, "name": row.get("name", "").strip(), "aliases": aliases}}, upsert=True))
+
+    if ops:
+        db["tickers"].create_index("symbol", unique=True)
+        result = db["tickers"].bulk_write(ops, ordered=False)
+        print(f"{len(ops)} tickers, {result.upserted_count} new, {result.modified_count} updated")
+
+
+main()
@@ -0,0 +1,73 @@
+import argparse
+import json
+import logging
+import os
+import sys
+from collections import Counter
+from dotenv import load_dotenv
+from google.cloud import storage
+from pymongo.mongo_client import MongoClient
+from pymongo.server_api import ServerApi
+import pyarrow.dataset as ds
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from predict.predict import Predict
+from prediction_store.prediction_store import PredictionStore
+from ticker_filter.ticker_filter import TickerPrefilter
+
+load_dotenv("../.env")
+
+# score the ticker prefilter against the verdicts the model already gave for a run. the
+# prefilter "skips" an article it finds no mention in, a skip is right when the model said NA
+# python prefilter_report.py --run-id 954e7073-8118-4052-84e2-1220765a92d8 --lookback 24 --date 2024-10-01
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precision/recall of the ticker prefilter against historical model verdicts")
+    parser.add_argument('--run-id', type=str, required=True)
+    parser.add_argument('--lookback', type=int, default=24)
+    parser.add_argument('--date', type=str, required=True, help="Day the run was predicted, YYYY-MM-DD (utc)")
+    parser.add_argument('--examples', type=int, default=10, help="Missed mentions to print")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    logger = logging.getLogger("prefilter_report")
+
+    db = MongoClient(os.environ["MONGO_URI"], server_api=ServerApi('1')).get_database()
+    pred = Predict(logger, storage.Client(), db, None, None)
+    prefilter = TickerPrefilter(db, logger).load()
+
+    history = PredictionStore(logger).load_verdicts(
+        args.date, lookbacks=args.lookback, columns=["stock", "url", "verdict"], filter=ds.field("run_id") == args.run_id,
+    )
+    verdicts = {(row.stock, row.url): row.verdict for row in history.itertuples()}
+    print(f"{len(verdicts)} model verdicts for run_id {args.run_id}")
+
+    confusion = Counter()
+    missed = []
+    for stock, scrapes_for_stock in pred.get_stocks_list(args.lookback, args.run_id).items():
+        stock_sym = stock.lower()
+        for article in pred.iter_saved_articles(scrapes_for_stock):
+            verdict = verdicts.get((stock_sym, article.get('link')))
+            if not verdict:
+                continue
+            skipped = not prefilter.mentions(stock_sym, article['content'])
+            confusion[(skipped, verdict)] += 1
+            if skipped and verdict != "NA" and len(missed) < args.examples:
+                missed.append({"stock": stock_sym, "link": article.get('link'), "verdict": verdict, "title": article.get('title')})
+
+    total = sum(confusion.values())
+    skipped = sum(count for (was_skipped, _), count in confusion.items() if was_skipped)
+    skipped_na = confusion[(True, "NA")]
+    model_na = sum(count for (_, verdict), count in confusion.items() if verdict == "NA")
+    print(f"articles scored: {total}")
+    print(f"calls avoided: {skipped} ({round(100 * skipped / total, 1) if total else 0}%)")
+    # precision: skips the model agrees with, recall: the model's NAs the prefilter caught
+    print(f"precision: {round(skipped_na / skipped, 3) if skipped else 0}")
+    print(f"recall: {round(skipped_na / model_na, 3) if model_na else 0}")
+    print(f"votes lost: YES {confusion[(True, 'YES')]}, NO {confusion[(True, 'NO')]}")
+    print(f"missed mentions: {json.dumps(missed, indent=2)}")
+    print(f"prefilter: {json.dumps(prefilter.get_stats())}")
+
+
+main()
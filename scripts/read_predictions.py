@@ -0,0 +1,48 @@
+import argparse
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timezone, timedelta
+from dotenv import load_dotenv
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from prediction_store.prediction_store import PredictionStore
+
+load_dotenv("../.env")
+
+# pull prediction history out of the parquet store
+# python read_predictions.py --days 30 --lookback 24
+# python read_predictions.py --start 2024-10-01 --end 2024-10-31 --verdicts --stocks wmt hd --out october.csv
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read predictions from the parquet prediction store")
+    parser.add_argument('--start', type=str, help="First day, YYYY-MM-DD (utc)")
+    parser.add_argument('--end', type=str, help="Last day, YYYY-MM-DD (utc), defaults to today")
+    parser.add_argument('--days', type=int, default=7, help="Days back from --end when --start is not given")
+    parser.add_argument('--lookback', type=int, nargs='*', help="Only these lookbacks")
+    parser.add_argument('--stocks', type=str, nargs='*', help="Only these stocks")
+    parser.add_argument('--verdicts', action='store_true', help="Per article verdicts instead of per stock tallies")
+    parser.add_argument('--columns', type=str, nargs='*', help="Only read these columns")
+    parser.add_argument('--out', type=str, help="Write the result to this csv")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    store = PredictionStore(logging.getLogger("read_predictions"))
+
+    end = args.end or datetime.now(timezone.utc).date().isoformat()
+    start = args.start or (datetime.fromisoformat(end) - timedelta(days=args.days)).date().isoformat()
+    load = store.load_verdicts if args.verdicts else store.load_tallies
+
+    started = time.perf_counter()
+    df = load(start, end, lookbacks=args.lookback, stocks=args.stocks, columns=args.columns)
+    print(f"{len(df)} rows from {start} to {end} in {round(time.perf_counter() - started, 2)}s")
+
+    if args.out:
+        df.to_csv(args.out, index=False)
+    else:
+        print(df.head(50).to_string(index=False))
+
+
+main()
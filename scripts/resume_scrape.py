@@ -0,0 +1,37 @@
+import argparse
+import logging
+import os
+import sys
+from dotenv import load_dotenv
+from google.cloud import storage
+from pymongo.mongo_client import MongoClient
+from pymongo.server_api import ServerApi
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from yahoo.yahoo import Yahoo
+
+load_dotenv("../.env")
+
+# re-scrape only the stocks with success: False in stock_prices for a run
+# python resume_scrape.py --run-id 954e7073-8118-4052-84e2-1220765a92d8 --max-passes 3
+
+def main():
+    parser = argparse.ArgumentParser(description="Retry the failed stocks of a scrape run")
+    parser.add_argument('--run-id', type=str, required=True, help="The run ID to resume")
+    parser.add_argument('--max-passes', type=int, default=None, help="Max retry passes over the failed stocks")
+    parser.add_argument('--base-delay', type=float, default=None, help="Base backoff delay in seconds between passes")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger("resume_scrape")
+
+    db = MongoClient(os.environ["MONGO_URI"], server_api=ServerApi('1')).get_database()
+    yahoo_scraper = Yahoo(logger, storage.Client(), db)
+
+    remaining_failures = yahoo_scraper.resume(args.run_id, args.max_passes, args.base_delay)
+    if remaining_failures:
+        print(f"{len(remaining_failures)} stocks still failing for run {args.run_id}: {', '.join(remaining_failures)}")
+        sys.exit(1)
+    print(f"all stocks scraped for run {args.run_id}")
+
+main()
@@ -0,0 +1,66 @@
+import argparse
+import json
+import logging
+import os
+import sys
+from collections import Counter
+from dotenv import load_dotenv
+from google.cloud import storage
+from pymongo.mongo_client import MongoClient
+from pymongo.server_api import ServerApi
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from predict.predict import Predict
+
+load_dotenv("../.env")
+
+# classify the same articles one per request and packed, and compare the answers
+# python validate_packing.py --run-id 954e7073-8118-4052-84e2-1220765a92d8 --lookback 24 --max-stocks 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check packed classification against per-article classification")
+    parser.add_argument('--run-id', type=str, required=True)
+    parser.add_argument('--lookback', type=int, default=24)
+    parser.add_argument('--max-stocks', type=int, default=20)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    logger = logging.getLogger("validate_packing")
+
+    db = MongoClient(os.environ["MONGO_URI"], server_api=ServerApi('1')).get_database()
+    pred = Predict(logger, storage.Client(), db, None, None)
+    # both sides have to actually ask the model
+    pred.cache = None
+
+    confusion = Counter()
+    tally_diffs = {}
+    stocks = pred.get_stocks_list(args.lookback, args.run_id)
+    for stock, scrapes_for_stock in list(stocks.items())[:args.max_stocks]:
+        stock_sym = stock.lower()
+        articles = [a for a in pred.collect_saved_articles_from_storage(scrapes_for_stock) if "content" in a]
+
+        single = [pred.classify_article(stock_sym, article) for article in articles]
+        packed = []
+        for request in pred.planner.plan([article['content'] for article in articles]):
+            packed.extend(pred.classify_packed_request(stock_sym, request))
+
+        confusion.update(zip(single, packed))
+        single_tally = Counter(v for v in single if v)
+        packed_tally = Counter(v for v in packed if v)
+        if single_tally != packed_tally:
+            tally_diffs[stock_sym] = {"single": dict(single_tally), "packed": dict(packed_tally)}
+        print(f"{stock_sym}: {len(articles)} articles, agreement {sum(a == b for a, b in zip(single, packed))}/{len(articles)}")
+
+    total = sum(confusion.values())
+    agreed = sum(count for (a, b), count in confusion.items() if a == b)
+    print(f"\nagreement: {agreed}/{total} ({round(100 * agreed / total, 1) if total else 0}%)")
+    print("single -> packed:")
+    for (a, b), count in sorted(confusion.items(), key=lambda item: -item[1]):
+        print(f"  {a} -> {b}: {count}")
+    print(f"stocks with a different tally: {json.dumps(tally_diffs, indent=2)}")
+    print(f"packing: {json.dumps(pred.planner.get_stats())}")
+    print(f"openai: {json.dumps(pred.classifier.get_stats())}")
+
+
+main()
@@ -0,0 +1,7 @@
+def percentile(values, pct):
+    # nearest rank on a sorted copy, 0 for no values
+    if not values:
+        return 0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
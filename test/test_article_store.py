@@ -0,0 +1,86 @@
+import unittest
+import gzip
+from concurrent.futures import Future
+from unittest.mock import Mock, MagicMock
+from article_store.article_store import ArticleStore, ArticlePrefetcher, build_pack, read_pack_record, get_storage_fields, get_decoded_size
+from codec.codec import GzipCodec, get_codec
+
+ARTICLES = [
+    {"link": "https://a", "content": "first article", "published_at": "2024-10-05T20:00:00.000Z"},
+    {"link": "https://b", "content": "second article — with unicode"},
+    {"link": "https://c", "content": "third article"},
+]
+
+class TestPack(unittest.TestCase):
+    def test_records_round_trip_by_offset(self):
+        pack, index = build_pack(ARTICLES, get_codec())
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index[0]["pack_offset"], 0)
+        self.assertEqual(index[1]["pack_offset"], index[0]["pack_length"])
+
+        for article, offsets in zip(ARTICLES, index):
+            self.assertEqual(read_pack_record(pack, offsets["pack_offset"], offsets["pack_length"]), article)
+
+    def test_gzip_pack_is_ndjson_stream(self):
+        pack, index = build_pack(ARTICLES, GzipCodec())
+        self.assertEqual([read_pack_record(pack, offsets["pack_offset"], offsets["pack_length"]) for offsets in index], ARTICLES)
+        self.assertEqual(gzip.decompress(pack).decode("utf-8").count("\n"), 3)
+
+    def test_get_storage_fields(self):
+        self.assertEqual(get_storage_fields({"bucket_key": "k", "url": "u"}), {"bucket_key": "k"})
+        self.assertEqual(
+            get_storage_fields({"pack_key": "p", "pack_offset": 0, "pack_length": 10, "stock": "wmt"}),
+            {"pack_key": "p", "pack_offset": 0, "pack_length": 10},
+        )
+
+class TestArticleStore(unittest.TestCase):
+    def test_write_pack_is_one_upload(self):
+        bucket = MagicMock()
+        store = ArticleStore(Mock(), bucket)
+        index = store.write_pack("scrapes/run/wmt/yahoo/1.ndjson.gz", ARTICLES)
+
+        bucket.blob.assert_called_once_with("scrapes/run/wmt/yahoo/1.ndjson.gz")
+        bucket.blob.return_value.upload_from_string.assert_called_once()
+        self.assertEqual(len(index), 3)
+
+class TestArticlePrefetcher(unittest.TestCase):
+    def test_in_flight_bytes_stay_under_cap(self):
+        import threading
+        lock = threading.Lock()
+        running = []
+        max_running = []
+
+        def download(i):
+            with lock:
+                running.append(i)
+                max_running.append(len(running))
+            threading.Event().wait(0.01)
+            with lock:
+                running.remove(i)
+            return i
+
+        prefetcher = ArticlePrefetcher(max_workers=8, max_bytes=300)
+        results = list(prefetcher.iter_results((100, download, (i,)) for i in range(10)))
+
+        self.assertEqual(results, list(range(10)))
+        self.assertLessEqual(prefetcher.max_bytes_seen, 300)
+        self.assertLessEqual(max(max_running), 3)
+
+    def test_task_bigger_than_cap_still_runs(self):
+        prefetcher = ArticlePrefetcher(max_workers=2, max_bytes=10)
+        self.assertEqual(list(prefetcher.iter_results([(100, lambda: "big", ()), (5, lambda: "small", ())])), ["big", "small"])
+
+    def test_finished_results_count_their_decoded_size(self):
+        prefetcher = ArticlePrefetcher(max_workers=2, max_bytes=1000, size_fn=get_decoded_size)
+        done, running = Future(), Future()
+        done.set_result([{"content": "x" * 400}])
+        self.assertEqual(prefetcher.measure([[100, done, False], [100, running, False]]), 500)
+
+    def test_peak_is_reported_in_decoded_bytes(self):
+        prefetcher = ArticlePrefetcher(max_workers=2, max_bytes=1000, size_fn=get_decoded_size)
+        list(prefetcher.iter_results([(10, lambda: [{"content": "x" * 400}], ())]))
+        self.assertEqual(prefetcher.max_bytes_seen, 400)
+
+    def test_get_decoded_size(self):
+        self.assertEqual(get_decoded_size([{"link": "ab", "content": "cde", "n": 1}]), 5)
+        self.assertEqual(get_decoded_size([]), 0)
@@ -0,0 +1,35 @@
+import unittest
+import threading
+from article_stream.article_stream import ArticleStream
+
+
+class TestArticleStream(unittest.TestCase):
+    def test_every_consumer_sees_the_end(self):
+        stream = ArticleStream(maxsize=2)
+        seen = []
+        lock = threading.Lock()
+
+        def consume():
+            for item in stream:
+                with lock:
+                    seen.append(item)
+
+        consumers = [threading.Thread(target=consume) for _ in range(3)]
+        for consumer in consumers:
+            consumer.start()
+
+        # more articles than the stream holds, put blocks until the consumers catch up
+        stream.put_articles("wmt", [{"link": str(i)} for i in range(5)])
+        stream.put_scrapes("hd", [{"pack_key": "k"}])
+        stream.put_scrapes("hd", [])
+        stream.close()
+        for consumer in consumers:
+            consumer.join(timeout=5)
+
+        self.assertFalse(any(consumer.is_alive() for consumer in consumers))
+        self.assertEqual(len(seen), 6)
+        self.assertEqual(sorted(item["article"]["link"] for item in seen if "article" in item), ["0", "1", "2", "3", "4"])
+
+
+if __name__ == '__main__':
+    unittest.main()
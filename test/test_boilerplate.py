@@ -0,0 +1,53 @@
+import unittest
+from unittest.mock import Mock, MagicMock
+from boilerplate.boilerplate import BoilerplateFilter, ParagraphCounter, get_fingerprint
+
+DISCLAIMER = "Zacks Investment Research: the views and opinions expressed herein are the views of the author."
+READ_MORE = "Read more: Top 5 stocks to buy in 2024"
+
+
+class TestFingerprint(unittest.TestCase):
+    def test_ignores_case_punctuation_and_numbers(self):
+        self.assertEqual(get_fingerprint("Read more: Top 5 stocks to buy in 2024"), get_fingerprint("read more  top 7 stocks to buy in 2025!"))
+        self.assertNotEqual(get_fingerprint(READ_MORE), get_fingerprint("Walmart raised its outlook"))
+        self.assertIsNone(get_fingerprint(" -- "))
+
+
+class TestParagraphCounter(unittest.TestCase):
+    def test_needs_many_articles_over_many_days(self):
+        counter = ParagraphCounter()
+        for i in range(30):
+            counter.add(f"Story {'x' * (i + 1)} about walmart\n{DISCLAIMER}\n{DISCLAIMER}", f"2024-10-{i % 5 + 1:02d}")
+        # one wire story copied thirty times on the same day
+        for i in range(30):
+            counter.add(f"Copy {'x' * (i + 1)}\nThe wire story body everyone syndicated", "2024-10-01")
+        # exact copies count once
+        counter.add(f"Story x about walmart\n{DISCLAIMER}\n{DISCLAIMER}", "2024-10-09")
+
+        boilerplate = counter.get_boilerplate(min_articles=20, min_days=3)
+        self.assertEqual(list(boilerplate), [get_fingerprint(DISCLAIMER)])
+        self.assertEqual((boilerplate[get_fingerprint(DISCLAIMER)]["articles"], boilerplate[get_fingerprint(DISCLAIMER)]["days"]), (30, 5))
+
+
+class TestBoilerplateFilter(unittest.TestCase):
+    def build(self):
+        db = MagicMock()
+        db["boilerplate_paragraphs"].find.return_value = [{"_id": get_fingerprint(DISCLAIMER)}, {"_id": get_fingerprint(READ_MORE)}]
+        tokenizer = Mock()
+        tokenizer.count.side_effect = lambda text: len(text.split())
+        return BoilerplateFilter(db, Mock(), tokenizer).load()
+
+    def test_strips_learned_paragraphs(self):
+        boilerplate = self.build()
+        kept, tokens_saved = boilerplate.strip(["Walmart raised its outlook.", READ_MORE, "Shares rose 3%.", DISCLAIMER])
+        self.assertEqual(kept, ["Walmart raised its outlook.", "Shares rose 3%."])
+        self.assertEqual(tokens_saved, len(READ_MORE.split()) + len(DISCLAIMER.split()))
+
+    def test_all_boilerplate_is_left_alone(self):
+        boilerplate = self.build()
+        self.assertEqual(boilerplate.strip([READ_MORE, DISCLAIMER]), ([READ_MORE, DISCLAIMER], 0))
+        self.assertEqual(boilerplate.strip(["Nothing to strip"]), (["Nothing to strip"], 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
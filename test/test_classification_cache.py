@@ -0,0 +1,87 @@
+import unittest
+from datetime import datetime, timezone, timedelta
+from unittest.mock import Mock, MagicMock, patch
+from classification_cache.classification_cache import ClassificationCache
+
+
+class TestClassificationCache(unittest.TestCase):
+    def build(self, **kwargs):
+        db = MagicMock()
+        collection = db["classification_cache"]
+        collection.find_one.return_value = None
+        return ClassificationCache(db, Mock(), **kwargs), collection
+
+    def test_key_covers_model_prompt_stock_and_content(self):
+        cache, _ = self.build()
+        key = cache.make_key("gpt-4o-mini", "p1", "WMT", "article")
+        self.assertEqual(key, cache.make_key("gpt-4o-mini", "p1", "wmt", "article"))
+        self.assertNotEqual(key, cache.make_key("gpt-4o", "p1", "wmt", "article"))
+        self.assertNotEqual(key, cache.make_key("gpt-4o-mini", "p2", "wmt", "article"))
+        self.assertNotEqual(key, cache.make_key("gpt-4o-mini", "p1", "hd", "article"))
+        self.assertNotEqual(key, cache.make_key("gpt-4o-mini", "p1", "wmt", "article 2"))
+
+    def test_memory_then_mongo_then_miss(self):
+        cache, collection = self.build()
+        cache.put("a", "YES", stock="wmt")
+        self.assertEqual(cache.get("a"), "YES")
+        self.assertTrue(collection.update_one.call_args[1]["upsert"])
+        collection.create_index.assert_called_once()
+
+        collection.find_one.return_value = {"_id": "b", "answer": "NO", "created_at": datetime.now(timezone.utc).replace(tzinfo=None)}
+        self.assertEqual(cache.get("b"), "NO")
+        # now served from memory
+        collection.find_one.return_value = None
+        self.assertEqual(cache.get("b"), "NO")
+        self.assertIsNone(cache.get("c"))
+
+        stats = cache.get_stats()
+        self.assertEqual((stats["memory_hits"], stats["mongo_hits"], stats["misses"]), (2, 1, 1))
+        self.assertEqual(stats["hit_rate"], 0.75)
+
+        # counted from a snapshot, hit_rate is recomputed for the window only
+        cache.get("c")
+        since = cache.get_stats(stats)
+        self.assertEqual((since["memory_hits"], since["mongo_hits"], since["misses"]), (0, 0, 1))
+        self.assertEqual(since["hit_rate"], 0)
+        self.assertEqual(since["entries"], stats["entries"])
+
+    def test_lru_eviction(self):
+        cache, collection = self.build(max_entries=2)
+        cache.put("a", "YES")
+        cache.put("b", "NO")
+        cache.get("a")
+        cache.put("c", "NA")
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "YES")
+        self.assertEqual(cache.get_stats()["evictions"], 1)
+
+    def test_expired_memory_entries_are_dropped(self):
+        cache, _ = self.build(ttl_hours=1)
+        cache.put_in_memory("a", "YES", datetime.now(timezone.utc) - timedelta(seconds=1))
+        self.assertIsNone(cache.get("a"))
+
+    def test_mongo_tier_is_pruned_to_max_docs(self):
+        cache, collection = self.build(max_docs=3)
+        collection.count_documents.return_value = 5
+        oldest_kept = datetime(2024, 5, 2, tzinfo=timezone.utc)
+        collection.find.return_value.sort.return_value.skip.return_value.limit.return_value = [{"created_at": oldest_kept}]
+        collection.delete_many.return_value.deleted_count = 2
+
+        self.assertEqual(cache.prune(), 2)
+        collection.find.return_value.sort.return_value.skip.assert_called_once_with(2)
+        collection.delete_many.assert_called_once_with({"created_at": {"$lt": oldest_kept}})
+        self.assertEqual(cache.get_stats()["pruned"], 2)
+
+    def test_prune_runs_every_so_many_puts(self):
+        cache, collection = self.build(max_docs=10)
+        collection.count_documents.return_value = 0
+        with patch("classification_cache.classification_cache.PRUNE_EVERY_PUTS", 2):
+            for key in "abcde":
+                cache.put(key, "YES")
+        self.assertEqual(collection.count_documents.call_count, 2)
+        collection.delete_many.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+import unittest
+import json
+import httpx
+import openai
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+from classifier.classifier import ClassificationEngine, BatchClassifier, estimate_tokens, get_retry_after
+from job_manager.job_manager import JobCancelled
+
+
+def build_completion(content, total_tokens=10):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=SimpleNamespace(total_tokens=total_tokens),
+    )
+
+
+def build_rate_limit_error(headers):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(429, headers=headers, request=request)
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+class TestClassificationEngine(unittest.TestCase):
+    def build(self, client, **kwargs):
+        return ClassificationEngine(Mock(), client=client, max_in_flight=4, rpm=6000, tpm=1000000, **kwargs)
+
+    def test_retry_after_headers(self):
+        self.assertEqual(get_retry_after(build_rate_limit_error({"retry-after-ms": "1500"})), 1.5)
+        self.assertEqual(get_retry_after(build_rate_limit_error({"retry-after": "2"})), 2)
+        self.assertIsNone(get_retry_after(build_rate_limit_error({})))
+        self.assertIsNone(get_retry_after(Exception("no response")))
+
+    @patch("classifier.classifier.time.sleep")
+    def test_rate_limit_is_retried_after_retry_after(self, mock_sleep):
+        client = Mock()
+        client.chat.completions.create.side_effect = [build_rate_limit_error({"retry-after": "3"}), build_completion("YES")]
+        engine = self.build(client)
+
+        self.assertEqual(engine.complete("model", [{"role": "user", "content": "text"}]), "YES")
+        mock_sleep.assert_called_with(3.0)
+        stats = engine.get_stats()
+        self.assertEqual((stats["requests"], stats["retries"], stats["rate_limited"]), (2, 1, 1))
+
+    @patch("classifier.classifier.time.sleep")
+    def test_gives_up_after_max_retries(self, mock_sleep):
+        client = Mock()
+        client.chat.completions.create.side_effect = build_rate_limit_error({"retry-after": "1"})
+        engine = self.build(client, max_retries=2)
+
+        with self.assertRaises(openai.RateLimitError):
+            engine.complete("model", [{"role": "user", "content": "text"}])
+        self.assertEqual(client.chat.completions.create.call_count, 3)
+        self.assertEqual(engine.get_stats()["failed"], 1)
+
+    def test_submit_keeps_order(self):
+        client = Mock()
+        client.chat.completions.create.side_effect = lambda model, messages: build_completion(messages[0]["content"])
+        engine = self.build(client)
+
+        futures = [engine.submit(engine.complete, "model", [{"role": "user", "content": str(i)}]) for i in range(20)]
+        self.assertEqual([f.result() for f in futures], [str(i) for i in range(20)])
+        engine.close()
+
+    def test_estimate_tokens(self):
+        self.assertEqual(estimate_tokens([{"content": "a" * 400}, {"content": "b" * 40}]), 111)
+
+
+class FakeBatchApi:
+    # just enough of the files and batches endpoints for the openai client to run a batch locally.
+    # every chat request is answered with its last message, "fail" in the content fails it
+    def __init__(self, polls_until_done=2):
+        self.files = {}
+        self.batches = {}
+        self.polls_until_done = polls_until_done
+
+    def build_client(self):
+        http_client = httpx.Client(transport=httpx.MockTransport(self.handle))
+        return openai.OpenAI(api_key="test", base_url="http://fake-openai/v1", http_client=http_client, max_retries=0)
+
+    def add_file(self, content):
+        file_id = f"file-{len(self.files)}"
+        self.files[file_id] = content
+        return {"id": file_id, "object": "file", "bytes": len(content), "created_at": 0, "filename": "batch.jsonl", "purpose": "batch", "status": "processed"}
+
+    def get_batch(self, batch_id):
+        batch = self.batches[batch_id]
+        batch["polls"] += 1
+        if batch["polls"] >= self.polls_until_done and batch["status"] != "completed":
+            self.complete(batch)
+        return {key: value for key, value in batch.items() if key not in ("polls", "input")}
+
+    def complete(self, batch):
+        output, errors = [], []
+        for line in self.files[batch["input_file_id"]].decode().splitlines():
+            request = json.loads(line)
+            content = request["body"]["messages"][-1]["content"]
+            if "fail" in content:
+                errors.append(json.dumps({"custom_id": request["custom_id"], "response": {"status_code": 500, "body": {}}}))
+                continue
+            body = {"choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]}
+            output.append(json.dumps({"custom_id": request["custom_id"], "response": {"status_code": 200, "body": body}}))
+
+        batch["status"] = "completed"
+        batch["output_file_id"] = self.add_file("\n".join(output).encode())["id"]
+        if errors:
+            batch["error_file_id"] = self.add_file("\n".join(errors).encode())["id"]
+
+    def handle(self, request):
+        path = request.url.path
+        if request.method == "POST" and path == "/v1/files":
+            # multipart body, the jsonl lines are the only lines starting with {"custom_id"
+            lines = [line for line in request.content.split(b"\r\n") if line.startswith(b'{"custom_id"')]
+            return httpx.Response(200, json=self.add_file(b"\n".join(lines)))
+        if request.method == "POST" and path == "/v1/batches":
+            payload = json.loads(request.content)
+            batch_id = f"batch-{len(self.batches)}"
+            self.batches[batch_id] = {
+                "id": batch_id, "object": "batch", "endpoint": payload["endpoint"], "input_file_id": payload["input_file_id"],
+                "completion_window": "24h", "status": "validating", "created_at": 0, "metadata": payload.get("metadata"), "polls": 0,
+            }
+            return httpx.Response(200, json=self.get_batch(batch_id))
+        if request.method == "POST" and path.endswith("/cancel"):
+            batch = self.batches[path.split("/")[-2]]
+            batch["status"] = "cancelled"
+            return httpx.Response(200, json=self.get_batch(batch["id"]))
+        if request.method == "GET" and path.startswith("/v1/batches/"):
+            return httpx.Response(200, json=self.get_batch(path.rsplit("/", 1)[1]))
+        if request.method == "GET" and path.endswith("/content"):
+            return httpx.Response(200, content=self.files[path.split("/")[-2]])
+        return httpx.Response(404, json={"error": {"message": f"no route for {path}"}})
+
+
+class TestBatchClassifier(unittest.TestCase):
+    def test_batch_round_trip(self):
+        api = FakeBatchApi(polls_until_done=3)
+        classifier = BatchClassifier(Mock(), client=api.build_client(), poll_secs=0, max_requests=2)
+
+        requests = [(f"wmt:{i}", [{"role": "user", "content": answer}]) for i, answer in enumerate(["YES", "NO", "fail", "NA"])]
+        results = classifier.run("model", requests, {"run_id": "run"})
+
+        self.assertEqual(results, {"wmt:0": "YES", "wmt:1": "NO", "wmt:3": "NA"})
+        # max_requests splits the run into two batches
+        self.assertEqual(len(api.batches), 2)
+        self.assertEqual(api.batches["batch-0"]["metadata"], {"run_id": "run"})
+
+    def test_wait_times_out(self):
+        api = FakeBatchApi(polls_until_done=100)
+        classifier = BatchClassifier(Mock(), client=api.build_client(), poll_secs=0, timeout_secs=0.01)
+        batch = classifier.submit("model", [("wmt:0", [{"role": "user", "content": "YES"}])])
+        with self.assertRaises(TimeoutError):
+            classifier.wait(batch.id)
+
+    def test_cancelled_job_cancels_batch(self):
+        api = FakeBatchApi(polls_until_done=100)
+        classifier = BatchClassifier(Mock(), client=api.build_client(), poll_secs=0)
+        job = Mock()
+        job.cancel_event.wait.return_value = True
+        # not cancelled yet when the batch is submitted
+        job.check_cancelled.side_effect = [None, JobCancelled("cancelled")]
+
+        with self.assertRaises(JobCancelled):
+            classifier.run("model", [("wmt:0", [{"role": "user", "content": "YES"}])], job=job)
+        self.assertEqual(api.batches["batch-0"]["status"], "cancelled")
+
+
+if __name__ == '__main__':
+    unittest.main()
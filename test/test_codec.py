@@ -0,0 +1,48 @@
+import unittest
+import json
+from concurrent.futures import ThreadPoolExecutor
+from codec.codec import GzipCodec, ZstdCodec, IdentityCodec, get_codec, get_codec_name, decode_json, zstandard
+
+ARTICLE = {"link": "https://finance.yahoo.com/news/a.html", "content": "Walmart said on Saturday. " * 50}
+
+
+def encode_article(codec):
+    return codec.encode(json.dumps(ARTICLE).encode("utf-8"))
+
+class TestCodec(unittest.TestCase):
+    def get_codecs(self):
+        codecs = [GzipCodec(), IdentityCodec()]
+        if zstandard:
+            codecs.append(ZstdCodec())
+        return codecs
+
+    def test_round_trip_and_marker(self):
+        for codec in self.get_codecs():
+            with self.subTest(codec=codec.name):
+                payload = encode_article(codec)
+                self.assertEqual(get_codec_name(payload), codec.name)
+                self.assertEqual(decode_json(payload), ARTICLE)
+
+    def test_compression_shrinks_payload(self):
+        plain = encode_article(IdentityCodec())
+        self.assertLess(len(encode_article(GzipCodec())), len(plain) / 5)
+
+    def test_legacy_plain_json(self):
+        self.assertEqual(decode_json(json.dumps(ARTICLE).encode()), ARTICLE)
+        self.assertEqual(decode_json(json.dumps(ARTICLE)), ARTICLE)
+
+    @unittest.skipUnless(zstandard, "zstandard is not installed")
+    def test_shared_zstd_codec_across_threads(self):
+        codec = ZstdCodec()
+        articles = [dict(ARTICLE, content=f"{i} " + ARTICLE["content"] * (i % 7 + 1)) for i in range(400)]
+
+        def round_trip(article):
+            return json.loads(codec.decode(codec.encode(json.dumps(article).encode("utf-8"))))
+
+        with ThreadPoolExecutor(max_workers=32) as executor:
+            self.assertEqual(list(executor.map(round_trip, articles)), articles)
+
+    def test_get_codec(self):
+        self.assertEqual(get_codec("gzip", level=9).level, 9)
+        self.assertEqual(get_codec("identity", level=9).name, "identity")
+        self.assertEqual(get_codec().name, "zstd" if zstandard else "gzip")
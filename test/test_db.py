@@ -0,0 +1,19 @@
+import unittest
+from unittest.mock import Mock, MagicMock
+from database.db import ensure_indexes
+
+
+class TestEnsureIndexes(unittest.TestCase):
+    def test_compound_indexes(self):
+        collections = {}
+        db = MagicMock()
+        db.__getitem__.side_effect = lambda name: collections.setdefault(name, MagicMock())
+        ensure_indexes(db, Mock())
+
+        collections["scrapes"].create_index.assert_called_once_with([("run_id", 1), ("published_at", 1)])
+        collections["stock_prices"].create_index.assert_called_once_with([("run_id", 1), ("success", 1)])
+        collections["runs"].create_index.assert_called_once_with([("job_id", 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import random
+import unittest
+from unittest.mock import Mock, MagicMock
+from dedupe.dedupe import NearDuplicateIndex, DEFAULT_MAX_DISTANCE, simhash, hamming, get_bands
+
+
+def make_story(seed, num_words=300):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(["shares", "walmart", "rose", "fell", "quarter", "guidance", "analysts", "retail", "margin", "sales"]) + str(rng.randint(0, 99)) for _ in range(num_words))
+
+
+class TestSimhash(unittest.TestCase):
+    def test_near_copies_are_close_and_other_stories_are_not(self):
+        story = make_story(1)
+        wire_copy = "By Reuters staff. " + story + " Reporting by Reuters."
+        self.assertLessEqual(hamming(simhash(story), simhash(wire_copy)), DEFAULT_MAX_DISTANCE)
+        self.assertGreater(hamming(simhash(story), simhash(make_story(2))), 10)
+
+    def test_short_text_is_not_signed(self):
+        self.assertIsNone(simhash("too short to sign"))
+
+    def test_bands_share_one_within_distance(self):
+        signature = simhash(make_story(1))
+        flipped = signature ^ (1 << 3) ^ (1 << 20) ^ (1 << 40)
+        self.assertTrue(set(get_bands(signature, 4)) & set(get_bands(flipped, 4)))
+        self.assertEqual(len(get_bands(signature, 3)), 3)
+
+
+class TestNearDuplicateIndex(unittest.TestCase):
+    def build(self):
+        db = MagicMock()
+        collection = db["article_signatures"]
+        collection.find.return_value = []
+        return NearDuplicateIndex(db, Mock(), max_distance=3), collection
+
+    def test_run_duplicates(self):
+        index, _ = self.build()
+        seen = []
+        story = make_story(1)
+        self.assertFalse(index.is_run_duplicate(index.sign(story), seen))
+        self.assertTrue(index.is_run_duplicate(index.sign(story + " Updated."), seen))
+        self.assertFalse(index.is_run_duplicate(index.sign(make_story(2)), seen))
+        self.assertFalse(index.is_run_duplicate(None, seen))
+        self.assertEqual(len(seen), 2)
+        self.assertEqual(index.get_stats()["run_duplicates"], 1)
+
+    def test_prior_verdict_checks_distance(self):
+        index, collection = self.build()
+        signature = simhash(make_story(1))
+        collection.find.return_value = [
+            {"signature": f"{signature ^ 0xff:016x}", "verdict": "NO"},
+            {"signature": f"{signature ^ 0x1:016x}", "verdict": "YES"},
+        ]
+        self.assertEqual(index.get_prior_verdict("WMT", signature, "gpt-4o-mini", "p"), "YES")
+        query = collection.find.call_args[0][0]
+        self.assertEqual((query["stock"], query["bands"]["$in"]), ("wmt", get_bands(signature, 4)))
+
+    def test_save_upserts_hex_signature(self):
+        index, collection = self.build()
+        index.save("WMT", 2 ** 63 + 5, "YES", "gpt-4o-mini", "p", "https://a")
+        query, update = collection.update_one.call_args[0]
+        self.assertEqual(query["signature"], "8000000000000005")
+        self.assertEqual(update["$set"]["verdict"], "YES")
+        index.save("WMT", None, "YES", "gpt-4o-mini", "p")
+        self.assertEqual(collection.update_one.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
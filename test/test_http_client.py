@@ -0,0 +1,57 @@
+import unittest
+import asyncio
+import httpx
+from unittest.mock import Mock
+from http_client.http_client import HttpClient, RequestStats
+from throttle.throttle import AimdController
+
+class TestRequestStats(unittest.TestCase):
+    def test_record_splits_handshake_and_download(self):
+        stats = RequestStats()
+        stats.record({"connect": 0.01, "tls": 0.02, "download": 0.1, "total": 0.2}, 200, 100)
+        stats.record({"download": 0.05, "total": 0.1}, 200, 50)
+        stats.record({"total": 5}, None)
+
+        summary = stats.summary()
+        self.assertEqual(summary["requests"], 3)
+        self.assertEqual(summary["errors"], 1)
+        self.assertEqual(summary["new_connections"], 1)
+        self.assertEqual(summary["bytes_downloaded"], 150)
+        self.assertEqual(summary["status_codes"], {"200": 2})
+        self.assertEqual(summary["handshake_ms"]["p95"], 30.0)
+        self.assertEqual(summary["download_ms"]["avg"], 75.0)
+
+class TestHttpClient(unittest.TestCase):
+    def test_get_records_stats_and_sends_headers(self):
+        seen_headers = []
+
+        def handler(request):
+            seen_headers.append(request.headers)
+            return httpx.Response(200, text="ok")
+
+        async def run():
+            async with HttpClient(Mock(), transport=httpx.MockTransport(handler)) as http:
+                response = await http.get("https://finance.yahoo.com/quote/wmt")
+                return response, http.get_stats()
+
+        response, stats = asyncio.run(run())
+        self.assertEqual(response.text, "ok")
+        self.assertEqual(stats["requests"], 1)
+        self.assertIn("gzip", seen_headers[0]["accept-encoding"])
+        self.assertEqual(seen_headers[0]["connection"], "keep-alive")
+
+    def test_get_feeds_concurrency_controller(self):
+        statuses = iter([200, 429])
+
+        async def run():
+            handler = lambda request: httpx.Response(next(statuses), text="ok")
+            controller = AimdController(Mock(), "run", initial_limit=4, min_limit=1, max_limit=8)
+            async with HttpClient(Mock(), transport=httpx.MockTransport(handler), concurrency=controller) as http:
+                await http.get("https://finance.yahoo.com/quote/wmt")
+                await http.get("https://finance.yahoo.com/quote/wmt")
+                return controller, http.get_stats()
+
+        controller, stats = asyncio.run(run())
+        self.assertEqual(controller.in_flight, 0)
+        self.assertEqual(stats["concurrency"]["decreases"], 1)
+        self.assertEqual(stats["concurrency"]["limit"], 2)
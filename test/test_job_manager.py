@@ -0,0 +1,116 @@
+import threading
+import unittest
+from unittest.mock import Mock
+from job_manager.job_manager import JobManager, track_stage
+from job_controller.job_controller import stock_lists
+
+
+class FakeRuns:
+    # just enough of a mongo collection for job documents
+    def __init__(self):
+        self.docs = {}
+        self.lock = threading.Lock()
+
+    def insert_one(self, doc):
+        with self.lock:
+            self.docs[doc["job_id"]] = dict(doc)
+
+    def update_one(self, query, update):
+        with self.lock:
+            doc = self.docs[query["job_id"]]
+            for path, value in update["$set"].items():
+                target = doc
+                *parents, name = path.split(".")
+                for parent in parents:
+                    target = target.setdefault(parent, {})
+                target[name] = value
+
+    def find_one(self, query, projection=None):
+        with self.lock:
+            doc = self.docs.get(query["job_id"])
+            return dict(doc) if doc else None
+
+
+class TestJobManager(unittest.TestCase):
+    def setUp(self):
+        self.runs = FakeRuns()
+        self.manager = JobManager({"runs": self.runs}, Mock(), max_workers=1)
+
+    def tearDown(self):
+        self.manager.shutdown()
+
+    def wait(self, job_id):
+        self.manager.shutdown()
+        return self.manager.get(job_id)
+
+    def test_runs_in_the_background_with_stage_timings(self):
+        release = threading.Event()
+
+        def work(a, b, job=None):
+            with track_stage(job, "first"):
+                release.wait(5)
+            with track_stage(job, "second"):
+                return a + b
+
+        job_id = self.manager.submit("test", work, (1, 2), "run", {"a": 1})
+        self.assertIn(self.manager.get(job_id)["status"], ("queued", "running"))
+        release.set()
+
+        job = self.wait(job_id)
+        self.assertEqual((job["status"], job["result"], job["run_id"]), ("succeeded", 3, "run"))
+        self.assertEqual(list(job["stages"]), ["first", "second"])
+        self.assertIn("elapsed_secs", job["stages"]["first"])
+
+    def test_failure_is_recorded(self):
+        def work(job=None):
+            raise ValueError("boom")
+
+        job = self.wait(self.manager.submit("test", work, ()))
+        self.assertEqual((job["status"], job["error"]), ("failed", "boom"))
+
+    def test_cancel_running_and_queued_jobs(self):
+        started = threading.Event()
+        stages = []
+
+        def work(job=None):
+            started.set()
+            job.cancel_event.wait(5)
+            for name in ["a", "b"]:
+                with track_stage(job, name):
+                    stages.append(name)
+
+        running_id = self.manager.submit("test", work, ())
+        # one worker, so this one waits behind the first
+        queued = Mock()
+        queued_id = self.manager.submit("test", queued, ())
+        started.wait(5)
+        self.manager.cancel(queued_id)
+        self.manager.cancel(running_id)
+
+        self.assertEqual(self.wait(running_id)["status"], "cancelled")
+        self.assertEqual(self.manager.get(queued_id)["status"], "cancelled")
+        self.assertEqual(stages, [])
+        queued.assert_not_called()
+
+    def test_predict_does_not_wait_behind_scrapes(self):
+        release = threading.Event()
+        scrape_id = self.manager.submit("scrape", lambda job=None: release.wait(5), ())
+        predicted = threading.Event()
+        self.manager.submit("predict", lambda job=None: predicted.set(), ())
+
+        # the only scrape worker is busy, the prediction still runs
+        self.assertTrue(predicted.wait(5))
+        release.set()
+        self.assertEqual(self.wait(scrape_id)["status"], "succeeded")
+
+    def test_default_pool_runs_every_stock_list_at_once(self):
+        manager = JobManager({"runs": FakeRuns()}, Mock())
+        self.assertGreaterEqual(manager.max_workers, len(stock_lists))
+        manager.shutdown()
+
+    def test_unknown_job(self):
+        self.assertIsNone(self.manager.cancel("nope"))
+
+
+if __name__ == '__main__':
+    unittest.main()
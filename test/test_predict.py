@@ -1,4 +1,16 @@
 import unittest
+import os
+import json
+from unittest.mock import Mock, MagicMock, patch
+from predict.predict import Predict
+from article_store.article_store import build_pack
+from codec.codec import get_codec
+from article_stream.article_stream import ArticleStream
+from datetime import datetime, timezone, timedelta
+
+def build_predict():
+    with patch.dict(os.environ, {"STORAGE_BUCKET": "test-bucket", "CLASSIFY_CACHE": "false", "PREDICTION_STORE": "false", "PREDICT_DEDUPE": "false"}):
+        return Predict(Mock(), MagicMock(), MagicMock(), Mock(), Mock())
 
 class SimpleWidgetTestCase(unittest.TestCase):
     def setUp(self):
@@ -8,4 +20,300 @@ class SimpleWidgetTestCase(unittest.TestCase):
         pass
 
     def test_assert_something(self):
-        self.assertEqual(50, 50)
\ No newline at end of file
+        self.assertEqual(50, 50)
+
+class TestCollectSavedArticles(unittest.TestCase):
+    def test_packs_and_legacy_blobs(self):
+        pred = build_predict()
+        articles = [{"link": f"https://{i}", "content": f"article {i} " * 20} for i in range(3)]
+        pack, index = build_pack(articles, get_codec())
+        legacy_article = {"link": "https://legacy", "content": "legacy article " * 20}
+
+        blobs = {}
+        def get_blob(key):
+            blob = Mock()
+            if key == "pack":
+                blob.download_as_bytes.return_value = pack
+            elif key == "empty":
+                blob.download_as_bytes.return_value = json.dumps({"link": "https://empty", "content": " "}).encode()
+            else:
+                blob.download_as_bytes.return_value = json.dumps(legacy_article).encode()
+            blobs.setdefault(key, []).append(blob)
+            return blob
+        pred.bucket.blob.side_effect = get_blob
+
+        scrapes = [{"pack_key": "pack", **offsets} for offsets in index[:2]]
+        scrapes.append({"bucket_key": "legacy"})
+        scrapes.append({"bucket_key": "empty"})
+        scrapes.append({"url": "no storage fields"})
+        saved_articles = pred.collect_saved_articles_from_storage(scrapes)
+
+        self.assertEqual(len(blobs["pack"]), 1)
+        self.assertEqual(sorted(a["link"] for a in saved_articles), ["https://0", "https://1", "https://legacy"])
+
+class TestStreamingAnalysis(unittest.TestCase):
+    def test_tallies_streamed_articles_within_lookback(self):
+        pred = build_predict()
+        pred.generate_analysis_for_article = Mock(side_effect=lambda stock_sym, content: "YES" if "up" in content else "NO")
+        pred.publish_results = Mock()
+
+        now = datetime.now(timezone.utc)
+        recent = (now - timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        stale = (now - timedelta(hours=30)).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        pred.collect_saved_articles_from_storage = Mock(return_value=[{"content": "reused up"}])
+
+        stream = ArticleStream(maxsize=10)
+        stream.put_articles("WMT", [
+            {"content": "going up", "published_at": recent},
+            {"content": "going down", "published_at": recent},
+            {"content": "old news up", "published_at": stale},
+            {"content": "no date up"},
+        ])
+        stream.put_scrapes("HD", [
+            {"pack_key": "k", "published_at": (now - timedelta(hours=2)).replace(tzinfo=None)},
+            {"pack_key": "k", "published_at": (now - timedelta(hours=48)).replace(tzinfo=None)},
+        ])
+        stream.close()
+
+        rows = pred.run_streaming_analysis(stream, 24, "run", num_workers=2)
+
+        self.assertEqual(sorted(rows["wmt"]), ["NO", "YES"])
+        self.assertEqual(rows["hd"], ["YES"])
+        self.assertEqual(len(pred.collect_saved_articles_from_storage.call_args[0][0]), 1)
+        pred.publish_results.assert_called_once_with(rows, "run", 24)
+
+class TestConcurrentAnalysis(unittest.TestCase):
+    def test_responses_stay_in_article_order(self):
+        import time
+        pred = build_predict()
+        articles = [{"content": f"{i} " + ("up" if i % 2 else "down")} for i in range(8)]
+        pred.iter_saved_articles = Mock(return_value=iter(articles))
+
+        def answer(stock_sym, content):
+            # later articles finish first
+            time.sleep(0.01 * (8 - int(content.split()[0])))
+            return "YES" if "up" in content else "NO"
+        pred.generate_analysis_for_article = Mock(side_effect=answer)
+
+        responses = pred.generate_analysis_for_stock("wmt", [{}])
+        self.assertEqual(responses, ["NO", "YES"] * 4)
+
+class TestBatchAnalysis(unittest.TestCase):
+    def test_batch_results_map_back_to_stocks(self):
+        pred = build_predict()
+        articles = {
+            "wmt": [{"link": "a", "content": "a"}, {"link": "b", "content": "b"}, {"title": "no content"}],
+            "hd": [{"link": "c", "content": "c"}],
+        }
+        pred.collect_saved_articles_from_storage = Mock(side_effect=lambda scrapes: articles[scrapes[0]["stock"]])
+        pred.batch_classifier = Mock()
+        pred.batch_classifier.run.return_value = {"wmt:0": "Yes.", "wmt:1": "NO", "hd:0": "NA"}
+
+        records = pred.run_batch_analysis({"WMT": [{"stock": "wmt"}], "HD": [{"stock": "hd"}]}, "run")
+
+        self.assertEqual(records, {"wmt": [("a", "YES"), ("b", "NO")], "hd": [("c", "NA")]})
+        custom_ids = [custom_id for custom_id, _ in pred.batch_classifier.run.call_args[0][1]]
+        self.assertEqual(custom_ids, ["wmt:0", "wmt:1", "hd:0"])
+
+class TestClassificationCaching(unittest.TestCase):
+    def test_repeated_articles_skip_openai(self):
+        with patch.dict(os.environ, {"STORAGE_BUCKET": "test-bucket", "CLASSIFY_CACHE": "true", "PREDICTION_STORE": "false", "PREDICT_DEDUPE": "false"}):
+            pred = Predict(Mock(), MagicMock(), MagicMock(), Mock(), Mock())
+        pred.cache.collection.find_one.return_value = None
+        pred.classifier = Mock()
+        pred.classifier.complete.return_value = "YES"
+
+        self.assertEqual(pred.generate_analysis_for_article("wmt", "same article"), "YES")
+        self.assertEqual(pred.generate_analysis_for_article("wmt", "same article"), "YES")
+        pred.generate_analysis_for_article("hd", "same article")
+        self.assertEqual(pred.classifier.complete.call_count, 2)
+
+    def test_prompt_is_unchanged(self):
+        pred = build_predict()
+        stock_sym = "wmt"
+        expected = f"""
+        For the given article, predict if {stock_sym} will rise in the next trading window.
+        If the article does not mention anything about {stock_sym}, return an answer of NA.
+        Otherwise, return a YES or NO. The only acceptable responses are YES, NO or NA.
+        """
+        self.assertEqual(pred.build_messages(stock_sym, "article")[0]["content"], expected)
+
+class TestPrefilter(unittest.TestCase):
+    def test_unmentioned_articles_skip_openai(self):
+        with patch.dict(os.environ, {"STORAGE_BUCKET": "test-bucket", "CLASSIFY_CACHE": "false", "PREDICTION_STORE": "false", "PREDICT_DEDUPE": "false", "PREDICT_PREFILTER": "true"}):
+            pred = Predict(Mock(), MagicMock(), MagicMock(), Mock(), Mock())
+        pred.prefilter.load([{"symbol": "WMT", "name": "Walmart Inc."}])
+        pred.classifier = Mock()
+        pred.classifier.complete.return_value = "YES"
+
+        self.assertEqual(pred.classify_article("wmt", {"content": "Walmart beat estimates"}), "YES")
+        self.assertEqual(pred.classify_article("wmt", {"content": "Target cut prices"}), "NA")
+        self.assertEqual(pred.classifier.complete.call_count, 1)
+        self.assertEqual(pred.prefilter.get_stats()["skipped"], 1)
+
+class TestNearDuplicates(unittest.TestCase):
+    def test_wire_copies_get_one_call_and_one_vote(self):
+        with patch.dict(os.environ, {"STORAGE_BUCKET": "test-bucket", "CLASSIFY_CACHE": "false", "PREDICTION_STORE": "false", "PREDICT_DEDUPE": "true"}):
+            pred = Predict(Mock(), MagicMock(), MagicMock(), Mock(), Mock())
+        pred.dedupe.collection.find.return_value = []
+        story = " ".join(f"walmart shares word{i}" for i in range(100))
+        articles = [
+            {"link": "a", "content": story},
+            {"link": "b", "content": "Reuters - " + story},
+            {"link": "c", "content": " ".join(f"home depot sales item{i}" for i in range(100))},
+        ]
+        pred.iter_saved_articles = Mock(return_value=iter(articles))
+        pred.classifier.complete = Mock(return_value="YES")
+
+        records = pred.collect_records(pred.submit_analysis_for_stock("wmt", [{}]))
+
+        self.assertEqual(records, [("a", "YES"), ("c", "YES")])
+        self.assertEqual(pred.classifier.complete.call_count, 2)
+        self.assertEqual(pred.dedupe.collection.update_one.call_count, 2)
+
+    def test_prefilter_verdicts_are_not_saved_as_signatures(self):
+        env = {"STORAGE_BUCKET": "test-bucket", "CLASSIFY_CACHE": "false", "PREDICTION_STORE": "false", "PREDICT_DEDUPE": "true", "PREDICT_PREFILTER": "true"}
+        with patch.dict(os.environ, env):
+            pred = Predict(Mock(), MagicMock(), MagicMock(), Mock(), Mock())
+        pred.prefilter.load([{"symbol": "WMT", "name": "Walmart Inc."}])
+        pred.dedupe.collection.find.return_value = []
+        pred.classifier.complete = Mock(return_value="YES")
+
+        unrelated = {"link": "a", "content": " ".join(f"target sales item{i}" for i in range(100))}
+        self.assertEqual(pred.classify_signed_article("wmt", unrelated, pred.sign_article(unrelated)), "NA")
+        pred.classifier.complete.assert_not_called()
+        pred.dedupe.collection.update_one.assert_not_called()
+
+        related = {"link": "b", "content": " ".join(f"walmart shares word{i}" for i in range(100))}
+        self.assertEqual(pred.classify_signed_article("wmt", related, pred.sign_article(related)), "YES")
+        self.assertEqual(pred.dedupe.collection.update_one.call_count, 1)
+
+class TestPackedAnalysis(unittest.TestCase):
+    def test_packed_verdicts_match_single_article_verdicts(self):
+        # a model that answers every article the same way alone or packed
+        def answer(content):
+            return "YES" if "up" in content else "NA" if "other" in content else "NO"
+
+        def complete(model_name, messages, **kwargs):
+            if "response_format" not in kwargs:
+                return answer(messages[1]["content"])
+            items = messages[1]["content"].split('<article id="')[1:]
+            answers = [{"id": item.split('"')[0], "answer": answer(item)} for item in items]
+            # drop the last one to exercise the per article fallback
+            return json.dumps({"answers": answers[:-1]})
+
+        articles = [{"content": text} for text in ["going up", "going down", "other company", "up again", "down again"]]
+        with patch.dict(os.environ, {"STORAGE_BUCKET": "test-bucket", "CLASSIFY_CACHE": "false", "PREDICTION_STORE": "false", "PREDICT_DEDUPE": "false", "PREDICT_PACKING": "true", "PREDICT_PACK_MAX_ARTICLES": "3"}):
+            pred = Predict(Mock(), MagicMock(), MagicMock(), Mock(), Mock())
+        pred.collect_saved_articles_from_storage = Mock(return_value=articles)
+        pred.classifier.complete = Mock(side_effect=complete)
+
+        packed = pred.generate_analysis_for_stock("wmt", [{}])
+        single = [answer(article["content"]) for article in articles]
+
+        self.assertEqual(packed, single)
+        stats = pred.planner.get_stats()
+        self.assertEqual((stats["requests"], stats["fallbacks"]), (2, 2))
+
+class TestSingleArticleTruncation(unittest.TestCase):
+    def test_over_long_article_is_truncated_without_packing(self):
+        pred = build_predict()
+        pred.planner.tokenizer.encoding = None
+        pred.planner.max_tokens_per_article = 50
+        pred.classifier.complete = Mock(return_value="YES")
+
+        self.assertEqual(pred.classify_article("wmt", {"content": "word " * 300}, prefilter=False), "YES")
+        sent = pred.classifier.complete.call_args[0][1][1]["content"]
+        self.assertLessEqual(len(sent.split()), 50)
+        self.assertEqual(pred.planner.get_stats()["truncated"], 1)
+
+    def test_run_logs_only_its_own_truncations(self):
+        pred = build_predict()
+        pred.planner.tokenizer.encoding = None
+        pred.planner.max_tokens_per_article = 50
+        pred.classifier.complete = Mock(return_value="YES")
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        pred.get_stocks_list = Mock(return_value={"WMT": [{"url": "a", "published_at": now}]})
+        pred.publish_results = Mock()
+
+        for _ in range(2):
+            pred.iter_saved_articles = Mock(return_value=iter([{"link": "a", "content": "word " * 300}]))
+            pred.run_analysis(24, "run")
+
+        logged = [c[0][0] for c in pred.logger.info.call_args_list if "over-long" in c[0][0]]
+        self.assertEqual(logged, ["[predict] truncated 1 over-long articles for run_id run"] * 2)
+        self.assertEqual(pred.planner.get_stats()["truncated"], 2)
+
+class TestPrefetchArticles(unittest.TestCase):
+    def test_download_tasks_are_sized_from_scrape_records(self):
+        pred = build_predict()
+        scrapes = [
+            {"pack_key": "p1", "pack_offset": 0, "pack_length": 100},
+            {"bucket_key": "legacy"},
+            {"pack_key": "p1", "pack_offset": 100, "pack_length": 50},
+            {"pack_key": "p2", "pack_offset": 0, "pack_length": 10},
+            {"url": "no storage fields"},
+        ]
+        tasks = pred.get_download_tasks(scrapes)
+        self.assertEqual([(size, args[0]) for size, _, args in tasks], [(16 * 1024, "legacy"), (600, "p1"), (40, "p2")])
+
+    def test_iter_saved_articles_keeps_task_order(self):
+        import time
+        pred = build_predict()
+
+        def download(name, delay):
+            time.sleep(delay)
+            return [{"content": name}]
+
+        pred.get_download_tasks = Mock(return_value=[(1, download, (str(i), 0.02 * (5 - i))) for i in range(5)])
+        self.assertEqual([a["content"] for a in pred.iter_saved_articles([])], ["0", "1", "2", "3", "4"])
+
+class TestGetStocksList(unittest.TestCase):
+    def test_groups_by_stock_server_side(self):
+        pred = build_predict()
+        collection = pred.db["scrapes"]
+        collection.aggregate.return_value = [
+            {"_id": "wmt", "scrapes": [{"url": "a", "pack_key": "k", "pack_offset": 0, "pack_length": 10}, {"url": "b", "bucket_key": "b.txt"}]},
+            {"_id": "hd", "scrapes": [{"url": "c", "bucket_key": "c.txt"}]},
+        ]
+
+        stocks = pred.get_stocks_list(24, "run")
+
+        self.assertEqual(sorted(stocks), ["hd", "wmt"])
+        self.assertEqual(len(stocks["wmt"]), 2)
+        pipeline = collection.aggregate.call_args[0][0]
+        self.assertEqual(pipeline[0]["$match"]["run_id"], "run")
+        # deduped per (stock, url) before grouping per stock
+        self.assertEqual(pipeline[2]["$group"]["_id"], {"stock": "$stock", "url": "$url"})
+        self.assertEqual(set(pipeline[2]["$group"]["scrape"]["$first"]), {"url", "published_at", "bucket_key", "pack_key", "pack_offset", "pack_length"})
+        self.assertEqual(pipeline[-1]["$group"]["_id"], "$_id.stock")
+        collection.find.assert_not_called()
+
+class TestMultiLookback(unittest.TestCase):
+    def test_classifies_once_and_publishes_per_lookback(self):
+        pred = build_predict()
+        now = datetime.now(timezone.utc)
+        hours_ago = lambda hours: (now - timedelta(hours=hours)).replace(tzinfo=None)
+        pred.get_stocks_list = Mock(return_value={"WMT": [
+            {"url": "a", "published_at": hours_ago(2)},
+            {"url": "b", "published_at": hours_ago(10)},
+            {"url": "c", "published_at": hours_ago(20)},
+        ]})
+        pred.iter_saved_articles = Mock(return_value=iter([{"link": link, "content": link} for link in ["a", "b", "c"]]))
+        pred.generate_analysis_for_article = Mock(side_effect=lambda stock_sym, content: "YES" if content != "b" else "NO")
+        pred.publish_results = Mock()
+
+        pred.run_analysis([24, 6, 12], "run")
+
+        self.assertEqual(pred.get_stocks_list.call_args[0][:2], (24, "run"))
+        self.assertEqual(pred.generate_analysis_for_article.call_count, 3)
+        published = {c[0][2]: c[0][0] for c in pred.publish_results.call_args_list}
+        self.assertEqual(published, {
+            6: {"wmt": ["YES"]},
+            12: {"wmt": ["YES", "NO"]},
+            24: {"wmt": ["YES", "NO", "YES"]},
+        })
+        # the per article verdicts that went into each tally go along for the prediction store
+        verdicts = {c[0][2]: c[0][3] for c in pred.publish_results.call_args_list}
+        self.assertEqual([v["url"] for v in verdicts[12]], ["a", "b"])
+        self.assertEqual(verdicts[6][0]["published_at"], hours_ago(2))
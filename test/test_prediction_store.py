@@ -0,0 +1,67 @@
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import Mock
+import pandas as pd
+from prediction_store.prediction_store import PredictionStore, pa
+
+
+@unittest.skipIf(pa is None, "pyarrow is not installed")
+class TestPredictionStore(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = PredictionStore(Mock(), uri=self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, run_id, lookback, predicted_at, verdicts):
+        tallies = {}
+        for verdict in verdicts:
+            tallies.setdefault(verdict["stock"], []).append(verdict["verdict"])
+        df = pd.DataFrame(
+            [[stock, answers.count("YES"), answers.count("NO"), answers.count("NA")] for stock, answers in tallies.items()],
+            columns=["Symbol", "YES", "NO", "NA"],
+        )
+        self.store.write_predictions(run_id, lookback, df, verdicts, model="gpt-4o-mini", predicted_at=predicted_at)
+
+    def test_writes_hive_partitions_and_reads_a_date_range(self):
+        published_at = datetime(2024, 10, 1, 9, 30)
+        self.write("r1", 24, datetime(2024, 10, 1, 14, tzinfo=timezone.utc), [
+            {"stock": "wmt", "url": "a", "published_at": published_at, "verdict": "YES"},
+            {"stock": "wmt", "url": "b", "published_at": published_at, "verdict": "NO"},
+            {"stock": "hd", "url": "c", "published_at": None, "verdict": "YES"},
+        ])
+        self.write("r2", 6, datetime(2024, 10, 2, 14, tzinfo=timezone.utc), [
+            {"stock": "wmt", "url": "d", "published_at": published_at, "verdict": "YES"},
+        ])
+        self.write("r3", 24, datetime(2024, 10, 5, 14, tzinfo=timezone.utc), [
+            {"stock": "wmt", "url": "e", "published_at": published_at, "verdict": "NA"},
+        ])
+
+        df = self.store.load_verdicts("2024-10-01", "2024-10-02")
+        self.assertEqual(sorted(df["url"]), ["a", "b", "c", "d"])
+        self.assertEqual(df[df["url"] == "a"]["published_at"].iloc[0], pd.Timestamp("2024-10-01 09:30", tz="UTC"))
+        self.assertEqual(set(df["model"]), {"gpt-4o-mini"})
+
+        df = self.store.load_verdicts("2024-10-01", "2024-10-05", lookbacks=24, stocks=["WMT"], columns=["url", "verdict"])
+        self.assertEqual(list(df.columns), ["url", "verdict"])
+        self.assertEqual(sorted(df["url"]), ["a", "b", "e"])
+
+        tallies = self.store.load_tallies(datetime(2024, 10, 1, 23, tzinfo=timezone.utc))
+        self.assertEqual(tallies.set_index("stock")[["yes", "no", "na"]].to_dict("index"), {
+            "wmt": {"yes": 1, "no": 1, "na": 0},
+            "hd": {"yes": 1, "no": 0, "na": 0},
+        })
+
+    def test_second_publish_adds_a_file(self):
+        verdicts = [{"stock": "wmt", "url": "a", "published_at": None, "verdict": "YES"}]
+        self.write("r1", 24, datetime(2024, 10, 1, 14, tzinfo=timezone.utc), verdicts)
+        self.write("r1", 24, datetime(2024, 10, 1, 15, tzinfo=timezone.utc), verdicts)
+        self.assertEqual(len(self.store.load_verdicts("2024-10-01")), 2)
+
+    def test_empty_store(self):
+        df = self.store.load_tallies("2024-10-01", columns=["stock", "yes"])
+        self.assertTrue(df.empty)
+        self.assertEqual(list(df.columns), ["stock", "yes"])
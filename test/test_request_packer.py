@@ -0,0 +1,71 @@
+import json
+import unittest
+from request_packer.request_packer import PackingPlanner, build_packed_user_content, parse_packed_answers, merge_verdicts
+
+
+def words(n, word="word"):
+    return " ".join([word] * n)
+
+
+class TestPackingPlanner(unittest.TestCase):
+    def build(self, **kwargs):
+        # the word based estimate is used whether or not tiktoken is installed
+        planner = PackingPlanner("gpt-4o-mini", max_words_per_request=300, **kwargs)
+        planner.tokenizer.encoding = None
+        return planner
+
+    def test_packs_in_order_within_budgets(self):
+        planner = self.build(max_articles=3, max_tokens_per_article=1000)
+        requests = planner.plan([words(100), words(100), words(100), words(10), words(10)])
+
+        self.assertEqual([[article_idx for _, article_idx, _ in request] for request in requests], [[0, 1], [2, 3, 4]])
+        stats = planner.get_stats()
+        self.assertEqual((stats["articles"], stats["requests"], stats["requests_saved"]), (5, 2, 3))
+        self.assertLessEqual(stats["max_request_tokens"], planner.max_tokens_per_request)
+
+    def test_oversized_article_is_truncated(self):
+        planner = self.build(max_tokens_per_article=50)
+        requests = planner.plan([words(300)])
+        self.assertEqual(len(requests), 1)
+        self.assertLessEqual(planner.tokenizer.count(requests[0][0][2]), 51)
+        self.assertEqual(planner.get_stats()["truncated"], 1)
+
+    def test_truncate_single_article(self):
+        planner = self.build(max_tokens_per_article=50)
+        self.assertEqual(planner.truncate(words(10)), words(10))
+        self.assertLessEqual(planner.tokenizer.count(planner.truncate(words(300))), 51)
+        self.assertEqual(planner.get_stats()["truncated"], 1)
+
+    def test_oversized_article_is_chunked(self):
+        planner = self.build(max_tokens_per_article=100, oversize="chunk")
+        requests = planner.plan([words(200), words(5)])
+        ids = [item_id for request in requests for item_id, _, _ in request]
+        self.assertEqual(ids, ["0.0", "0.1", "0.2", "1"])
+        self.assertEqual(planner.get_stats()["chunked"], 1)
+
+
+class TestPackedAnswers(unittest.TestCase):
+    REQUEST = [("0", 0, "a"), ("1.0", 1, "b"), ("1.1", 1, "c"), ("2", 2, "d")]
+
+    def test_user_content_tags_each_article(self):
+        content = build_packed_user_content(self.REQUEST[:2])
+        self.assertEqual(content, '<article id="0">\na\n</article>\n\n<article id="1.0">\nb\n</article>')
+
+    def test_parse_merges_chunks_and_drops_missing(self):
+        resp = json.dumps({"answers": [
+            {"id": "0", "answer": "yes"},
+            {"id": "1.0", "answer": "NO"},
+            {"id": "1.1", "answer": "NA"},
+            {"id": "2", "answer": "maybe"},
+        ]})
+        self.assertEqual(parse_packed_answers(resp, self.REQUEST), {0: "YES", 1: "NO"})
+        self.assertEqual(parse_packed_answers("not json", self.REQUEST), {})
+
+    def test_merge_verdicts(self):
+        self.assertEqual(merge_verdicts(["YES", "NA", "YES", "NO"]), "YES")
+        self.assertEqual(merge_verdicts(["YES", "NO"]), "NA")
+        self.assertEqual(merge_verdicts(["NA"]), "NA")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,13 @@
+import unittest
+from stats.stats import percentile
+
+
+class TestPercentile(unittest.TestCase):
+    def test_percentile(self):
+        self.assertEqual(percentile([], 95), 0)
+        self.assertEqual(percentile([3, 1, 2], 50), 2)
+        self.assertEqual(percentile(list(range(101)), 95), 95)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import unittest
+import asyncio
+import os
+from unittest.mock import Mock, patch
+from throttle.throttle import TokenBucket, HostRateLimiter, ScaledRateLimiter, AimdController
+
+class TestTokenBucket(unittest.TestCase):
+    def test_reserve_within_burst(self):
+        bucket = TokenBucket(rate=1, capacity=3)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertEqual(bucket.reserve(), 0)
+
+    def test_reserve_over_burst_waits(self):
+        bucket = TokenBucket(rate=2, capacity=1)
+        self.assertEqual(bucket.reserve(), 0)
+
+        wait = bucket.reserve()
+        self.assertAlmostEqual(wait, 0.5, places=2)
+
+        # the next caller queues behind the previous reservation
+        wait = bucket.reserve()
+        self.assertAlmostEqual(wait, 1.0, places=2)
+
+class TestHostRateLimiter(unittest.TestCase):
+    def test_bucket_per_host(self):
+        limiter = HostRateLimiter(rate=1, burst=1)
+        a = limiter.get_bucket("https://finance.yahoo.com/quote/wmt")
+        b = limiter.get_bucket("https://finance.yahoo.com/news/abc.html")
+        c = limiter.get_bucket("https://www.reuters.com/markets")
+
+        self.assertIs(a, b)
+        self.assertIsNot(a, c)
+
+    def test_from_env_host_overrides(self):
+        env = {
+            "SCRAPER_RATE_PER_HOST": "0.5",
+            "SCRAPER_BURST_PER_HOST": "2",
+            "SCRAPER_HOST_RATES": "finance.yahoo.com=3, bad-entry",
+        }
+        with patch.dict(os.environ, env):
+            limiter = HostRateLimiter.from_env()
+
+        self.assertEqual(limiter.get_bucket("https://finance.yahoo.com/x").rate, 3)
+        self.assertEqual(limiter.get_bucket("https://example.com/x").rate, 0.5)
+        self.assertEqual(limiter.get_bucket("https://example.com/x").capacity, 2)
+
+class TestScaledRateLimiter(unittest.TestCase):
+    def test_set_scale_applies_to_run_buckets_only(self):
+        limiter = HostRateLimiter(rate=2, burst=1)
+        shared = limiter.get_bucket("https://finance.yahoo.com/x")
+        run_a, run_b = ScaledRateLimiter(limiter), ScaledRateLimiter(limiter)
+
+        run_a.set_scale(0.5)
+        self.assertEqual(run_a.get_bucket("https://finance.yahoo.com/x").rate, 1)
+        self.assertEqual(shared.rate, 2)
+        self.assertIsNone(run_b.get_bucket("https://finance.yahoo.com/x"))
+
+        run_a.set_scale(0.25)
+        self.assertEqual(run_a.get_bucket("https://finance.yahoo.com/x").rate, 0.5)
+
+    def test_scale_is_capped_at_configured_rate(self):
+        limiter = HostRateLimiter(rate=2, burst=1)
+        run = ScaledRateLimiter(limiter)
+        run.set_scale(4)
+        self.assertEqual(run.scale, 1.0)
+        self.assertIsNone(run.get_bucket("https://finance.yahoo.com/x"))
+
+    def test_acquire_goes_through_shared_bucket(self):
+        limiter = HostRateLimiter(rate=1, burst=1)
+        run = ScaledRateLimiter(limiter)
+        asyncio.run(run.acquire_async("https://finance.yahoo.com/x"))
+        # the shared bucket's only token is taken
+        self.assertGreater(limiter.get_bucket("https://finance.yahoo.com/x").reserve(), 0)
+
+class TestAimdController(unittest.TestCase):
+    def build(self, **kwargs):
+        return AimdController(Mock(), "run", initial_limit=4, min_limit=1, max_limit=8, **kwargs)
+
+    def test_increase_never_scales_past_configured_rate(self):
+        limiter = ScaledRateLimiter(HostRateLimiter(rate=2, burst=1))
+        controller = self.build(rate_limiter=limiter)
+        for _ in range(50):
+            controller.record(0, 200, 0.1)
+        self.assertGreater(controller.get_limit(), 4)
+        self.assertEqual(limiter.scale, 1.0)
+
+    def test_additive_increase_on_fast_responses(self):
+        controller = self.build()
+        # roughly one limit's worth of responses per step
+        for _ in range(5):
+            controller.record(0, 200, 0.1)
+        self.assertEqual(controller.get_limit(), 5)
+        self.assertEqual(controller.get_stats()["increases"], 1)
+
+    def test_multiplicative_decrease_on_429_and_5xx(self):
+        limiter = ScaledRateLimiter(HostRateLimiter(rate=2, burst=1))
+        controller = self.build(rate_limiter=limiter)
+        controller.record(0, 429, 0.1)
+        self.assertEqual(controller.get_limit(), 2)
+        self.assertEqual(limiter.scale, 0.5)
+
+        # a response to a request sent before the cut doesn't cut again
+        controller.record(0, 503, 0.1)
+        self.assertEqual(controller.get_limit(), 2)
+
+        controller.record(controller.last_decrease_at + 1, 503, 0.1)
+        self.assertEqual(controller.get_limit(), 1)
+        controller.record(controller.last_decrease_at + 1, None, 0.1)
+        self.assertEqual(controller.get_limit(), 1)
+
+    def test_decrease_on_rising_p95(self):
+        controller = self.build(window=10, latency_tolerance=2)
+        for _ in range(10):
+            controller.record(0, 200, 0.1)
+        limit = controller.get_limit()
+        for _ in range(10):
+            controller.record(1, 200, 0.5)
+        self.assertLess(controller.get_limit(), limit)
+        self.assertEqual(controller.get_stats()["decreases"], 1)
+
+    def test_acquire_blocks_at_limit(self):
+        controller = self.build()
+        controller.limit = 1
+
+        async def run():
+            await controller.acquire()
+            waiter = asyncio.ensure_future(controller.acquire())
+            await asyncio.sleep(0.01)
+            blocked = not waiter.done()
+            await controller.release()
+            await asyncio.wait_for(waiter, 1)
+            return blocked
+
+        self.assertTrue(asyncio.run(run()))
+        self.assertEqual(controller.in_flight, 1)
@@ -0,0 +1,53 @@
+import unittest
+from unittest.mock import Mock, MagicMock
+from ticker_filter.ticker_filter import AhoCorasick, TickerPrefilter, get_name_variants
+
+TICKERS = [
+    {"symbol": "WMT", "name": "Walmart Inc.", "aliases": ["Wal-Mart"]},
+    {"symbol": "HD", "name": "The Home Depot, Inc."},
+    {"symbol": "ON", "name": "ON Semiconductor Corporation", "aliases": ["onsemi"]},
+]
+
+
+class TestAhoCorasick(unittest.TestCase):
+    def test_finds_overlapping_patterns(self):
+        matcher = AhoCorasick()
+        for pattern in ["he", "she", "his", "hers"]:
+            matcher.add(pattern, pattern)
+        matcher.build()
+        self.assertEqual(sorted(matcher.find("ushers")), [(1, 4, "she"), (2, 4, "he"), (2, 6, "hers")])
+
+
+class TestTickerPrefilter(unittest.TestCase):
+    def build(self):
+        return TickerPrefilter(MagicMock(), Mock()).load(TICKERS)
+
+    def test_name_variants(self):
+        self.assertEqual(get_name_variants("Walmart Inc."), {"Walmart Inc.", "Walmart"})
+        self.assertIn("Home Depot", get_name_variants("The Home Depot, Inc."))
+
+    def test_symbols_names_and_aliases(self):
+        prefilter = self.build()
+        self.assertTrue(prefilter.mentions("wmt", "Shares of WMT rose on Tuesday"))
+        self.assertTrue(prefilter.mentions("wmt", "Analysts like $WMT"))
+        self.assertTrue(prefilter.mentions("wmt", "walmart raised its outlook"))
+        self.assertTrue(prefilter.mentions("wmt", "the old Wal-Mart stores"))
+        self.assertTrue(prefilter.mentions("hd", "Home Depot (NYSE:HD) beat estimates"))
+        self.assertFalse(prefilter.mentions("wmt", "Target cut prices across the board"))
+
+    def test_word_boundaries_and_case(self):
+        prefilter = self.build()
+        # lowercase "on" is a word, not the ticker
+        self.assertFalse(prefilter.mentions("on", "The market moved on the news"))
+        self.assertTrue(prefilter.mentions("on", "onsemi guided lower"))
+        self.assertFalse(prefilter.mentions("hd", "a new HDR display"))
+
+    def test_unknown_stocks_are_not_filtered(self):
+        prefilter = self.build()
+        self.assertTrue(prefilter.mentions("tgt", "nothing about it"))
+        prefilter.mentions("wmt", "nothing about it")
+        self.assertEqual(prefilter.get_stats(), {"checked": 2, "mentioned": 0, "skipped": 1, "unknown": 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+from unittest.mock import Mock, MagicMock
+from url_index.url_index import BloomFilter, SeenUrlIndex
+
+class TestBloomFilter(unittest.TestCase):
+    def test_added_items_are_found(self):
+        bloom = BloomFilter(1000)
+        urls = [f"https://finance.yahoo.com/news/story-{i}.html" for i in range(1000)]
+        for url in urls:
+            bloom.add(url)
+
+        self.assertTrue(all(url in bloom for url in urls))
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f"seen-{i}")
+
+        false_positives = sum(f"unseen-{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+class TestSeenUrlIndex(unittest.TestCase):
+    def build_index(self, urls):
+        collection = MagicMock()
+        collection.count_documents.return_value = len(urls)
+        collection.find.return_value = [{"url": url} for url in urls]
+        collection.find_one.return_value = {"url": "a", "bucket_key": "scrapes/run/a.txt"}
+        db = MagicMock()
+        db.__getitem__.return_value = collection
+
+        index = SeenUrlIndex(db, Mock(), window_days=7)
+        index.load()
+        return index, collection
+
+    def test_unseen_url_skips_mongo(self):
+        index, collection = self.build_index(["a"])
+        self.assertIsNone(index.get_prior_scrape("b"))
+        collection.find_one.assert_not_called()
+
+    def test_seen_url_returns_prior_scrape(self):
+        index, collection = self.build_index(["a"])
+        prior_scrape = index.get_prior_scrape("a")
+        self.assertEqual(prior_scrape["bucket_key"], "scrapes/run/a.txt")
+
+    def test_add(self):
+        index, collection = self.build_index([])
+        self.assertFalse(index.might_contain("c"))
+        index.add("c")
+        self.assertTrue(index.might_contain("c"))
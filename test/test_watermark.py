@@ -0,0 +1,55 @@
+import unittest
+from datetime import datetime
+from unittest.mock import Mock, MagicMock
+from watermark.watermark import WatermarkStore
+
+
+class TestWatermarkStore(unittest.TestCase):
+    def test_load_all(self):
+        db = MagicMock()
+        db["watermarks"].find.return_value = [
+            {"stock": "wmt", "published_at": datetime(2024, 5, 2)},
+            {"stock": "aapl", "published_at": None},
+        ]
+        store = WatermarkStore(db, Mock())
+        self.assertEqual(store.load_all(), {"wmt": datetime(2024, 5, 2)})
+
+    def test_update_never_moves_backwards(self):
+        store = WatermarkStore(MagicMock(), Mock())
+        update = store.get_update("wmt", datetime(2024, 5, 2))
+        self.assertEqual(update._filter, {"stock": "wmt", "source": "yahoo"})
+        self.assertEqual(update._doc["$max"], {"published_at": datetime(2024, 5, 2)})
+        self.assertTrue(update._upsert)
+
+    def test_advance_goes_through_write_buffer(self):
+        db = MagicMock()
+        write_buffer = Mock()
+        store = WatermarkStore(db, Mock())
+        store.advance("wmt", datetime(2024, 5, 2), write_buffer)
+        store.advance("wmt", None, write_buffer)
+
+        self.assertEqual(write_buffer.add.call_count, 1)
+        self.assertEqual(write_buffer.add.call_args[0][0], "watermarks")
+        db["watermarks"].bulk_write.assert_not_called()
+
+    def test_load_stale_urls(self):
+        db = MagicMock()
+        db["watermarks"].find.return_value = [{"stock": "wmt", "stale_urls": ["https://a", "https://b"]}]
+        store = WatermarkStore(db, Mock())
+        self.assertEqual(store.load_stale_urls(), {"wmt": {"https://a", "https://b"}})
+
+    def test_mark_stale_is_capped(self):
+        db = MagicMock()
+        write_buffer = Mock()
+        store = WatermarkStore(db, Mock())
+        store.mark_stale("wmt", ["https://a"], write_buffer)
+        store.mark_stale("wmt", [], write_buffer)
+
+        self.assertEqual(write_buffer.add.call_count, 1)
+        update = write_buffer.add.call_args[0][1]
+        self.assertEqual(update._doc["$push"]["stale_urls"]["$each"], ["https://a"])
+        self.assertLess(update._doc["$push"]["stale_urls"]["$slice"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+from unittest.mock import Mock, MagicMock
+from work_queue.work_queue import LeaseWorkQueue, PENDING, LEASED, DONE, FAILED, get_worker_id
+
+
+class TestLeaseWorkQueue(unittest.TestCase):
+    def build(self):
+        db = MagicMock()
+        return LeaseWorkQueue(db, Mock(), lease_secs=60, max_attempts=2), db["scrape_queue"]
+
+    def test_enqueue_dedupes_and_upserts(self):
+        queue, collection = self.build()
+        collection.bulk_write.return_value.upserted_count = 2
+        self.assertEqual(queue.enqueue("run", ["wmt", "hd", "wmt"]), 2)
+
+        ops = collection.bulk_write.call_args[0][0]
+        self.assertEqual([op._filter["stock"] for op in ops], ["wmt", "hd"])
+        self.assertEqual(ops[0]._doc["$setOnInsert"]["status"], PENDING)
+        self.assertTrue(ops[0]._upsert)
+
+    def test_claim_takes_pending_or_expired_leases(self):
+        queue, collection = self.build()
+        collection.find_one_and_update.return_value = {"stock": "wmt", "attempts": 1}
+        item = queue.claim("run", "worker-1")
+        self.assertEqual(item["stock"], "wmt")
+
+        query, update = collection.find_one_and_update.call_args[0]
+        self.assertEqual(query["attempts"], {"$lt": 2})
+        self.assertEqual(query["$or"][0], {"status": PENDING})
+        self.assertEqual(query["$or"][1]["status"], LEASED)
+        self.assertIn("$lt", query["$or"][1]["lease_expires_at"])
+        self.assertEqual(update["$set"]["lease_owner"], "worker-1")
+        self.assertEqual(update["$inc"], {"attempts": 1})
+
+    def test_heartbeat_is_guarded_by_owner(self):
+        queue, collection = self.build()
+        collection.update_one.return_value.modified_count = 0
+        self.assertFalse(queue.heartbeat({"_id": 1, "lease_owner": "worker-1"}))
+        self.assertEqual(collection.update_one.call_args[0][0]["lease_owner"], "worker-1")
+
+    def test_complete_requeues_until_max_attempts(self):
+        queue, collection = self.build()
+        statuses = []
+        for item, success in [({"attempts": 1}, True), ({"attempts": 1}, False), ({"attempts": 2}, False)]:
+            queue.complete(dict(item, _id=1, lease_owner="worker-1"), success)
+            statuses.append(collection.update_one.call_args[0][1]["$set"]["status"])
+        self.assertEqual(statuses, [DONE, PENDING, FAILED])
+
+    def test_expired_last_attempt_is_failed(self):
+        queue, collection = self.build()
+        collection.find.return_value = [{"_id": 1, "stock": "wmt", "lease_owner": "dead"}, {"_id": 2, "stock": "hd", "lease_owner": "dead"}]
+        # hd was failed by another worker in the meantime
+        collection.update_one.side_effect = [Mock(modified_count=1), Mock(modified_count=0)]
+
+        self.assertEqual(queue.fail_expired("run"), ["wmt"])
+        query = collection.find.call_args[0][0]
+        self.assertEqual(query["status"], LEASED)
+        self.assertEqual(query["attempts"], {"$gte": 2})
+        self.assertIn("$lt", query["lease_expires_at"])
+        guard, update = collection.update_one.call_args_list[0][0]
+        self.assertEqual(guard, {"_id": 1, "status": LEASED, "lease_owner": "dead"})
+        self.assertEqual(update["$set"]["status"], FAILED)
+
+    def test_open_items_include_leases_on_the_last_attempt(self):
+        queue, collection = self.build()
+        collection.count_documents.return_value = 1
+        self.assertTrue(queue.has_open_items("run"))
+        self.assertNotIn("attempts", collection.count_documents.call_args[0][0])
+
+    def test_worker_ids_are_unique(self):
+        self.assertNotEqual(get_worker_id(), get_worker_id())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+from unittest.mock import Mock, MagicMock, patch
+from pymongo import InsertOne
+from pymongo.errors import BulkWriteError
+from write_buffer.write_buffer import BulkWriteBuffer
+
+def build_db():
+    collections = {}
+    db = MagicMock()
+    db.__getitem__.side_effect = lambda name: collections.setdefault(name, MagicMock(name=name))
+    return db, collections
+
+class TestBulkWriteBuffer(unittest.TestCase):
+    def test_flushes_when_full(self):
+        db, collections = build_db()
+        buffer = BulkWriteBuffer(db, Mock(), batch_size=3, flush_interval=60)
+
+        buffer.add("scrapes", InsertOne({"url": "a"}))
+        buffer.add("stock_prices", InsertOne({"stock": "wmt"}))
+        self.assertEqual(collections, {})
+
+        buffer.add("scrapes", InsertOne({"url": "b"}))
+        ops, = collections["scrapes"].bulk_write.call_args[0]
+        self.assertEqual(len(ops), 2)
+        self.assertFalse(collections["scrapes"].bulk_write.call_args.kwargs["ordered"])
+        collections["stock_prices"].bulk_write.assert_called_once()
+
+        stats = buffer.get_stats()
+        self.assertEqual(stats["batches"], 2)
+        self.assertEqual(stats["writes"], 3)
+        self.assertEqual(stats["max_batch_size"], 2)
+
+    def test_close_flushes_remaining(self):
+        db, collections = build_db()
+        buffer = BulkWriteBuffer(db, Mock(), batch_size=100, flush_interval=60).start()
+        buffer.add("scrapes", InsertOne({"url": "a"}))
+        buffer.close()
+        collections["scrapes"].bulk_write.assert_called_once()
+
+    @patch("write_buffer.write_buffer.time.sleep")
+    def test_retries_only_failed_documents(self, mock_sleep):
+        db, collections = build_db()
+        ops = [InsertOne({"url": "a"}), InsertOne({"url": "b"}), InsertOne({"url": "c"})]
+        errors = {"writeErrors": [{"index": 1, "code": 91}, {"index": 2, "code": 11000}]}
+        collections["scrapes"] = MagicMock()
+        collections["scrapes"].bulk_write.side_effect = [BulkWriteError(errors), None]
+
+        buffer = BulkWriteBuffer(db, Mock(), batch_size=100, flush_interval=60)
+        for op in ops:
+            buffer.add("scrapes", op)
+        buffer.flush()
+
+        retry_call = collections["scrapes"].bulk_write.call_args_list[1]
+        self.assertEqual(retry_call[0][0], [ops[1]])
+        self.assertEqual(buffer.get_stats()["retried"], 1)
+        self.assertEqual(buffer.get_stats()["failed"], 0)
+
+    @patch("write_buffer.write_buffer.time.sleep")
+    def test_gives_up_after_max_retries(self, mock_sleep):
+        db, collections = build_db()
+        collections["scrapes"] = MagicMock()
+        collections["scrapes"].bulk_write.side_effect = Exception("network down")
+
+        buffer = BulkWriteBuffer(db, Mock(), batch_size=100, flush_interval=60, max_retries=2)
+        buffer.add("scrapes", InsertOne({"url": "a"}))
+        buffer.flush()
+
+        self.assertEqual(collections["scrapes"].bulk_write.call_count, 3)
+        self.assertEqual(buffer.get_stats()["failed"], 1)
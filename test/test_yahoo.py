@@ -1,4 +1,20 @@
 import unittest
+import os
+import asyncio
+import time
+import tempfile
+import httpx
+from datetime import datetime
+from unittest.mock import Mock, MagicMock, AsyncMock, patch
+from pymongo import InsertOne
+from yahoo.yahoo import Yahoo, ScrapeSession, SoupParser, StrainedSoupParser, PARSERS, get_parser
+from http_cache.http_cache import QuotePageCache
+from http_client.http_client import HttpClient
+from throttle.throttle import HostRateLimiter
+
+def build_yahoo():
+    with patch.dict(os.environ, {"STORAGE_BUCKET": "test-bucket", "SCRAPER_QUOTE_CACHE": "false"}):
+        return Yahoo(Mock(), MagicMock(), MagicMock())
 
 class SimpleWidgetTestCase(unittest.TestCase):
     def setUp(self):
@@ -8,4 +24,518 @@ class SimpleWidgetTestCase(unittest.TestCase):
         pass
     
     def test_assert_something(self):
-        self.assertEqual(50, 50)
\ No newline at end of file
+        self.assertEqual(50, 50)
+
+class TestSeenLinks(unittest.TestCase):
+    def test_split_seen_links(self):
+        yahoo = build_yahoo()
+        url_index = Mock()
+        url_index.get_prior_scrape.side_effect = lambda link: {"url": link, "bucket_key": "k"} if link == "seen" else None
+        session = ScrapeSession("run", None, url_index)
+
+        new_links, prior_scrapes, num_skipped = yahoo.split_seen_links(session, ["new", "seen"])
+        self.assertEqual(new_links, ["new"])
+        self.assertEqual(prior_scrapes, [{"url": "seen", "bucket_key": "k"}])
+        self.assertEqual(num_skipped, 0)
+        self.assertEqual(session.counters, {"new_links": 1, "seen_links": 1})
+
+    def test_split_seen_links_stops_at_watermark(self):
+        yahoo = build_yahoo()
+        prior = {
+            "recent": {"url": "recent", "pack_key": "k", "published_at": datetime(2024, 5, 2)},
+            "old": {"url": "old", "pack_key": "k", "published_at": datetime(2024, 4, 1)},
+        }
+        url_index = Mock()
+        url_index.get_prior_scrape.side_effect = prior.get
+        session = ScrapeSession("run", None, url_index)
+
+        links = ["new", "recent", "old", "older-1", "older-2"]
+        new_links, prior_scrapes, num_skipped = yahoo.split_seen_links(session, links, cutoff=datetime(2024, 5, 1))
+        self.assertEqual(new_links, ["new"])
+        self.assertEqual([s["url"] for s in prior_scrapes], ["recent"])
+        self.assertEqual(num_skipped, 3)
+        # nothing past the first stale link is looked up
+        self.assertEqual(url_index.get_prior_scrape.call_count, 3)
+        self.assertEqual(session.counters["watermark_skipped_links"], 3)
+
+    def test_drop_stories_before_cutoff(self):
+        yahoo = build_yahoo()
+        session = ScrapeSession("run", None, None)
+        stories = [
+            {"link": "a", "published_at": "2024-05-02T10:00:00.000Z"},
+            {"link": "b", "published_at": "2024-04-01T10:00:00.000Z"},
+            {"link": "c", "published_at": None},
+        ]
+        kept, stale_links = yahoo.drop_stories_before(session, stories, datetime(2024, 5, 1))
+        self.assertEqual([s["link"] for s in kept], ["a", "c"])
+        self.assertEqual(stale_links, ["b"])
+        self.assertEqual(session.counters, {"watermark_dropped_stories": 1})
+
+    def test_split_seen_links_skips_stale_links(self):
+        yahoo = build_yahoo()
+        yahoo.skip_seen_urls = False
+        session = ScrapeSession("run", None, None)
+
+        new_links, prior_scrapes, num_skipped = yahoo.split_seen_links(session, ["new", "stale"], stale_urls={"stale"})
+        self.assertEqual(new_links, ["new"])
+        self.assertEqual(prior_scrapes, [])
+        self.assertEqual(session.counters["stale_links"], 1)
+
+    def test_watermark_cutoff_subtracts_lookback(self):
+        yahoo = build_yahoo()
+        session = ScrapeSession("run", None, None, watermarks={"wmt": datetime(2024, 5, 2, 12)})
+        self.assertEqual(yahoo.get_watermark_cutoff(session, "wmt"), datetime(2024, 5, 1, 12))
+        self.assertIsNone(yahoo.get_watermark_cutoff(session, "aapl"))
+
+    def test_save_prior_scrapes_references_blob(self):
+        yahoo = build_yahoo()
+        prior_scrape = {"url": "seen", "bucket_key": "scrapes/old/wmt/yahoo/1.txt", "run_id": "old", "published_at": "ts"}
+        yahoo.save_prior_scrapes([prior_scrape], "wmt", "new")
+
+        scrapes = yahoo.db["scrapes"].insert_many.call_args[0][0]
+        self.assertEqual(len(scrapes), 1)
+        self.assertEqual(scrapes[0]["bucket_key"], prior_scrape["bucket_key"])
+        self.assertEqual(scrapes[0]["run_id"], "new")
+        self.assertEqual(scrapes[0]["reused_from_run_id"], "old")
+        self.assertEqual(scrapes[0]["published_at"], "ts")
+
+class TestQuotePageCache(unittest.TestCase):
+    QUOTE_PAGE = '<div class="x filtered-stories"><a class="subtle-link" href="https://a">a</a><a class="subtle-link" href="https://b">b</a></div>'
+
+    def get_articles(self, yahoo, response):
+        http = Mock()
+        http.get = AsyncMock(return_value=response)
+        session = ScrapeSession("run", http, None)
+        res = asyncio.run(yahoo.get_articles_for_stock(session, "https://finance.yahoo.com/quote/wmt", "wmt"))
+        return res, session, http
+
+    def test_unchanged_link_set_is_a_hit(self):
+        with tempfile.TemporaryDirectory() as directory:
+            yahoo = build_yahoo()
+            yahoo.quote_cache = QuotePageCache(Mock(), directory)
+
+            res, session, http = self.get_articles(yahoo, httpx.Response(200, text=self.QUOTE_PAGE, headers={"etag": "v1"}))
+            self.assertFalse(res["unchanged"])
+            self.assertEqual(res["articles_for_stock"], ["https://a", "https://b"])
+            self.assertEqual(session.counters, {"quote_cache_misses": 1})
+
+            yahoo.quote_cache.put("wmt", res["articles_for_stock"], res["etag"])
+            res, session, http = self.get_articles(yahoo, httpx.Response(200, text=self.QUOTE_PAGE))
+            self.assertTrue(res["unchanged"])
+            self.assertEqual(session.counters, {"quote_cache_hits": 1})
+            self.assertEqual(http.get.call_args.kwargs["headers"], {"If-None-Match": "v1"})
+
+    def test_not_modified_uses_cached_links(self):
+        with tempfile.TemporaryDirectory() as directory:
+            yahoo = build_yahoo()
+            yahoo.quote_cache = QuotePageCache(Mock(), directory)
+            yahoo.quote_cache.put("wmt", ["https://a"], "v1")
+
+            res, session, http = self.get_articles(yahoo, httpx.Response(304))
+            self.assertTrue(res["unchanged"])
+            self.assertEqual(res["articles_for_stock"], ["https://a"])
+            self.assertEqual(session.counters, {"quote_cache_hits": 1, "quote_not_modified": 1})
+            self.assertEqual((res["etag"], res["last_modified"]), ("v1", None))
+
+    def test_not_modified_without_reuse_fetches_and_keeps_validators(self):
+        with tempfile.TemporaryDirectory() as directory:
+            yahoo = build_yahoo()
+            yahoo.reuse_seen_articles = False
+            yahoo.watermarks = None
+            yahoo.quote_cache = QuotePageCache(Mock(), directory)
+            yahoo.quote_cache.put("wmt", ["https://a"], "v1", "Mon, 07 Oct 2024 10:00:00 GMT")
+            yahoo.get_stories_for_stock = AsyncMock(return_value=[{"link": "https://a", "success": True}])
+            yahoo.save_articles_to_storage = Mock(return_value=[{"url": "https://a"}])
+
+            http = Mock()
+            http.get = AsyncMock(return_value=httpx.Response(304))
+            url_index = Mock()
+            url_index.get_prior_scrape.return_value = None
+            session = ScrapeSession("run", http, url_index)
+
+            res = asyncio.run(yahoo.run_scraper(session, "wmt", "run", 0))
+            self.assertTrue(res["unchanged"])
+            yahoo.get_stories_for_stock.assert_called_once()
+            entry = yahoo.quote_cache.get("wmt")
+            self.assertEqual((entry["etag"], entry["last_modified"]), ("v1", "Mon, 07 Oct 2024 10:00:00 GMT"))
+
+class TestQuoteCacheGating(unittest.TestCase):
+    def build(self, stories):
+        yahoo = build_yahoo()
+        yahoo.skip_seen_urls = True
+        yahoo.reuse_seen_articles = True
+        yahoo.watermarks = None
+        yahoo.quote_cache = Mock()
+        yahoo.get_articles_for_stock = AsyncMock(return_value={"articles_for_stock": ["https://a", "https://b"], "unchanged": False, "etag": "v1", "last_modified": None})
+        yahoo.get_stories_for_stock = AsyncMock(return_value=stories)
+        yahoo.save_articles_to_storage = Mock(side_effect=lambda articles, *args: [{"url": a["link"]} for a in articles])
+        url_index = Mock()
+        url_index.get_prior_scrape.return_value = None
+        return yahoo, ScrapeSession("run", None, url_index)
+
+    def test_story_list_cached_once_every_link_is_stored(self):
+        yahoo, session = self.build([{"link": "https://a", "success": True}, {"link": "https://b", "success": True}])
+        asyncio.run(yahoo.run_scraper(session, "wmt", "run", 0))
+        yahoo.quote_cache.put.assert_called_once_with("wmt", ["https://a", "https://b"], "v1", None)
+
+    def test_failed_fetch_keeps_story_list_uncached(self):
+        yahoo, session = self.build([{"link": "https://a", "success": True}])
+        asyncio.run(yahoo.run_scraper(session, "wmt", "run", 0))
+        yahoo.quote_cache.put.assert_not_called()
+
+    def test_unchanged_list_still_fetches_without_seen_skipping(self):
+        yahoo, session = self.build([{"link": "https://a", "success": True}, {"link": "https://b", "success": True}])
+        yahoo.skip_seen_urls = False
+        yahoo.get_articles_for_stock.return_value["unchanged"] = True
+        asyncio.run(yahoo.run_scraper(session, "wmt", "run", 0))
+        yahoo.get_stories_for_stock.assert_called_once()
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), "r") as file:
+        return file.read()
+
+class TestParserParity(unittest.TestCase):
+    ARTICLE_FIXTURES = ["yahoo_article.html", "yahoo_article_legacy.html", "yahoo_article_no_body.html"]
+
+    def get_backends(self):
+        backends = {}
+        for name, parser_cls in PARSERS.items():
+            try:
+                backends[name] = parser_cls()
+            except ImportError:
+                continue
+        return backends
+
+    def test_reference_extractor_output(self):
+        parser = SoupParser()
+
+        links = parser.get_story_links(read_fixture("yahoo_quote.html"))
+        self.assertEqual(links, [
+            "https://finance.yahoo.com/news/walmart-expands-drone-delivery-120000123.html",
+            "https://finance.yahoo.com/news/walmart-expands-drone-delivery-120000123.html",
+            "https://finance.yahoo.com/m/4b5a0b1c-0e2b-3c3d-9f0f-1b2c3d4e5f6a/retail-stocks-to-watch.html",
+            None,
+            "https://finance.yahoo.com/news/walmart-q3-earnings-preview-091500456.html",
+            "https://finance.yahoo.com/video/walmart-ceo-consumer-spending-153000789.html",
+        ])
+
+        article = parser.parse_article(read_fixture("yahoo_article.html"))
+        self.assertEqual(article["published_at"], "2024-10-05T20:14:03.000Z")
+        self.assertEqual(len(article["paragraphs"]), 5)
+        self.assertEqual(article["paragraphs"][2], "")
+
+        legacy = parser.parse_article(read_fixture("yahoo_article_legacy.html"))
+        self.assertEqual(legacy["published_at"], "2024-10-04T09:15:00.000Z")
+        self.assertEqual(len(legacy["paragraphs"]), 3)
+
+        no_body = parser.parse_article(read_fixture("yahoo_article_no_body.html"))
+        self.assertEqual(no_body, {"published_at": None, "paragraphs": None})
+        self.assertIsNone(parser.get_story_links(read_fixture("yahoo_article.html")))
+
+    def test_backends_match_reference(self):
+        reference = SoupParser()
+        for name, parser in self.get_backends().items():
+            with self.subTest(parser=name):
+                self.assertEqual(
+                    parser.get_story_links(read_fixture("yahoo_quote.html")),
+                    reference.get_story_links(read_fixture("yahoo_quote.html")),
+                )
+                self.assertIsNone(parser.get_story_links(read_fixture("yahoo_article.html")))
+
+                for fixture in self.ARTICLE_FIXTURES:
+                    self.assertEqual(
+                        parser.parse_article(read_fixture(fixture)),
+                        reference.parse_article(read_fixture(fixture)),
+                        fixture,
+                    )
+
+    def test_unknown_backend_falls_back(self):
+        with patch.dict(PARSERS, {"broken": Mock(side_effect=ImportError("missing"))}):
+            parser = get_parser("broken", Mock())
+        self.assertIsInstance(parser, StrainedSoupParser)
+
+class TestArticleContent(unittest.TestCase):
+    def test_boilerplate_is_stripped_and_counted(self):
+        yahoo = build_yahoo()
+        yahoo.boilerplate = Mock()
+        yahoo.boilerplate.strip.return_value = (["Walmart raised its outlook."], 12)
+        session = ScrapeSession("run", None, None)
+
+        content = yahoo.get_article_content({"paragraphs": ["Walmart raised its outlook.", "Read more: ..."]}, "https://a", session)
+
+        self.assertEqual(content, "Walmart raised its outlook.")
+        self.assertEqual(session.counters, {"boilerplate_paragraphs": 1, "boilerplate_tokens_saved": 12})
+
+class TestSaveArticles(unittest.TestCase):
+    def test_articles_saved_as_one_pack(self):
+        yahoo = build_yahoo()
+        articles = [
+            {"link": "https://a", "content": "a", "published_at": "2024-10-05T20:00:00.000Z"},
+            {"link": "https://b", "content": "b"},
+        ]
+        scrapes = yahoo.save_articles_to_storage(articles, "WMT", "run")
+
+        yahoo.bucket.blob.assert_called_once()
+        pack_key = yahoo.bucket.blob.call_args[0][0]
+        self.assertTrue(pack_key.startswith("scrapes/run/wmt/yahoo/"))
+        self.assertEqual([s["pack_key"] for s in scrapes], [pack_key, pack_key])
+        self.assertEqual(scrapes[0]["pack_offset"], 0)
+        self.assertEqual(scrapes[1]["pack_offset"], scrapes[0]["pack_length"])
+        self.assertNotIn("bucket_key", scrapes[0])
+        self.assertIn("published_at", scrapes[0])
+        yahoo.db["scrapes"].insert_many.assert_called_once_with(scrapes)
+
+class TestResume(unittest.TestCase):
+    def build(self, failed_stocks_per_call):
+        yahoo = build_yahoo()
+        yahoo.get_failed_stocks = Mock(side_effect=failed_stocks_per_call)
+        yahoo.scrape_stocks = AsyncMock(return_value={})
+        return yahoo
+
+    @patch("yahoo.yahoo.time.sleep")
+    def test_only_failed_stocks_are_rescraped(self, mock_sleep):
+        yahoo = self.build([["wmt", "hd"], ["hd"], []])
+        remaining = yahoo.resume("run", max_passes=3, base_delay=10)
+
+        self.assertEqual(remaining, [])
+        scraped = [c[0][0] for c in yahoo.scrape_stocks.call_args_list]
+        self.assertEqual(scraped, [["wmt", "hd"], ["hd"]])
+        mock_sleep.assert_called_once()
+        self.assertTrue(5 <= mock_sleep.call_args[0][0] <= 10)
+
+    @patch("yahoo.yahoo.time.sleep")
+    def test_passes_are_bounded(self, mock_sleep):
+        yahoo = self.build([["wmt"], ["wmt"], ["wmt"]])
+        remaining = yahoo.resume("run", max_passes=2, base_delay=1)
+
+        self.assertEqual(remaining, ["wmt"])
+        self.assertEqual(yahoo.scrape_stocks.call_count, 2)
+
+    def test_nothing_to_resume(self):
+        yahoo = self.build([[]])
+        self.assertEqual(yahoo.resume("run"), [])
+        yahoo.scrape_stocks.assert_not_called()
+
+    def test_resume_delay_grows(self):
+        yahoo = build_yahoo()
+        for attempt in range(4):
+            delay = yahoo.get_resume_delay(attempt, 10)
+            self.assertTrue(5 * 2 ** attempt <= delay <= 10 * 2 ** attempt)
+
+    def test_cancel_stops_between_passes(self):
+        yahoo = self.build([["wmt"], ["wmt"], ["wmt"]])
+        job = MagicMock()
+        job.cancel_event.wait.return_value = True
+
+        self.assertEqual(yahoo.resume("run", max_passes=3, base_delay=1, job=job), ["wmt"])
+        self.assertEqual(yahoo.scrape_stocks.call_count, 1)
+
+class TestCancelScrape(unittest.TestCase):
+    def test_cancelled_session_skips_remaining_stocks(self):
+        yahoo = build_yahoo()
+        yahoo.run_scraper = AsyncMock(return_value={"articles_for_stock": []})
+        yahoo.save_scraped_stock_data = Mock()
+        job = Mock()
+        job.is_cancelled.side_effect = [False, True, True]
+        session = ScrapeSession("run", None, None, job=job)
+
+        async def scrape():
+            sema = asyncio.Semaphore(1)
+            await asyncio.gather(*[yahoo.run_job(session, stock, sema, "run", idx) for idx, stock in enumerate(["wmt", "hd", "tgt"])])
+        asyncio.run(scrape())
+
+        self.assertEqual(yahoo.run_scraper.call_count, 1)
+        self.assertEqual(session.counters["cancelled"], 2)
+
+class TestRunSession(unittest.TestCase):
+    def test_runs_adapt_pacing_independently(self):
+        yahoo = build_yahoo()
+        yahoo.skip_seen_urls = False
+        yahoo.watermarks = None
+        yahoo.boilerplate = None
+        yahoo.adaptive_concurrency = True
+
+        backed_off = asyncio.Event()
+        scales = {}
+
+        async def blocked_run(session):
+            session.http.concurrency.decrease(time.monotonic(), "status 429")
+            backed_off.set()
+            scales["blocked"] = session.http.rate_limiter.scale
+
+        async def other_run(session):
+            await backed_off.wait()
+            scales["other"] = session.http.rate_limiter.scale
+
+        async def run_both():
+            await asyncio.gather(yahoo.run_session("run-a", blocked_run), yahoo.run_session("run-b", other_run))
+
+        with patch("yahoo.yahoo.BulkWriteBuffer"):
+            asyncio.run(run_both())
+        self.assertLess(scales["blocked"], 1.0)
+        self.assertEqual(scales["other"], 1.0)
+
+class TestQueueWorker(unittest.TestCase):
+    def test_worker_drains_queue_and_completes_items(self):
+        yahoo = build_yahoo()
+        yahoo.run_scraper = AsyncMock(side_effect=[{"articles_for_stock": []}, Exception("blocked")])
+        yahoo.save_scraped_stock_data = Mock()
+
+        items = [{"stock": "wmt", "lease_owner": "w"}, {"stock": "hd", "lease_owner": "w"}]
+        queue = Mock(lease_secs=60)
+        queue.claim.side_effect = items + [None]
+        queue.fail_expired.return_value = []
+        queue.has_open_items.return_value = False
+        session = ScrapeSession("run", None, None)
+
+        asyncio.run(yahoo.run_queue_worker(session, queue, "run", "w", 0, poll_secs=0))
+
+        completed = [(c[0][0]["stock"], c[0][1]) for c in queue.complete.call_args_list]
+        self.assertEqual(completed, [("wmt", True), ("hd", False)])
+        saved = [(c[0][0], c[0][2]) for c in yahoo.save_scraped_stock_data.call_args_list]
+        self.assertEqual(saved, [("wmt", True), ("hd", False)])
+        self.assertEqual(session.counters["queue_claimed"], 2)
+
+    def test_worker_waits_while_other_leases_are_open(self):
+        yahoo = build_yahoo()
+        queue = Mock(lease_secs=60)
+        queue.claim.return_value = None
+        queue.fail_expired.return_value = []
+        queue.has_open_items.side_effect = [True, True, False]
+
+        asyncio.run(yahoo.run_queue_worker(ScrapeSession("run", None, None), queue, "run", "w", 0, poll_secs=0))
+        self.assertEqual(queue.claim.call_count, 3)
+
+    def test_expired_last_attempts_are_saved_as_failed(self):
+        yahoo = build_yahoo()
+        yahoo.save_scraped_stock_data = Mock()
+        queue = Mock(lease_secs=60)
+        queue.claim.return_value = None
+        queue.fail_expired.side_effect = [["wmt"], []]
+        queue.has_open_items.side_effect = [True, False]
+        session = ScrapeSession("run", None, None)
+
+        asyncio.run(yahoo.run_queue_worker(session, queue, "run", "w", 0, poll_secs=0))
+        yahoo.save_scraped_stock_data.assert_called_once_with("wmt", "run", False, None)
+        self.assertEqual(session.counters["queue_expired"], 1)
+
+class FakeCollection:
+    # just enough of a mongo collection for a scrape run: bulk inserts and upserts, finds by url
+    def __init__(self, docs=None):
+        self.docs = docs or []
+
+    def create_index(self, *args, **kwargs):
+        pass
+
+    def count_documents(self, query, **kwargs):
+        return len(self.docs)
+
+    def find(self, query=None, projection=None):
+        # only $exists filters matter here
+        required = [field for field, value in (query or {}).items() if isinstance(value, dict) and value.get("$exists")]
+        return [dict(doc) for doc in self.docs if all(field in doc for field in required)]
+
+    def find_one(self, query, projection=None, sort=None):
+        matches = [doc for doc in self.docs if doc.get("url") == query.get("url")]
+        return dict(matches[-1]) if matches else None
+
+    def bulk_write(self, ops, ordered=True):
+        for op in ops:
+            self.apply(op)
+
+    def apply(self, op):
+        if isinstance(op, InsertOne):
+            self.docs.append(dict(op._doc))
+            return
+        doc = next((doc for doc in self.docs if all(doc.get(k) == v for k, v in op._filter.items())), None)
+        if doc is None:
+            doc = dict(op._filter)
+            self.docs.append(doc)
+        doc.update(op._doc.get("$set", {}))
+        for field, value in op._doc.get("$max", {}).items():
+            doc[field] = max(doc.get(field, value), value)
+        for field, value in op._doc.get("$push", {}).items():
+            doc.setdefault(field, []).extend(value["$each"])
+
+class TestScrapeEndToEnd(unittest.TestCase):
+    # whole runs through HttpClient against a mock transport: seen urls, quote cache and
+    # watermarks all carry state from one run to the next
+    QUOTE_URL = "https://finance.yahoo.com/quote/WMT"
+    PUBLISHED = {
+        "https://finance.yahoo.com/news/a.html": "2024-10-20T10:00:00.000Z",
+        "https://finance.yahoo.com/news/b.html": "2024-10-20T11:00:00.000Z",
+        "https://finance.yahoo.com/news/old.html": "2024-01-02T10:00:00.000Z",
+    }
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.requests = []
+        self.failing = {"https://finance.yahoo.com/news/b.html"}
+        self.collections = {
+            "scrapes": FakeCollection(),
+            "stock_prices": FakeCollection(),
+            "watermarks": FakeCollection([{"stock": "WMT", "source": "yahoo", "published_at": datetime(2024, 10, 10)}]),
+        }
+        self.article_html = read_fixture("yahoo_article.html")
+
+        env = {"STORAGE_BUCKET": "test-bucket", "SCRAPER_QUOTE_CACHE_DIR": self.cache_dir.name, "SCRAPER_STRIP_BOILERPLATE": "false"}
+        with patch.dict(os.environ, env):
+            db = MagicMock()
+            db.__getitem__.side_effect = lambda name: self.collections.setdefault(name, FakeCollection())
+            self.yahoo = Yahoo(Mock(), MagicMock(), db)
+        self.yahoo.rate_limiter = HostRateLimiter(rate=1000, burst=1000)
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def handle(self, request):
+        url = str(request.url)
+        self.requests.append(url)
+        if url == self.QUOTE_URL:
+            if request.headers.get("if-none-match") == "v1":
+                return httpx.Response(304)
+            links = "".join(f'<a class="subtle-link" href="{link}">story</a>' for link in self.PUBLISHED)
+            return httpx.Response(200, text=f'<div class="filtered-stories">{links}</div>', headers={"etag": "v1"})
+        if url in self.failing:
+            return httpx.Response(500)
+        return httpx.Response(200, text=self.article_html.replace("2024-10-05T20:14:03.000Z", self.PUBLISHED[url]))
+
+    def scrape(self, run_id):
+        transport = httpx.MockTransport(self.handle)
+        self.requests = []
+        with patch("yahoo.yahoo.HttpClient", lambda *args, **kwargs: HttpClient(*args, transport=transport, **kwargs)):
+            return asyncio.run(self.yahoo.scrape_stocks(["WMT"], run_id))
+
+    def get_scrapes(self, run_id):
+        return {scrape["url"]: scrape for scrape in self.collections["scrapes"].docs if scrape["run_id"] == run_id}
+
+    def test_failed_fetch_is_retried_and_stale_story_skipped(self):
+        a, b, old = self.PUBLISHED
+
+        self.scrape("run-1")
+        self.assertCountEqual(self.requests, [self.QUOTE_URL, a, b, old])
+        self.assertEqual(list(self.get_scrapes("run-1")), [a])
+        watermark = self.collections["watermarks"].docs[0]
+        self.assertEqual(watermark["published_at"], datetime(2024, 10, 20, 10))
+        self.assertEqual(watermark["stale_urls"], [old])
+        # b failed, the story list is not cached so the next run doesn't short-circuit
+        self.assertIsNone(self.yahoo.quote_cache.get("WMT"))
+
+        self.failing.clear()
+        stats = self.scrape("run-2")
+        self.assertEqual(self.requests, [self.QUOTE_URL, b])
+        scrapes = self.get_scrapes("run-2")
+        self.assertEqual(sorted(scrapes), [a, b])
+        self.assertEqual(scrapes[a]["reused_from_run_id"], "run-1")
+        self.assertEqual(stats["counters"]["stale_links"], 1)
+        self.assertIsNotNone(self.yahoo.quote_cache.get("WMT"))
+
+        # nothing new on the quote page, the articles are referenced without any fetches
+        self.scrape("run-3")
+        self.assertEqual(self.requests, [self.QUOTE_URL])
+        self.assertEqual(sorted(self.get_scrapes("run-3")), [a, b])
+
+        statuses = {(row["run_id"], row["success"]) for row in self.collections["stock_prices"].docs}
+        self.assertEqual(statuses, {("run-1", True), ("run-2", True), ("run-3", True)})
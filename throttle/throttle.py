@@ -0,0 +1,241 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+DEFAULT_RATE_PER_HOST = 1.0
+DEFAULT_BURST_PER_HOST = 5
+
+DEFAULT_MIN_LIMIT = 1
+DEFAULT_MAX_LIMIT = 20
+DEFAULT_DECREASE_FACTOR = 0.5
+DEFAULT_LATENCY_TOLERANCE = 2.0
+DEFAULT_LATENCY_WINDOW = 50
+
+
+class TokenBucket:
+    # rate is tokens per second, capacity is the max burst
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+
+    def reserve(self, tokens=1):
+        # take the tokens now and return how long the caller has to wait
+        # before using them. tokens can go negative, which queues callers fairly
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens -= tokens
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+    def set_rate(self, rate):
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = float(rate)
+
+    def acquire(self, tokens=1):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens=1):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class HostRateLimiter:
+    # one token bucket per host so a slow host doesn't throttle the others
+    def __init__(self, rate=DEFAULT_RATE_PER_HOST, burst=DEFAULT_BURST_PER_HOST, host_rates=None):
+        self.rate = rate
+        self.burst = burst
+        self.host_rates = host_rates or {}
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        rate = float(os.environ.get("SCRAPER_RATE_PER_HOST", DEFAULT_RATE_PER_HOST))
+        burst = float(os.environ.get("SCRAPER_BURST_PER_HOST", DEFAULT_BURST_PER_HOST))
+
+        # e.g. SCRAPER_HOST_RATES="finance.yahoo.com=2,consent.yahoo.com=0.5"
+        host_rates = {}
+        for entry in os.environ.get("SCRAPER_HOST_RATES", "").split(","):
+            if "=" not in entry:
+                continue
+            host, host_rate = entry.split("=", 1)
+            host_rates[host.strip().lower()] = float(host_rate)
+
+        return cls(rate, burst, host_rates)
+
+    def get_bucket(self, url):
+        host = urlparse(url).netloc.lower()
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.get_host_rate(host), self.burst)
+            return self.buckets[host]
+
+    def get_host_rate(self, host):
+        return self.host_rates.get(host, self.rate)
+
+    def acquire(self, url):
+        self.get_bucket(url).acquire()
+
+    async def acquire_async(self, url):
+        await self.get_bucket(url).acquire_async()
+
+
+class ScaledRateLimiter:
+    # one run's view of the shared HostRateLimiter. the shared buckets keep every run together
+    # inside the configured per host rates, a run that backs off also waits on its own buckets
+    # at the scaled rate, so one run's pacing never moves another's
+    def __init__(self, rate_limiter):
+        self.rate_limiter = rate_limiter
+        self.scale = 1.0
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def get_bucket(self, url):
+        # None at full scale, the shared bucket is all there is
+        host = urlparse(url).netloc.lower()
+        with self.lock:
+            if self.scale >= 1.0:
+                return None
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.rate_limiter.get_host_rate(host) * self.scale, self.rate_limiter.burst)
+            return self.buckets[host]
+
+    def set_scale(self, scale):
+        # never above the configured rates
+        with self.lock:
+            self.scale = min(scale, 1.0)
+            for host, bucket in self.buckets.items():
+                bucket.set_rate(self.rate_limiter.get_host_rate(host) * self.scale)
+
+    def acquire(self, url):
+        bucket = self.get_bucket(url)
+        if bucket:
+            bucket.acquire()
+        self.rate_limiter.acquire(url)
+
+    async def acquire_async(self, url):
+        bucket = self.get_bucket(url)
+        if bucket:
+            await bucket.acquire_async()
+        await self.rate_limiter.acquire_async(url)
+
+
+class AimdController:
+    # additive increase / multiplicative decrease on the number of in-flight fetches.
+    # fast 2xx responses grow the limit by roughly one per limit's worth of responses,
+    # 429s, 5xx, transport errors and a p95 drifting above the best p95 seen cut it.
+    # the run's rate limiter (a ScaledRateLimiter) is scaled with the limit so both back off
+    # together, up to the configured rates
+    def __init__(self, logger, run_id=None, rate_limiter=None, initial_limit=None, min_limit=None, max_limit=None,
+                 decrease_factor=DEFAULT_DECREASE_FACTOR, latency_tolerance=None, window=DEFAULT_LATENCY_WINDOW):
+        self.logger = logger
+        self.run_id = run_id
+        self.rate_limiter = rate_limiter
+        self.min_limit = min_limit or int(os.environ.get("SCRAPER_FETCH_CONCURRENCY_MIN", DEFAULT_MIN_LIMIT))
+        self.max_limit = max_limit or int(os.environ.get("SCRAPER_FETCH_CONCURRENCY_MAX", DEFAULT_MAX_LIMIT))
+        self.initial_limit = min(max(initial_limit or self.min_limit, self.min_limit), self.max_limit)
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance or float(os.environ.get("SCRAPER_LATENCY_TOLERANCE", DEFAULT_LATENCY_TOLERANCE))
+
+        self.limit = float(self.initial_limit)
+        self.in_flight = 0
+        self.condition = None
+
+        self.latencies = deque(maxlen=window)
+        self.baseline_p95 = None
+        # responses to requests sent before the last decrease say nothing about the new limit
+        self.last_decrease_at = 0.0
+
+        self.increases = 0
+        self.decreases = 0
+        self.min_seen = self.limit
+        self.max_seen = self.limit
+        self.limit_sum = 0.0
+        self.num_samples = 0
+
+    def get_limit(self):
+        return max(self.min_limit, int(self.limit))
+
+    async def acquire(self):
+        if self.condition is None:
+            self.condition = asyncio.Condition()
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < self.get_limit())
+            self.in_flight += 1
+        return time.monotonic()
+
+    async def release(self):
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def record(self, started_at, status_code, latency):
+        if status_code is None or status_code == 429 or status_code >= 500:
+            self.decrease(started_at, f"status {status_code or 'error'}")
+            return
+
+        self.latencies.append(latency)
+        if len(self.latencies) == self.latencies.maxlen:
+            p95 = sorted(self.latencies)[int(0.95 * (len(self.latencies) - 1))]
+            if self.baseline_p95 is None or p95 < self.baseline_p95:
+                self.baseline_p95 = p95
+            elif p95 > self.baseline_p95 * self.latency_tolerance:
+                self.decrease(started_at, f"p95 {round(p95 * 1000)}ms over baseline {round(self.baseline_p95 * 1000)}ms")
+                return
+
+        if status_code < 400:
+            self.increase()
+
+    def increase(self):
+        prev = self.get_limit()
+        self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        self.on_change()
+        if self.get_limit() > prev:
+            self.increases += 1
+            self.logger.info(f"[aimd] run_id {self.run_id}: fetch concurrency raised to {self.get_limit()}")
+
+    def decrease(self, started_at, reason):
+        if started_at < self.last_decrease_at:
+            return
+        self.last_decrease_at = time.monotonic()
+        self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+        # latencies from the old limit would trigger another cut straight away
+        self.latencies.clear()
+        self.decreases += 1
+        self.on_change()
+        self.logger.info(f"[aimd] run_id {self.run_id}: {reason}, fetch concurrency cut to {self.get_limit()}")
+
+    def on_change(self):
+        self.min_seen = min(self.min_seen, self.limit)
+        self.max_seen = max(self.max_seen, self.limit)
+        self.limit_sum += self.limit
+        self.num_samples += 1
+        if self.rate_limiter:
+            self.rate_limiter.set_scale(min(1.0, self.limit / self.initial_limit))
+
+    def get_stats(self):
+        return {
+            "limit": self.get_limit(),
+            "lowest_limit": int(self.min_seen),
+            "highest_limit": int(self.max_seen),
+            "avg_limit": round(self.limit_sum / self.num_samples, 1) if self.num_samples else self.get_limit(),
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "baseline_p95_ms": round(self.baseline_p95 * 1000, 1) if self.baseline_p95 else None,
+        }
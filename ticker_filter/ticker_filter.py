@@ -0,0 +1,147 @@
+import re
+import threading
+from collections import deque
+
+# legal suffixes dropped from company names, "Walmart Inc." is usually just "Walmart" in the text
+NAME_SUFFIXES = re.compile(
+    r"[\s,]+(inc|incorporated|corp|corporation|co|company|ltd|limited|plc|llc|lp|sa|nv|ag|holdings?|group|class [a-c])\.?$",
+    re.IGNORECASE,
+)
+MIN_NAME_LENGTH = 3
+
+
+class AhoCorasick:
+    # multi pattern matcher: one pass over the text finds every occurrence of every pattern,
+    # however many tickers and aliases are loaded
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+    def add(self, pattern, value):
+        node = 0
+        for char in pattern:
+            if char not in self.goto[node]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[node][char] = len(self.goto) - 1
+            node = self.goto[node][char]
+        self.output[node].append((len(pattern), value))
+
+    def build(self):
+        # breadth first so every fail link points at a node that is already done
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fail = self.fail[node]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[child] = self.goto[fail].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+        return self
+
+    def find(self, text):
+        # yields (start, end, value) for every match
+        node = 0
+        for end, char in enumerate(text, 1):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            for length, value in self.output[node]:
+                yield end - length, end, value
+
+
+def is_word_boundary(text, start, end):
+    return (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum())
+
+
+def get_name_variants(name):
+    variants = {name.strip()}
+    stripped = name.strip()
+    while True:
+        shorter = NAME_SUFFIXES.sub("", stripped).strip(" ,")
+        if shorter == stripped:
+            break
+        stripped = shorter
+        variants.add(stripped)
+    # "The Home Depot" is mostly just "Home Depot"
+    variants.update(variant[4:] for variant in list(variants) if variant.lower().startswith("the "))
+    return {variant for variant in variants if len(variant) >= MIN_NAME_LENGTH}
+
+
+class TickerPrefilter:
+    # decides locally whether an article mentions a stock at all. symbols match case sensitive
+    # ("WMT", "$WMT", "NYSE:WMT"), names and aliases case insensitive, both on word boundaries.
+    # it only has to be right about "no mention", any match still goes to the model
+    def __init__(self, db, logger):
+        self.collection = db["tickers"]
+        self.logger = logger
+        self.symbols = None
+        self.names = None
+        self.known = set()
+        self.lock = threading.Lock()
+        self.stats = {"checked": 0, "mentioned": 0, "skipped": 0, "unknown": 0}
+
+    def load(self, tickers=None):
+        # tickers look like {"symbol": "WMT", "name": "Walmart Inc.", "aliases": ["Wal-Mart"]}
+        if tickers is None:
+            tickers = self.collection.find({}, {"_id": 0, "symbol": 1, "name": 1, "aliases": 1})
+
+        symbols = AhoCorasick()
+        names = AhoCorasick()
+        known = set()
+        for ticker in tickers:
+            if not ticker.get("symbol"):
+                continue
+            stock_sym = ticker["symbol"].lower()
+            known.add(stock_sym)
+            symbols.add(ticker["symbol"].upper(), stock_sym)
+            for alias in [ticker.get("name")] + list(ticker.get("aliases") or []):
+                for variant in get_name_variants(alias or ""):
+                    names.add(variant.lower(), stock_sym)
+
+        with self.lock:
+            self.symbols = symbols.build()
+            self.names = names.build()
+            self.known = known
+        self.logger.info(f"[ticker_filter] loaded {len(known)} tickers")
+        return self
+
+    def ensure_loaded(self):
+        if self.symbols is None:
+            self.load()
+
+    def incr(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def find_mentions(self, text):
+        self.ensure_loaded()
+        mentions = {stock_sym for start, end, stock_sym in self.symbols.find(text) if is_word_boundary(text, start, end)}
+        lowered = text.lower()
+        mentions.update(stock_sym for start, end, stock_sym in self.names.find(lowered) if is_word_boundary(lowered, start, end))
+        return mentions
+
+    def mentions(self, stock_sym, text):
+        self.ensure_loaded()
+        stock_sym = stock_sym.lower()
+        self.incr("checked")
+        # nothing to match against, let the model decide
+        if stock_sym not in self.known:
+            self.incr("unknown")
+            return True
+
+        if stock_sym in self.find_mentions(text):
+            self.incr("mentioned")
+            return True
+        self.incr("skipped")
+        return False
+
+    def get_stats(self, since=None):
+        # since: an earlier get_stats() to count from
+        since = since or {}
+        with self.lock:
+            return {name: value - since.get(name, 0) for name, value in self.stats.items()}
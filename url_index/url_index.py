@@ -0,0 +1,80 @@
+import hashlib
+import math
+import os
+import threading
+from datetime import datetime, timezone, timedelta
+
+DEFAULT_WINDOW_DAYS = 30
+DEFAULT_ERROR_RATE = 0.01
+MIN_CAPACITY = 10000
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=DEFAULT_ERROR_RATE):
+        capacity = max(capacity, 1)
+        self.num_bits = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray(self.num_bits // 8 + 1)
+
+    def _positions(self, item):
+        # double hashing: k positions from two 64 bit halves of one digest
+        digest = hashlib.sha256(item.encode("utf-8")).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:16], "big")
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos // 8] |= 1 << (pos % 8)
+
+    def __contains__(self, item):
+        return all(self.bits[pos // 8] & (1 << (pos % 8)) for pos in self._positions(item))
+
+
+class SeenUrlIndex:
+    # urls already stored in the scrapes collection. the bloom filter answers "definitely new"
+    # without a round trip, mongo confirms the rest and hands back the prior scrape record
+    def __init__(self, db, logger, window_days=None):
+        self.collection = db["scrapes"]
+        self.logger = logger
+        self.window_days = window_days or int(os.environ.get("SCRAPER_SEEN_URL_WINDOW_DAYS", DEFAULT_WINDOW_DAYS))
+        self.bloom = BloomFilter(MIN_CAPACITY)
+        self.lock = threading.Lock()
+
+    def load(self):
+        since = datetime.now(timezone.utc) - timedelta(days=self.window_days)
+        query = {"scraped_at": {"$gte": since}, "source": "yahoo"}
+
+        self.collection.create_index("url")
+        capacity = max(MIN_CAPACITY, 2 * self.collection.count_documents(query))
+        bloom = BloomFilter(capacity)
+
+        num_urls = 0
+        for scrape in self.collection.find(query, {"url": 1, "_id": 0}):
+            if scrape.get("url"):
+                bloom.add(scrape["url"])
+                num_urls += 1
+
+        with self.lock:
+            self.bloom = bloom
+        self.logger.info(f"[url_index] loaded {num_urls} urls scraped in the last {self.window_days} days")
+
+    def add(self, url):
+        with self.lock:
+            self.bloom.add(url)
+
+    def might_contain(self, url):
+        with self.lock:
+            return url in self.bloom
+
+    def get_prior_scrape(self, url):
+        if not self.might_contain(url):
+            return None
+
+        # bloom filters have false positives, mongo has the final say
+        return self.collection.find_one(
+            {"url": url, "$or": [{"bucket_key": {"$exists": True}}, {"pack_key": {"$exists": True}}]},
+            {"_id": 0},
+            sort=[("scraped_at", -1)],
+        )
@@ -0,0 +1,63 @@
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+
+# stale links remembered per ticker, quote pages only list a few dozen stories
+MAX_STALE_URLS = 500
+
+
+class WatermarkStore:
+    # per ticker high-water mark: the newest published_at stored for that ticker
+    def __init__(self, db, logger, source="yahoo"):
+        self.collection = db["watermarks"]
+        self.logger = logger
+        self.source = source
+
+    def load_all(self):
+        watermarks = {}
+        for doc in self.collection.find({"source": self.source}, {"_id": 0, "stock": 1, "published_at": 1}):
+            if doc.get("published_at"):
+                watermarks[doc["stock"]] = doc["published_at"]
+        self.logger.info(f"[watermark] loaded {len(watermarks)} watermarks for {self.source}")
+        return watermarks
+
+    def load_stale_urls(self):
+        stale_urls = {}
+        for doc in self.collection.find({"source": self.source, "stale_urls": {"$exists": True}}, {"_id": 0, "stock": 1, "stale_urls": 1}):
+            stale_urls[doc["stock"]] = set(doc["stale_urls"])
+        return stale_urls
+
+    def get_update(self, stock, published_at):
+        # $max so concurrent or out of order writers can never move a watermark backwards
+        return UpdateOne(
+            {"stock": stock, "source": self.source},
+            {
+                "$max": {"published_at": published_at},
+                "$set": {"updated_at": datetime.now(timezone.utc)},
+            },
+            upsert=True,
+        )
+
+    def advance(self, stock, published_at, write_buffer=None):
+        if not published_at:
+            return
+
+        update = self.get_update(stock, published_at)
+        if write_buffer:
+            write_buffer.add("watermarks", update)
+            return
+        self.collection.bulk_write([update])
+
+    def mark_stale(self, stock, urls, write_buffer=None):
+        # links fetched once and found older than the cutoff, the next run skips them before fetching
+        if not urls:
+            return
+
+        update = UpdateOne(
+            {"stock": stock, "source": self.source},
+            {"$push": {"stale_urls": {"$each": list(urls), "$slice": -MAX_STALE_URLS}}},
+            upsert=True,
+        )
+        if write_buffer:
+            write_buffer.add("watermarks", update)
+            return
+        self.collection.bulk_write([update])
@@ -0,0 +1,126 @@
+import os
+import socket
+import uuid
+from datetime import datetime, timezone, timedelta
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+
+DEFAULT_LEASE_SECS = 120
+DEFAULT_MAX_ATTEMPTS = 3
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+def get_worker_id():
+    # unique per process and per call, so two drains in one container don't share leases
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+class LeaseWorkQueue:
+    # one document per (run_id, stock). workers claim tickers by taking a time limited lease
+    # and keep it alive with heartbeats, a lease that runs out (crashed or stuck worker) is
+    # claimable again by anyone, so idle workers steal the work of dead ones
+    def __init__(self, db, logger, lease_secs=None, max_attempts=None):
+        self.collection = db["scrape_queue"]
+        self.logger = logger
+        self.lease_secs = lease_secs or float(os.environ.get("SCRAPER_QUEUE_LEASE_SECS", DEFAULT_LEASE_SECS))
+        self.max_attempts = max_attempts or int(os.environ.get("SCRAPER_QUEUE_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS))
+
+    def ensure_indexes(self):
+        self.collection.create_index([("run_id", ASCENDING), ("stock", ASCENDING)], unique=True)
+        self.collection.create_index([("run_id", ASCENDING), ("status", ASCENDING), ("lease_expires_at", ASCENDING)])
+
+    def enqueue(self, run_id, stocks):
+        # idempotent, every worker of a run can enqueue the same lists without duplicating tickers
+        now = datetime.now(timezone.utc)
+        ops = [
+            UpdateOne(
+                {"run_id": run_id, "stock": stock},
+                {"$setOnInsert": {"status": PENDING, "attempts": 0, "enqueued_at": now}},
+                upsert=True,
+            )
+            for stock in dict.fromkeys(stocks)
+        ]
+        if not ops:
+            return 0
+
+        res = self.collection.bulk_write(ops, ordered=False)
+        self.logger.info(f"[work_queue] enqueued {res.upserted_count} of {len(ops)} stocks for run_id {run_id}")
+        return res.upserted_count
+
+    def get_lease_expiry(self, now):
+        return now + timedelta(seconds=self.lease_secs)
+
+    def claim(self, run_id, worker_id):
+        now = datetime.now(timezone.utc)
+        query = {
+            "run_id": run_id,
+            "attempts": {"$lt": self.max_attempts},
+            "$or": [
+                {"status": PENDING},
+                {"status": LEASED, "lease_expires_at": {"$lt": now}},
+            ],
+        }
+        update = {
+            "$set": {"status": LEASED, "lease_owner": worker_id, "lease_expires_at": self.get_lease_expiry(now), "updated_at": now},
+            "$inc": {"attempts": 1},
+        }
+        item = self.collection.find_one_and_update(query, update, sort=[("enqueued_at", ASCENDING)], return_document=ReturnDocument.AFTER)
+        if item and item["attempts"] > 1:
+            self.logger.info(f"[work_queue] {worker_id} picked up stock {item['stock']} for run_id {run_id}, attempt {item['attempts']}")
+        return item
+
+    def fail_expired(self, run_id):
+        # a lease that runs out on the last attempt can't be claimed again, mark it failed so
+        # the run finishes. returns the stocks this call failed
+        now = datetime.now(timezone.utc)
+        query = {"run_id": run_id, "status": LEASED, "attempts": {"$gte": self.max_attempts}, "lease_expires_at": {"$lt": now}}
+        failed = []
+        for item in self.collection.find(query, {"stock": 1, "lease_owner": 1}):
+            # guarded by the owner, two workers sweeping at once fail each stock only once
+            res = self.collection.update_one(
+                {"_id": item["_id"], "status": LEASED, "lease_owner": item.get("lease_owner")},
+                {"$set": {"status": FAILED, "updated_at": now}, "$unset": {"lease_owner": "", "lease_expires_at": ""}},
+            )
+            if res.modified_count == 1:
+                self.logger.info(f"[work_queue] lease on stock {item['stock']} for run_id {run_id} expired on the last attempt, marked failed")
+                failed.append(item["stock"])
+        return failed
+
+    def heartbeat(self, item):
+        # false means the lease expired and another worker owns the stock now
+        now = datetime.now(timezone.utc)
+        res = self.collection.update_one(
+            {"_id": item["_id"], "status": LEASED, "lease_owner": item["lease_owner"]},
+            {"$set": {"lease_expires_at": self.get_lease_expiry(now), "updated_at": now}},
+        )
+        return res.modified_count == 1
+
+    def complete(self, item, success=True):
+        now = datetime.now(timezone.utc)
+        if success:
+            status = DONE
+        elif item["attempts"] >= self.max_attempts:
+            status = FAILED
+        else:
+            status = PENDING
+
+        res = self.collection.update_one(
+            {"_id": item["_id"], "lease_owner": item["lease_owner"]},
+            {"$set": {"status": status, "updated_at": now}, "$unset": {"lease_owner": "", "lease_expires_at": ""}},
+        )
+        return res.modified_count == 1
+
+    def get_counts(self, run_id):
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        for row in self.collection.aggregate([{"$match": {"run_id": run_id}}, {"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+            counts[row["_id"]] = row["count"]
+        return counts
+
+    def has_open_items(self, run_id):
+        # leased items count too, their lease may still run out and need stealing (or failing
+        # when it was the last attempt)
+        query = {"run_id": run_id, "status": {"$in": [PENDING, LEASED]}}
+        return self.collection.count_documents(query, limit=1) > 0
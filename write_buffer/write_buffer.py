@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+from pymongo.errors import BulkWriteError
+from stats.stats import percentile
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL = 5.0
+DEFAULT_MAX_RETRIES = 3
+DUPLICATE_KEY_ERROR = 11000
+
+
+class BulkWriteBuffer:
+    # write-behind buffer: coalesces the per stock writes of a run into unordered bulk_write
+    # batches, flushed when the buffer is full or every flush_interval seconds
+    def __init__(self, db, logger, batch_size=None, flush_interval=None, max_retries=DEFAULT_MAX_RETRIES):
+        self.db = db
+        self.logger = logger
+        self.batch_size = batch_size or int(os.environ.get("SCRAPER_WRITE_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+        self.flush_interval = flush_interval or float(os.environ.get("SCRAPER_WRITE_FLUSH_SECS", DEFAULT_FLUSH_INTERVAL))
+        self.max_retries = max_retries
+
+        self.ops = {}
+        self.num_ops = 0
+        self.lock = threading.Lock()
+        # one flush at a time so batches reach mongo in the order they were cut
+        self.flush_lock = threading.Lock()
+
+        self.batch_sizes = []
+        self.flush_latencies = []
+        self.failed_ops = 0
+        self.retried_ops = 0
+
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.flush_periodically, daemon=True)
+        self.thread.start()
+        return self
+
+    def flush_periodically(self):
+        while not self.stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                self.logger.error(f"[write_buffer] periodic flush failed: {e}")
+
+    def add(self, collection_name, op):
+        with self.lock:
+            self.ops.setdefault(collection_name, []).append(op)
+            self.num_ops += 1
+            is_full = self.num_ops >= self.batch_size
+
+        if is_full:
+            self.flush()
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                ops, self.ops = self.ops, {}
+                self.num_ops = 0
+
+            for collection_name, collection_ops in ops.items():
+                self.write_batch(collection_name, collection_ops)
+
+    def write_batch(self, collection_name, ops):
+        if not ops:
+            return
+
+        collection = self.db[collection_name]
+        start = time.perf_counter()
+        try:
+            collection.bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            # unordered batches keep going past failures, retry only the documents that failed
+            failed = [ops[err["index"]] for err in e.details.get("writeErrors", []) if err.get("code") != DUPLICATE_KEY_ERROR]
+            self.logger.info(f"[write_buffer] {len(failed)} of {len(ops)} writes to {collection_name} failed, retrying")
+            for op in failed:
+                self.retry_op(collection, op)
+        except Exception as e:
+            # the batch may have partly landed, inserts keep their _id so a retried duplicate is a no-op
+            self.logger.info(f"[write_buffer] bulk write to {collection_name} failed: {e}, retrying per document")
+            for op in ops:
+                self.retry_op(collection, op)
+        finally:
+            latency = time.perf_counter() - start
+            with self.lock:
+                self.batch_sizes.append(len(ops))
+                self.flush_latencies.append(latency)
+            self.logger.info(f"[write_buffer] flushed {len(ops)} writes to {collection_name} in {round(latency * 1000)}ms")
+
+    def retry_op(self, collection, op):
+        for attempt in range(self.max_retries):
+            time.sleep(0.5 * 2 ** attempt)
+            with self.lock:
+                self.retried_ops += 1
+            try:
+                collection.bulk_write([op], ordered=False)
+                return
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                if errors and errors[0].get("code") == DUPLICATE_KEY_ERROR:
+                    return
+            except Exception as e:
+                self.logger.info(f"[write_buffer] retry {attempt + 1} failed: {e}")
+
+        with self.lock:
+            self.failed_ops += 1
+        self.logger.error(f"[write_buffer] giving up on write to {collection.name} after {self.max_retries} retries")
+
+    def close(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        self.flush()
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "batches": len(self.batch_sizes),
+                "writes": sum(self.batch_sizes),
+                "max_batch_size": max(self.batch_sizes, default=0),
+                "avg_batch_size": round(sum(self.batch_sizes) / len(self.batch_sizes), 1) if self.batch_sizes else 0,
+                "flush_ms_avg": round(1000 * sum(self.flush_latencies) / len(self.flush_latencies), 1) if self.flush_latencies else 0,
+                "flush_ms_p95": round(1000 * percentile(self.flush_latencies, 95), 1),
+                "retried": self.retried_ops,
+                "failed": self.failed_ops,
+            }
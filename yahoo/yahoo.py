@@ -1,6 +1,6 @@
 # bloomberg scraper
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+from bs4 import BeautifulSoup, SoupStrainer
 import random
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -11,7 +11,7 @@ from chromedriver_py import binary_path
 from selenium.webdriver.support import expected_conditions as EC
 import time
 import os
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 import json
 import threading
 from urllib.parse import urlparse
@@ -26,6 +26,214 @@ from tenacity import retry, stop_after_attempt, wait_random
 import uuid
 import traceback
 import platform
+from throttle.throttle import HostRateLimiter, ScaledRateLimiter, AimdController
+from http_client.http_client import HttpClient
+from url_index.url_index import SeenUrlIndex
+from http_cache.http_cache import QuotePageCache
+from article_store.article_store import ArticleStore, PACK_SUFFIX, get_storage_fields
+from write_buffer.write_buffer import BulkWriteBuffer
+from pymongo import InsertOne, UpdateOne
+from watermark.watermark import WatermarkStore
+from work_queue.work_queue import LeaseWorkQueue, get_worker_id
+from job_manager.job_manager import track_stage
+from boilerplate.boilerplate import BoilerplateFilter
+
+DEFAULT_MAX_CONCURRENCY = 5
+DEFAULT_WATERMARK_LOOKBACK_HOURS = 24
+DEFAULT_RESUME_MAX_PASSES = 3
+DEFAULT_RESUME_BASE_DELAY = 30
+RESUME_STOCK_LIST = "resume"
+DEFAULT_QUEUE_POLL_SECS = 5
+QUEUE_STOCK_LIST_PREFIX = "queue:"
+DEFAULT_PARSER = "lxml"
+ARTICLE_BODY_CLASSES = ("caas-body", "body yf-5ef8bf")
+
+
+def get_class_list(attrs):
+    classes = attrs.get("class") or []
+    if isinstance(classes, str):
+        classes = classes.split()
+    return classes
+
+
+def is_story_list_tag(name, attrs):
+    return name == "div" and any("filtered-stories" in c for c in get_class_list(attrs))
+
+
+def is_article_body(attrs):
+    classes = get_class_list(attrs)
+    return "caas-body" in classes or " ".join(classes) == "body yf-5ef8bf"
+
+
+def is_article_tag(name, attrs):
+    classes = get_class_list(attrs)
+    if name == "time":
+        return "byline-attr-meta-time" in classes
+    if name == "div":
+        return "caas-attr-time-style" in classes or is_article_body(attrs)
+    return False
+
+
+class SoupParser:
+    # the original extractor, BeautifulSoup over the whole page
+    def __init__(self, features='html.parser'):
+        self.features = features
+
+    def make_soup(self, html, strainer):
+        return BeautifulSoup(html, self.features)
+
+    def get_story_links(self, html):
+        # None when the story list is missing, otherwise the href of every story link (or None)
+        soup = self.make_soup(html, SoupStrainer(is_story_list_tag))
+        filtered_stories = soup.find('div', class_=lambda x: x and 'filtered-stories' in x)
+        if not filtered_stories:
+            return None
+
+        atags = filtered_stories.find_all("a", class_=lambda x: x and 'subtle-link' in x)
+        return [atag.get('href') for atag in atags]
+
+    def parse_article(self, html):
+        soup = self.make_soup(html, SoupStrainer(is_article_tag))
+
+        published_at = None
+        time_tag = soup.find('time', class_='byline-attr-meta-time')
+        if time_tag:
+            published_at = time_tag.get('datetime')
+        else:
+            time_wrapper = soup.find('div', class_='caas-attr-time-style')
+            if time_wrapper:
+                time_tag = time_wrapper.find('time')
+                if time_tag:
+                    published_at = time_tag.get('datetime')
+
+        paragraphs = None
+        article_content = soup.find('div', class_=ARTICLE_BODY_CLASSES)
+        if article_content:
+            paragraphs = [p_tag.get_text().strip() for p_tag in article_content.find_all('p')]
+
+        return {"published_at": published_at, "paragraphs": paragraphs}
+
+
+class StrainedSoupParser(SoupParser):
+    # same lookups, but only the story list / byline / body subtrees get built
+    def make_soup(self, html, strainer):
+        return BeautifulSoup(html, self.features, parse_only=strainer)
+
+
+class LxmlParser:
+    STORY_LIST = "//div[contains(@class, 'filtered-stories')]"
+    STORY_LINKS = ".//a[contains(@class, 'subtle-link')]"
+    BYLINE_TIME = "//time[contains(concat(' ', normalize-space(@class), ' '), ' byline-attr-meta-time ')]"
+    TIME_WRAPPER = "//div[contains(concat(' ', normalize-space(@class), ' '), ' caas-attr-time-style ')]"
+    BODY = "//div[contains(concat(' ', normalize-space(@class), ' '), ' caas-body ') or @class = 'body yf-5ef8bf']"
+
+    def __init__(self):
+        import lxml.html
+        self.lxml_html = lxml.html
+        self.html_parser = lxml.html.HTMLParser(encoding="utf-8")
+
+    def make_tree(self, html):
+        return self.lxml_html.fromstring(html.encode("utf-8"), parser=self.html_parser)
+
+    def get_story_links(self, html):
+        filtered_stories = self.make_tree(html).xpath(self.STORY_LIST)
+        if not filtered_stories:
+            return None
+        return [atag.get('href') for atag in filtered_stories[0].xpath(self.STORY_LINKS)]
+
+    def parse_article(self, html):
+        tree = self.make_tree(html)
+
+        published_at = None
+        time_tags = tree.xpath(self.BYLINE_TIME)
+        if time_tags:
+            published_at = time_tags[0].get('datetime')
+        else:
+            time_wrappers = tree.xpath(self.TIME_WRAPPER)
+            if time_wrappers:
+                time_tags = time_wrappers[0].xpath(".//time")
+                if time_tags:
+                    published_at = time_tags[0].get('datetime')
+
+        paragraphs = None
+        bodies = tree.xpath(self.BODY)
+        if bodies:
+            paragraphs = [p_tag.text_content().strip() for p_tag in bodies[0].xpath(".//p")]
+
+        return {"published_at": published_at, "paragraphs": paragraphs}
+
+
+class SelectolaxParser:
+    def __init__(self):
+        from selectolax.parser import HTMLParser
+        self.html_parser = HTMLParser
+
+    def get_story_links(self, html):
+        filtered_stories = self.html_parser(html).css_first('div[class*="filtered-stories"]')
+        if not filtered_stories:
+            return None
+        return [atag.attributes.get('href') for atag in filtered_stories.css('a[class*="subtle-link"]')]
+
+    def parse_article(self, html):
+        tree = self.html_parser(html)
+
+        published_at = None
+        time_tag = tree.css_first('time.byline-attr-meta-time')
+        if time_tag:
+            published_at = time_tag.attributes.get('datetime')
+        else:
+            time_wrapper = tree.css_first('div.caas-attr-time-style')
+            if time_wrapper:
+                time_tag = time_wrapper.css_first('time')
+                if time_tag:
+                    published_at = time_tag.attributes.get('datetime')
+
+        # a selector list returns matches grouped per selector, so pick the first body in document order
+        paragraphs = None
+        article_content = next((div for div in tree.css('div[class]') if is_article_body(div.attributes)), None)
+        if article_content:
+            paragraphs = [p_tag.text(deep=True).strip() for p_tag in article_content.css('p')]
+
+        return {"published_at": published_at, "paragraphs": paragraphs}
+
+
+PARSERS = {
+    "html.parser": SoupParser,
+    "strainer": StrainedSoupParser,
+    "lxml": LxmlParser,
+    "selectolax": SelectolaxParser,
+}
+
+
+def get_parser(name, logger):
+    try:
+        return PARSERS[name]()
+    except ImportError as e:
+        # lxml / selectolax are optional, the strained soup parser only needs bs4
+        logger.info(f"[scraper] parser {name} unavailable ({e}), falling back to strainer")
+        return StrainedSoupParser()
+
+
+class ScrapeSession:
+    # per-run state shared by every stock scraped in one call to start
+    def __init__(self, run_id, http, url_index, write_buffer=None, watermarks=None, stream=None, job=None, stale_urls=None):
+        self.run_id = run_id
+        self.http = http
+        self.url_index = url_index
+        self.write_buffer = write_buffer
+        self.watermarks = watermarks or {}
+        self.stale_urls = stale_urls or {}
+        self.stream = stream
+        self.job = job
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def incr(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def is_cancelled(self):
+        return self.job is not None and self.job.is_cancelled()
 
 
 class Yahoo:
@@ -37,6 +245,36 @@ class Yahoo:
 
         STORAGE_BUCKET=os.environ["STORAGE_BUCKET"]
         self.bucket = self.storage.get_bucket(STORAGE_BUCKET)
+        self.article_store = ArticleStore(self.logger, self.bucket)
+
+        # shared across runs so concurrent /scrape-list calls respect the same per-host limits
+        self.rate_limiter = HostRateLimiter.from_env()
+        self.max_concurrency = int(os.environ.get("SCRAPER_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY))
+        # in-flight fetches follow 429s, 5xx and latency instead of staying at max_concurrency
+        self.adaptive_concurrency = os.environ.get("SCRAPER_ADAPTIVE_CONCURRENCY", "true").lower() == "true"
+        self.parser = get_parser(os.environ.get("YAHOO_PARSER", DEFAULT_PARSER), self.logger)
+
+        # links already stored by an earlier run are not fetched again, by default the new
+        # run gets a scrape record pointing at the prior blob so /predict still sees the article
+        self.skip_seen_urls = os.environ.get("SCRAPER_SKIP_SEEN_URLS", "true").lower() == "true"
+        self.reuse_seen_articles = os.environ.get("SCRAPER_REUSE_SEEN_ARTICLES", "true").lower() == "true"
+
+        # per ticker newest published_at, links known to be older than the watermark minus the
+        # longest predict lookback are never fetched or referenced again
+        self.watermarks = None
+        if os.environ.get("SCRAPER_WATERMARKS", "true").lower() == "true":
+            self.watermarks = WatermarkStore(self.db, self.logger)
+        self.watermark_lookback = timedelta(hours=float(os.environ.get("SCRAPER_WATERMARK_LOOKBACK_HOURS", DEFAULT_WATERMARK_LOOKBACK_HOURS)))
+
+        self.quote_cache = None
+        if os.environ.get("SCRAPER_QUOTE_CACHE", "true").lower() == "true":
+            self.quote_cache = QuotePageCache(self.logger)
+
+        # disclaimers, "read more" and newsletter blurbs never reach storage or the model,
+        # learned with scripts/learn_boilerplate.py
+        self.boilerplate = None
+        if os.environ.get("SCRAPER_STRIP_BOILERPLATE", "true").lower() == "true":
+            self.boilerplate = BoilerplateFilter(self.db, self.logger)
     
     # def get_blob_key(self, article, directory):
     #         # sanitized_title = re.sub(r'[\/:*?"<>|]', '', article['title']).lower().translate(str.maketrans('', '', string.punctuation)).replace(" ", "_")
@@ -48,90 +286,172 @@ class Yahoo:
     #         new_blob = self.bucket.blob(key)
     #         return new_blob, key
 
-    def create_scrape_record(self, article, directory, stock_sym, run_id):
-        # new_blob, key = self.get_blob_key(article, directory)
-        key_uuid = str(uuid.uuid4())
-        key = f"{directory}/{key_uuid}.txt"
-        new_blob = self.bucket.blob(key)
-        
-        try: 
-            new_blob.upload_from_string(json.dumps(article))
-        except Exception as e:
-            self.logger.info("[scraper]: failed to save article to cloud bucket")
-            return
-
+    def create_scrape_record(self, article, storage_fields, stock_sym, run_id):
         app_env = os.environ.get('APP_ENV', 'LOCAL')
         timestamp = datetime.now(timezone.utc)
         scrape = {
             "stock": stock_sym,
             "scraped_at": timestamp,
-            "bucket_key": key,
             "app_env": app_env,
             "source": "yahoo",
             "url": article["link"],
             "run_id": run_id,
+            **storage_fields,
         }
 
-        if article['published_at']:
-            parsed_time = datetime.strptime(article['published_at'], "%Y-%m-%dT%H:%M:%S.%fZ")
+        parsed_time = self.parse_published_at(article.get('published_at'))
+        if parsed_time:
             scrape['published_at'] = parsed_time
         return scrape
 
 
-    def save_articles_to_storage(self, articles, stock_sym, run_id):
+    def insert_scrapes(self, scrapes, write_buffer=None):
+        if write_buffer:
+            for scrape in scrapes:
+                write_buffer.add('scrapes', InsertOne(scrape))
+            return
+
+        scrapes_collection = self.db['scrapes']
+        scrapes_collection.insert_many(scrapes)
+
+    def save_articles_to_storage(self, articles, stock_sym, run_id, write_buffer=None):
         if not articles:
             return 
 
+        # one pack per stock per call, scrape records point into it by offset
         directory = f"scrapes/{run_id}/{stock_sym.lower()}/yahoo"
-        
-        scrapes_collection = self.db['scrapes']
+        pack_key = f"{directory}/{uuid.uuid4()}{PACK_SUFFIX}"
+
+        try:
+            index = self.article_store.write_pack(pack_key, articles)
+        except Exception as e:
+            self.logger.info(f"[scraper]: failed to save article pack to cloud bucket: {e}")
+            return
+
         scrapes = []
 
-        for article in articles:
+        for article, offsets in zip(articles, index):
+            scrape = self.create_scrape_record(article, {"pack_key": pack_key, **offsets}, stock_sym, run_id)
+            scrapes.append(scrape)
 
-            scrape = self.create_scrape_record(article, directory, stock_sym, run_id)
-            if not scrape:
-                continue
-            
+        if not scrapes:
+            return
+        self.insert_scrapes(scrapes, write_buffer)
+        return scrapes
+
+    def save_prior_scrapes(self, prior_scrapes, stock_sym, run_id, write_buffer=None):
+        # reference blobs stored by an earlier run instead of fetching and uploading them again
+        if not prior_scrapes:
+            return
+
+        timestamp = datetime.now(timezone.utc)
+        scrapes = []
+        for prior_scrape in prior_scrapes:
+            scrape = {
+                "stock": stock_sym,
+                "scraped_at": timestamp,
+                "app_env": os.environ.get('APP_ENV', 'LOCAL'),
+                "source": "yahoo",
+                "url": prior_scrape["url"],
+                "run_id": run_id,
+                "reused_from_run_id": prior_scrape.get("run_id"),
+                **get_storage_fields(prior_scrape),
+            }
+            if prior_scrape.get("published_at"):
+                scrape["published_at"] = prior_scrape["published_at"]
             scrapes.append(scrape)
-        scrapes_collection.insert_many(scrapes)
-        
 
-    def get_published_at(self, soup):
-        datetime_value = None
-        # Find the <time> tag with the specific class
-        time_tag = soup.find('time', class_='byline-attr-meta-time')
-        if time_tag:
-            datetime_value = time_tag['datetime']
-        else:
-            time_wrapper = soup.find('div', class_='caas-attr-time-style') 
-            if time_wrapper:
-                time_tag = time_wrapper.find('time')
-                if time_tag:
-                    datetime_value = time_tag['datetime']
+        self.insert_scrapes(scrapes, write_buffer)
+
+    def get_watermark_cutoff(self, session, stock):
+        watermark = session.watermarks.get(stock)
+        if not watermark:
+            return None
+        return watermark - self.watermark_lookback
+
+    def split_seen_links(self, session, articles_for_stock, cutoff=None, stale_urls=()):
+        if not self.skip_seen_urls and not stale_urls:
+            return articles_for_stock, [], 0
+
+        new_links = []
+        prior_scrapes = []
+        num_skipped = 0
+        num_stale = 0
+        for idx, link in enumerate(articles_for_stock):
+            # fetched by an earlier run and dropped as older than the watermark
+            if link in stale_urls:
+                num_stale += 1
+                continue
+            if not self.skip_seen_urls:
+                new_links.append(link)
+                continue
 
-        return datetime_value
+            prior_scrape = session.url_index.get_prior_scrape(link)
+            if not prior_scrape:
+                new_links.append(link)
+                continue
 
-    def get_article_content(self, soup, link):
-        article_text = []
-        article_content = soup.find('div', class_=("caas-body", "body yf-5ef8bf"))
-        if not article_content:
+            # quote pages list stories newest first, once a stored story is older than the
+            # cutoff everything below it is too
+            published_at = prior_scrape.get("published_at")
+            if cutoff and published_at and published_at < cutoff:
+                num_skipped = len(articles_for_stock) - idx
+                break
+            prior_scrapes.append(prior_scrape)
+
+        session.incr("new_links", len(new_links))
+        session.incr("seen_links", len(prior_scrapes))
+        if num_skipped:
+            session.incr("watermark_skipped_links", num_skipped)
+        if num_stale:
+            session.incr("stale_links", num_stale)
+        return new_links, prior_scrapes, num_skipped
+
+    def parse_published_at(self, published_at):
+        if not published_at:
+            return None
+        try:
+            return datetime.strptime(published_at, "%Y-%m-%dT%H:%M:%S.%fZ")
+        except ValueError:
+            return None
+
+    def drop_stories_before(self, session, stories_for_stock, cutoff):
+        # returns (kept stories, links of the dropped ones)
+        if not cutoff or not stories_for_stock:
+            return stories_for_stock, []
+
+        kept = []
+        stale_links = []
+        for story in stories_for_stock:
+            published_at = self.parse_published_at(story.get("published_at"))
+            if published_at and published_at < cutoff:
+                session.incr("watermark_dropped_stories")
+                stale_links.append(story.get("link"))
+                continue
+            kept.append(story)
+        return kept, stale_links
+
+    def get_article_content(self, parsed_article, link, session=None):
+        paragraphs = parsed_article["paragraphs"]
+        if paragraphs is None:
             self.logger.info(f"skipped link: {link}")
             return
             
-        p_tags = article_content.find_all('p')
-        if not p_tags:
+        if not paragraphs:
             return
+
+        if self.boilerplate:
+            kept, tokens_saved = self.boilerplate.strip(paragraphs)
+            if session and tokens_saved:
+                session.incr("boilerplate_paragraphs", len(paragraphs) - len(kept))
+                session.incr("boilerplate_tokens_saved", tokens_saved)
+            paragraphs = kept
             
-        for p_tag in p_tags:
-            ptext = p_tag.get_text().strip()
-            article_text.append(ptext)
-            
-        article_text_str = '\n'.join(article_text)
+        article_text_str = '\n'.join(paragraphs)
         return article_text_str
  
 
-    def scrape_recent_news_for_sym(self, link, run_id, stock):
+    async def scrape_recent_news_for_sym(self, session, link, run_id, stock):
         title = str(uuid.uuid4())
         res = {
             "title": title, 
@@ -141,23 +461,20 @@ class Yahoo:
         }
 
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-            }
-            response = requests.get(link, headers=headers)
+            response = await session.http.get(link)
             if response.status_code != 200:
                 raise Exception("Failed to get 200 response from Yahoo link: ", link)
 
             main_page_source = response.text
-            soup = BeautifulSoup(main_page_source, 'html.parser')
+            parsed_article = self.parser.parse_article(main_page_source)
 
            
-            published_at = self.get_published_at(soup)
+            published_at = parsed_article["published_at"]
             
             if not published_at:
                 self.logger.info(f"[scraper] No published at found for {title}")
 
-            article_text_str = self.get_article_content(soup, link)
+            article_text_str = self.get_article_content(parsed_article, link, session)
             if not article_text_str:
                 raise Exception("No article text found")
             
@@ -174,37 +491,52 @@ class Yahoo:
         finally:
             return res
 
-    # @retry(stop=stop_after_attempt(3), wait=wait_random(min=1, max=5))
-    def get_articles_for_stock(self, url):
+    async def get_articles_for_stock(self, session, url, stock):
         try:
-            articles_for_stock = set()
-            response = requests.get(url)
+            cache_entry = self.quote_cache.get(stock) if self.quote_cache else None
+            headers = self.quote_cache.get_conditional_headers(cache_entry) if self.quote_cache else None
+
+            articles_for_stock = []
+            response = await session.http.get(url, headers=headers)
+            if response.status_code == 304 and cache_entry:
+                session.incr("quote_cache_hits")
+                session.incr("quote_not_modified")
+                # same validators as the cached entry, run_scraper stores them back with the links
+                return {
+                    "articles_for_stock": cache_entry["links"],
+                    "unchanged": True,
+                    "etag": cache_entry.get("etag"),
+                    "last_modified": cache_entry.get("last_modified"),
+                }
+
             if response.status_code != 200:
                 raise Exception("Failed to get 200 response from Yahoo")
-        
-            # self.wait_for_stock_article_links(driver)
             
             main_page_source = response.text
-            soup = BeautifulSoup(main_page_source, 'html.parser')
-
-            filtered_stories = soup.find('div', class_=lambda x: x and 'filtered-stories' in x)
-            if not filtered_stories:
+            story_links = self.parser.get_story_links(main_page_source)
+            if story_links is None:
                 # self.logger.info(f"[scraper]: No filtered stories found for url {url}")
                 raise Exception("no stories found")
                 
-            atags = filtered_stories.find_all("a", class_=lambda x: x and 'subtle-link' in x)
-            if not atags:
+            if not story_links:
                 self.logger.info(f"scraper] No atags found for url {url}")
                 raise Exception("no tags found")
                 
-            for atag in atags:
-                link = atag.get('href')
-                if not link:
+            for link in story_links:
+                if not link or link in articles_for_stock:
                     continue
-                articles_for_stock.add(link)
+                articles_for_stock.append(link)
+
+            unchanged = False
+            if self.quote_cache:
+                unchanged = cache_entry is not None and cache_entry.get("links_hash") == self.quote_cache.links_hash(articles_for_stock)
+                session.incr("quote_cache_hits" if unchanged else "quote_cache_misses")
 
             res = {
-                "articles_for_stock": list(articles_for_stock),
+                "articles_for_stock": articles_for_stock,
+                "unchanged": unchanged,
+                "etag": response.headers.get("etag"),
+                "last_modified": response.headers.get("last-modified"),
             }
             return res
 
@@ -212,30 +544,33 @@ class Yahoo:
             self.logger.info(e)
             raise Exception(e)
   
-    def get_stories_for_stock(self, articles_for_stock, stock, run_id):
+    async def get_stories_for_stock(self, session, articles_for_stock, stock, run_id):
         if not articles_for_stock:
             return
 
-        stories_for_stock = []
-
-        # these are all the stories for the stock
-        for link in list(articles_for_stock):
-            time.sleep(10)
+        # these are all the stories for the stock, pacing is left to the rate limiter
+        for link in articles_for_stock:
             self.logger.info(f"[scraper] scraping {link}, stock {stock}")
-            try: 
-                story = self.scrape_recent_news_for_sym(link, run_id, stock)
-                if not story:
-                    continue
 
-                stories_for_stock.append(story)
-            except Exception as e:
-                self.logger.info("Failed to get story for ", link)
+        results = await asyncio.gather(
+            *[self.scrape_recent_news_for_sym(session, link, run_id, stock) for link in articles_for_stock],
+            return_exceptions=True,
+        )
+
+        stories_for_stock = []
+        for link, story in zip(articles_for_stock, results):
+            if isinstance(story, Exception):
+                self.logger.info(f"Failed to get story for {link}")
+                continue
+            # failed stories have no content, storing them would also mark the url as seen
+            if not story or not story.get("success"):
+                continue
+
+            stories_for_stock.append(story)
         
         return stories_for_stock
     
-    def save_scraped_stock_data(self, stock, run_id, success=True):
-        sps_collection = self.db["stock_prices"]
-
+    def save_scraped_stock_data(self, stock, run_id, success=True, write_buffer=None):
         query = {
             "stock": stock,
             "run_id": run_id
@@ -252,6 +587,11 @@ class Yahoo:
             }
         }
 
+        if write_buffer:
+            write_buffer.add("stock_prices", UpdateOne(query, update, upsert=True))
+            return
+
+        sps_collection = self.db["stock_prices"]
         sps_collection.update_one(query, update, upsert=True)
 
     def get_failed_stocks(self, run_id):
@@ -260,50 +600,88 @@ class Yahoo:
         return failed_stocks
         
         
-    def run_scraper(self, stock, run_id, worker_idx):
+    async def run_scraper(self, session, stock, run_id, worker_idx):
         url = f"https://finance.yahoo.com/quote/{stock}"
         self.logger.info(f"[scraper] getting articles for url {url}, worker_idx {worker_idx}")
 
         try:
-            scraped_stock_res = self.get_articles_for_stock(url)
+            scraped_stock_res = await self.get_articles_for_stock(session, url, stock)
 
             articles_for_stock = scraped_stock_res["articles_for_stock"]
             if not articles_for_stock:
                 self.logger.info(f"[scraper] no articles found for stock {stock}")
                 return
-                
-            stories_for_stock = self.get_stories_for_stock(articles_for_stock, stock, run_id)
 
-            if not stories_for_stock:
+            # storage and mongo clients are blocking, keep them off the event loop
+            cutoff = self.get_watermark_cutoff(session, stock)
+            stale_urls = session.stale_urls.get(stock, ())
+            new_links, prior_scrapes, num_skipped = await asyncio.to_thread(self.split_seen_links, session, articles_for_stock, cutoff, stale_urls)
+            if num_skipped:
+                self.logger.info(f"[scraper] reached stories older than the watermark for stock {stock}, skipping the last {num_skipped} links")
+            if prior_scrapes:
+                self.logger.info(f"[scraper] skipping {len(prior_scrapes)} already scraped articles for stock {stock}")
+                if self.reuse_seen_articles:
+                    await asyncio.to_thread(self.save_prior_scrapes, prior_scrapes, stock, run_id, session.write_buffer)
+                    if session.stream:
+                        await asyncio.to_thread(session.stream.put_scrapes, stock, prior_scrapes)
+
+            # same story list as the last run and every link on it already has a scrape record for this run
+            if scraped_stock_res["unchanged"] and self.reuse_seen_articles and not new_links:
+                self.logger.info(f"[scraper] story list unchanged for stock {stock}, skipping article fetches")
+                return scraped_stock_res
+
+            stories_for_stock = await self.get_stories_for_stock(session, new_links, stock, run_id)
+            fetched_stories = bool(stories_for_stock)
+            all_stored = len(stories_for_stock or []) == len(new_links)
+            stories_for_stock, stale_links = self.drop_stories_before(session, stories_for_stock, cutoff)
+            # nothing stores a stale story, without a marker it would be fetched again every run
+            if self.watermarks and stale_links:
+                await asyncio.to_thread(self.watermarks.mark_stale, stock, stale_links, session.write_buffer)
+
+            if not fetched_stories and not prior_scrapes and not num_skipped:
                 self.logger.info(f"No stories found for stock {stock}")
                 return
 
-            # self.logger.info(f"[scraper] found {len(stories_for_stock)} for stock {stock}")
-            self.logger.info(f"[scraper] Saving articles to storage for stock {stock}")
-            self.save_articles_to_storage(stories_for_stock, stock, run_id)
+            if stories_for_stock:
+                self.logger.info(f"[scraper] Saving articles to storage for stock {stock}")
+                scrapes = await asyncio.to_thread(self.save_articles_to_storage, stories_for_stock, stock, run_id, session.write_buffer)
+                all_stored = all_stored and bool(scrapes)
+                for scrape in scrapes or []:
+                    session.url_index.add(scrape["url"])
+
+                # hand the articles straight to predict, a full stream blocks this stock until it drains
+                if session.stream:
+                    await asyncio.to_thread(session.stream.put_articles, stock, stories_for_stock)
+
+                newest = max((scrape["published_at"] for scrape in scrapes or [] if scrape.get("published_at")), default=None)
+                if self.watermarks and newest:
+                    await asyncio.to_thread(self.watermarks.advance, stock, newest, session.write_buffer)
+
+            # only remember the story list once all of its articles are stored, a failed fetch is retried next run
+            if self.quote_cache and all_stored:
+                self.quote_cache.put(stock, articles_for_stock, scraped_stock_res["etag"], scraped_stock_res["last_modified"])
             return scraped_stock_res
-            # self.logger.info(f"[scraper] completed for stock {stock}, ts: {timestamp}")
         except Exception as e:
             self.logger.info(e)
             raise Exception(e)
      
-    def run_job(self, stock, timestamp, sema, run_id, worker_idx):
-        sema.acquire()   
-        self.logger.info(f"Starting scraper for worker {worker_idx}, stock {stock} at time {datetime.now(timezone.utc)}")
-        
-        app_env = os.environ.get('APP_ENV', 'LOCAL')        
+    async def run_job(self, session, stock, sema, run_id, worker_idx):
+        async with sema:
+            # stocks already started finish, the rest are left alone
+            if session.is_cancelled():
+                session.incr("cancelled")
+                return
+            self.logger.info(f"Starting scraper for worker {worker_idx}, stock {stock} at time {datetime.now(timezone.utc)}")
 
-        try: 
-            scraped_stock_res = self.run_scraper(stock, run_id, worker_idx)
-            self.save_scraped_stock_data(stock, run_id, scraped_stock_res is not None)
-            self.logger.info(f"[scraper] SUCCESS on stock {stock}")
-        except Exception as e:
-            self.logger.info(e)
-            self.logger.info(traceback.format_exc())
-            self.save_scraped_stock_data(stock, run_id, False)
-            self.logger.info(f"[scraper] FAILED on stock {stock}")
-        finally:
-            sema.release()
+            try: 
+                scraped_stock_res = await self.run_scraper(session, stock, run_id, worker_idx)
+                await asyncio.to_thread(self.save_scraped_stock_data, stock, run_id, scraped_stock_res is not None, session.write_buffer)
+                self.logger.info(f"[scraper] SUCCESS on stock {stock}")
+            except Exception as e:
+                self.logger.info(e)
+                self.logger.info(traceback.format_exc())
+                await asyncio.to_thread(self.save_scraped_stock_data, stock, run_id, False, session.write_buffer)
+                self.logger.info(f"[scraper] FAILED on stock {stock}")
 
     def get_stocks_list(self, stock_list):
         key = f"stocks_list/{stock_list}"
@@ -314,44 +692,190 @@ class Yahoo:
         
         return stocks
     
-    def save_run(self, run_id, cur_time):
+    def save_run(self, run_id, cur_time, stock_list=None):
         runs_collection = self.db["runs"]
 
         doc = {
             "run_id": run_id,
             "created_at": cur_time,
+            "stock_list": stock_list,
         }
         runs_collection.insert_one(doc)
 
-    def start(self, stock_list, run_id):
-        # run_id = str(uuid.uuid4())
-        stocks = self.get_stocks_list(stock_list)
-        self.logger.info(f"Starting scrapes for run id: {run_id}, num stocks: {len(stocks)}")
+    async def run_session(self, run_id, work, stream=None, job=None):
+        # everything a run shares: seen urls, watermarks, the http pool and the write buffer
+        url_index = SeenUrlIndex(self.db, self.logger)
+        if self.skip_seen_urls:
+            await asyncio.to_thread(url_index.load)
+
+        watermarks = {}
+        stale_urls = {}
+        if self.watermarks:
+            watermarks = await asyncio.to_thread(self.watermarks.load_all)
+            stale_urls = await asyncio.to_thread(self.watermarks.load_stale_urls)
+
+        # picks up whatever was learned since the last run
+        if self.boilerplate:
+            await asyncio.to_thread(self.boilerplate.load)
+
+        concurrency = None
+        max_connections = self.max_concurrency
+        # pacing is adapted per run, concurrent runs share the configured per host rates
+        rate_limiter = ScaledRateLimiter(self.rate_limiter)
+        if self.adaptive_concurrency:
+            concurrency = AimdController(self.logger, run_id, rate_limiter, initial_limit=self.max_concurrency)
+            max_connections = max(concurrency.max_limit, self.max_concurrency)
+
+        write_buffer = BulkWriteBuffer(self.db, self.logger).start()
+        try:
+            async with HttpClient(self.logger, rate_limiter, max_connections=max_connections, concurrency=concurrency) as http:
+                session = ScrapeSession(run_id, http, url_index, write_buffer, watermarks, stream, job, stale_urls)
+                await work(session)
+        finally:
+            # whatever is still buffered has to land before the run is reported as done
+            await asyncio.to_thread(write_buffer.close)
+
+        if concurrency:
+            self.logger.info(f"[scraper] run_id {run_id} finished with fetch concurrency {concurrency.get_limit()}: {json.dumps(concurrency.get_stats())}")
+
+        return {
+            "http": http.get_stats(),
+            "writes": write_buffer.get_stats(),
+            "counters": dict(session.counters),
+        }
+
+    async def scrape_stocks(self, stocks, run_id, stream=None, job=None):
+        sema = asyncio.Semaphore(self.max_concurrency)
+
+        async def work(session):
+            jobs = [self.run_job(session, stock, sema, run_id, idx) for idx, stock in enumerate(stocks)]
+            await asyncio.gather(*jobs)
+
+        return await self.run_session(run_id, work, stream, job)
 
-        max_threads = 5
-        sema = threading.Semaphore(value=max_threads)
-        threads = list()
+    async def keep_lease(self, queue, item):
+        while True:
+            await asyncio.sleep(queue.lease_secs / 3)
+            if not await asyncio.to_thread(queue.heartbeat, item):
+                self.logger.info(f"[scraper] lost the lease on stock {item['stock']}, another worker will pick it up")
+                return
+
+    async def run_queue_worker(self, session, queue, run_id, worker_id, worker_idx, poll_secs):
+        while True:
+            item = await asyncio.to_thread(queue.claim, run_id, worker_id)
+            if not item:
+                # a worker that died on a stock's last attempt leaves it leased, nobody else will finish it
+                for stock in await asyncio.to_thread(queue.fail_expired, run_id):
+                    await asyncio.to_thread(self.save_scraped_stock_data, stock, run_id, False, session.write_buffer)
+                    session.incr("queue_expired")
+
+                # nothing claimable, but leases held elsewhere can still expire and need stealing
+                if not await asyncio.to_thread(queue.has_open_items, run_id):
+                    return
+                await asyncio.sleep(poll_secs)
+                continue
+
+            stock = item["stock"]
+            heartbeat = asyncio.create_task(self.keep_lease(queue, item))
+            success = False
+            try:
+                scraped_stock_res = await self.run_scraper(session, stock, run_id, worker_idx)
+                success = scraped_stock_res is not None
+                self.logger.info(f"[scraper] SUCCESS on stock {stock}")
+            except Exception as e:
+                self.logger.info(e)
+                self.logger.info(traceback.format_exc())
+                self.logger.info(f"[scraper] FAILED on stock {stock}")
+            finally:
+                heartbeat.cancel()
+
+            await asyncio.to_thread(self.save_scraped_stock_data, stock, run_id, success, session.write_buffer)
+            await asyncio.to_thread(queue.complete, item, success)
+            session.incr("queue_claimed")
+
+    async def drain_queue(self, queue, run_id, worker_id, poll_secs=None):
+        poll_secs = poll_secs if poll_secs is not None else float(os.environ.get("SCRAPER_QUEUE_POLL_SECS", DEFAULT_QUEUE_POLL_SECS))
+
+        async def work(session):
+            workers = [self.run_queue_worker(session, queue, run_id, worker_id, idx, poll_secs) for idx in range(self.max_concurrency)]
+            await asyncio.gather(*workers)
+
+        return await self.run_session(run_id, work)
+
+    def save_run_stats(self, run_id, stock_list, stats):
+        runs_collection = self.db["runs"]
+
+        update = {f"stats.{name}": value for name, value in stats.items()}
+        runs_collection.update_one({"run_id": run_id, "stock_list": stock_list}, {"$set": update})
+
+    def start(self, stock_list, run_id, stream=None, job=None):
+        with track_stage(job, "load_stocks"):
+            stocks = self.get_stocks_list(stock_list)
+        self.logger.info(f"Starting scrapes for run id: {run_id}, num stocks: {len(stocks)}, max concurrency: {self.max_concurrency}")
         
         utc_now = datetime.now(timezone.utc)
-        self.save_run(run_id, utc_now)
+        self.save_run(run_id, utc_now, stock_list)
 
-        for idx, stock in enumerate(stocks):
-            args = (stock, utc_now, sema, run_id, idx)
-            thread = threading.Thread(target=self.run_job, args=args)
-            threads.append(thread)
-            
-        for idx, thread in enumerate(threads):
-            time.sleep(5)
-            thread.start()
-
-            if idx >= 1 and idx % 20 == 0:
-                self.logger.info("Sleeping for 5 minutes")
-                time.sleep(300) # 5 min
-                # time.sleep(900)
-        
-        for thread in threads:
-            thread.join()
+        with track_stage(job, "scrape"):
+            stats = asyncio.run(self.scrape_stocks(stocks, run_id, stream, job))
+        self.logger.info(f"[scraper] stats for run_id {run_id}, stock list {stock_list}: {json.dumps(stats)}")
+        self.save_run_stats(run_id, stock_list, stats)
         
         self.logger.info(f"[scraper] Yahoo scraper completed with run_id {run_id}, time {datetime.now(timezone.utc)}")
 
-# 100 units within 40
\ No newline at end of file
+    def start_queue(self, run_id, stock_lists=None):
+        # queue mode: tickers are pulled one at a time from a shared mongo queue, so any number
+        # of threads, processes or containers can drain the same run
+        queue = LeaseWorkQueue(self.db, self.logger)
+        queue.ensure_indexes()
+        for stock_list in stock_lists or []:
+            queue.enqueue(run_id, self.get_stocks_list(stock_list))
+
+        worker_id = get_worker_id()
+        queue_stock_list = f"{QUEUE_STOCK_LIST_PREFIX}{worker_id}"
+        self.logger.info(f"[scraper] worker {worker_id} draining queue for run_id {run_id}, max concurrency: {self.max_concurrency}")
+        self.save_run(run_id, datetime.now(timezone.utc), queue_stock_list)
+
+        stats = asyncio.run(self.drain_queue(queue, run_id, worker_id))
+        stats["queue"] = queue.get_counts(run_id)
+        self.logger.info(f"[scraper] stats for run_id {run_id}, worker {worker_id}: {json.dumps(stats)}")
+        self.save_run_stats(run_id, queue_stock_list, stats)
+        return stats
+
+    def get_resume_delay(self, attempt, base_delay):
+        # exponential backoff with jitter, half fixed and half random so passes never line up
+        delay = base_delay * 2 ** attempt
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def resume(self, run_id, max_passes=None, base_delay=None, job=None):
+        max_passes = max_passes or int(os.environ.get("SCRAPER_RESUME_MAX_PASSES", DEFAULT_RESUME_MAX_PASSES))
+        base_delay = base_delay if base_delay is not None else float(os.environ.get("SCRAPER_RESUME_BASE_DELAY", DEFAULT_RESUME_BASE_DELAY))
+
+        failed_stocks = self.get_failed_stocks(run_id)
+        self.logger.info(f"[scraper] resuming run_id {run_id}, {len(failed_stocks)} failed stocks")
+        if not failed_stocks:
+            return []
+
+        self.save_run(run_id, datetime.now(timezone.utc), RESUME_STOCK_LIST)
+
+        for attempt in range(max_passes):
+            if attempt > 0:
+                delay = self.get_resume_delay(attempt - 1, base_delay)
+                self.logger.info(f"[scraper] {len(failed_stocks)} stocks still failing, retrying in {int(delay)}s")
+                if not job:
+                    time.sleep(delay)
+                elif job.cancel_event.wait(delay):
+                    # woken up early by a cancel
+                    break
+
+            with track_stage(job, f"pass_{attempt + 1}"):
+                stats = asyncio.run(self.scrape_stocks(failed_stocks, run_id, job=job))
+            failed_stocks = self.get_failed_stocks(run_id)
+
+            stats["remaining_failures"] = failed_stocks
+            self.save_run_stats(run_id, RESUME_STOCK_LIST, {f"pass_{attempt + 1}": stats})
+            self.logger.info(f"[scraper] resume pass {attempt + 1} for run_id {run_id}, remaining failures: {failed_stocks}")
+            if not failed_stocks:
+                break
+
+        return failed_stocks